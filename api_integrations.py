@@ -60,6 +60,8 @@ class WeatherAPI:
                     'uv_index': onecall_data.get('current', {}).get('uvi', 5)
                 },
                 'location': {
+                    'lat': lat,
+                    'lon': lon,
                     'name': current_data['name'],
                     'country': current_data['sys']['country'],
                     'timezone': onecall_data.get('timezone', 'UTC')
@@ -138,6 +140,8 @@ class WeatherAPI:
                 'uv_index': 7
             },
             'location': {
+                'lat': lat,
+                'lon': lon,
                 'name': 'Location',
                 'country': 'IN',
                 'timezone': 'Asia/Kolkata'
@@ -322,8 +326,10 @@ ROOFTOP DATA:
 - Roof Slope: {ml_features.get('roof_slope', 'Unknown')}
 - Material: {ml_features.get('roof_material', 'Unknown')}
 - Shading: {ml_features.get('shading_percent', 0)}%
+- Annual Obstacle Shading: {(ml_features.get('shadow_analysis') or {}).get('annual_shading_percent', 'Unknown')}%
 - Obstacles: {ml_features.get('obstacle_count', 0)}
 - Complexity: {ml_features.get('complexity_score', 0)}/10
+- Panels That Fit (after setbacks): {(ml_features.get('panel_layout') or {}).get('panel_count', 'Unknown')}
 
 LOCATION:
 - Address: {location_data.get('address', 'Unknown')}
@@ -9,16 +9,25 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 import json
+import os
 from datetime import datetime
 
 # Import modules
-from models.roof_segmentation import SimplifiedRoofSegmenter
+from models.roof_segmentation import SimplifiedRoofSegmenter, RoofSegmenter, render_overlay
+from models.panel_layout import PanelPacker, render_panels
+from models.shadow_casting import ShadowCaster, render_shading
+from models.segmentation_tiers import TieredRoofSegmenter
 from models.feature_extractor import RoofFeatureExtractor
+from models.backbones import DEFAULT_BACKBONE
+from models.model_registry import ModelRegistry
 from utils.api_integrations import WeatherAPI, LocationAPI, GeminiAPI
 from utils.calculations import (
     SolarCalculator, RainwaterCalculator, 
     GardeningCalculator, EnvironmentalImpact
 )
+from utils.uncertainty import MonteCarloAnalyzer
+from utils.solar_simulation import SLOPE_TILTS
+from utils.orientation_optimizer import OrientationOptimizer
 
 # Page config
 st.set_page_config(
@@ -257,6 +266,20 @@ def get_city_name(loc_data):
     # Final fallback
     return loc_data.get('name', 'Unknown City')
 
+# Uploads above this size are segmented in tiles to bound memory
+LARGE_IMAGE_PIXELS = 16_000_000
+
+# Segmentation latency budget; the best engine that fits is used
+SEGMENTATION_BUDGET_MS = 800
+# Tiers this deployment may use (see models/segmentation_tiers.py), e.g. "cv" for CPU-only hosts
+SEGMENTATION_TIERS = os.getenv('SEGMENTATION_TIERS', 'cv,sam_sparse,sam_dense').split(',')
+OVERLAY_MAX_SIZE = 1024  # Segmentation overlay is rendered at display resolution
+SAM_CHECKPOINT = "models/pretrained/sam_vit_b.pth"
+MONTE_CARLO_SAMPLES = 100_000  # Uncertainty bands in the solar / rainwater tabs
+# Deep-feature backbone for this deployment (see models/backbones.py)
+ROOF_BACKBONE = os.getenv('ROOF_BACKBONE', DEFAULT_BACKBONE)
+
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'analysis_complete' not in st.session_state:
@@ -271,12 +294,35 @@ def initialize_session_state():
         st.session_state.weather_data = None
 
 
+@st.cache_resource
+def load_model_registry():
+    """Lazy model registry (cached); nothing loads until it is needed"""
+    registry = ModelRegistry()
+    registry.register('cv_segmenter', SimplifiedRoofSegmenter)
+    registry.register('feature_extractor', lambda: RoofFeatureExtractor(backbone=ROOF_BACKBONE))
+    
+    # SAM tiers are only offered when configured and the checkpoint has been downloaded
+    if any(tier.startswith('sam') for tier in SEGMENTATION_TIERS) and os.path.exists(SAM_CHECKPOINT):
+        registry.register('sam', lambda: RoofSegmenter(SAM_CHECKPOINT))
+    return registry
+
+
 @st.cache_resource
 def load_models():
     """Load ML models (cached)"""
     try:
-        segmenter = SimplifiedRoofSegmenter()
-        extractor = RoofFeatureExtractor()
+        registry = load_model_registry()
+        # The CV tier serves requests right away; SAM loads in the background
+        # the first time a SAM tier fits the budget. Tier timings come from
+        # `python -m models.segmentation_tiers`, run before the app starts
+        segmenter = TieredRoofSegmenter(
+            registry.get('cv_segmenter'),
+            default_budget_ms=SEGMENTATION_BUDGET_MS,
+            timings_path="models/pretrained/segmentation_timings.json",
+            sam_provider=lambda: registry.get_or_warm('sam'),
+            tiers=SEGMENTATION_TIERS
+        )
+        extractor = registry.get('feature_extractor')
         return segmenter, extractor
     except Exception as e:
         st.error(f"Error loading models: {e}")
@@ -293,7 +339,10 @@ def analyze_rooftop(image, location_data):
     status_text.text("🔍 Analyzing roof structure...")
     progress_bar.progress(25)
     segmenter, extractor = load_models()
-    seg_result = segmenter.segment_roof(image)
+    if image.size[0] * image.size[1] > LARGE_IMAGE_PIXELS:
+        seg_result = segmenter.segment_roof_tiled(image)
+    else:
+        seg_result = segmenter.segment_roof(image)
     st.session_state.seg_result = seg_result
     
     # Step 2: Feature extraction
@@ -301,6 +350,7 @@ def analyze_rooftop(image, location_data):
     progress_bar.progress(50)
     features = extractor.extract_all_features(image, seg_result.get('roof_mask'))
     ml_features = {**seg_result, **features}
+    ml_features['panel_layout'] = PanelPacker().pack(seg_result)
     st.session_state.ml_features = ml_features
     
     # Step 3: Weather data
@@ -310,6 +360,13 @@ def analyze_rooftop(image, location_data):
     weather_data = weather_api.get_weather_data(location_data['lat'], location_data['lon'])
     st.session_state.weather_data = weather_data
     
+    # Annual obstacle shadows over the sun path, averaged under the panels
+    ml_features['shadow_analysis'] = ShadowCaster().annual_shading(
+        seg_result, location_data['lat'], weather_data['climate']['solar_irradiance'],
+        avg_temp=weather_data['climate'].get('avg_temp', 25),
+        panel_mask=ml_features['panel_layout']['panel_mask']
+    )
+    
     # Step 4: AI analysis
     status_text.text("🤖 Running AI analysis...")
     progress_bar.progress(90)
@@ -330,6 +387,45 @@ def analyze_rooftop(image, location_data):
     return True
 
 
+def solar_shading_percent(ml_features):
+    """Annual obstacle shading under the panels when simulated, else the image estimate"""
+    shadow = ml_features.get('shadow_analysis')
+    if shadow and shadow.get('loss_map') is not None:
+        return shadow['panel_shading_percent']
+    return ml_features.get('shading_percent', 10)
+
+
+def solar_estimate(ml_features, weather_data, solar_calc=None):
+    """
+    (system_size_kw, panel_count, annual_production_kwh) for the analysed roof
+    
+    Panels laid out on the roof mask whenever a roof was segmented (even
+    if none fit), the area estimate only without one; hourly simulation
+    when the latitude is known.
+    """
+    
+    solar_calc = solar_calc or SolarCalculator()
+    climate = weather_data['climate']
+    orientation = ml_features.get('orientation', 'South')
+    shading = solar_shading_percent(ml_features)
+    latitude = weather_data.get('location', {}).get('lat')
+    
+    layout = ml_features.get('panel_layout')
+    if layout and layout['image_shape'] is not None:
+        system_size, panel_count = solar_calc.system_size_for_panels(layout['panel_count'])
+    else:
+        system_size, panel_count = solar_calc.calculate_system_size(ml_features.get('usable_area_sqft', 800))
+    if latitude is not None:
+        production = solar_calc.calculate_production_hourly(
+            system_size, latitude, climate['solar_irradiance'], shading, orientation,
+            tilt=SLOPE_TILTS.get(ml_features.get('roof_slope'), 20),
+            avg_temp=climate.get('avg_temp', 25)
+        )
+    else:
+        production = solar_calc.calculate_production(system_size, climate['solar_irradiance'], shading, orientation)
+    return system_size, panel_count, production
+
+
 def generate_fallback_analysis(ml_features, weather_data):
     """Generate analysis using local calculators — FULLY COMPATIBLE WITH UI"""
     
@@ -341,27 +437,25 @@ def generate_fallback_analysis(ml_features, weather_data):
     usable_area = ml_features.get('usable_area_sqft', 800)
     roof_area = ml_features.get('roof_area_sqft', 1000)
     orientation = ml_features.get('orientation', 'South')
-    shading = ml_features.get('shading_percent', 10)
+    shading = solar_shading_percent(ml_features)
     
-    # Solar calculations
-    system_size, panel_count = solar_calc.calculate_system_size(usable_area)
-    solar_production = solar_calc.calculate_production(
-        system_size, weather_data['climate']['solar_irradiance'], shading, orientation
-    )
+    # Solar calculations: the laid-out system and its simulated production
+    system_size, panel_count, solar_production = solar_estimate(ml_features, weather_data, solar_calc)
     solar_roi = solar_calc.calculate_roi(system_size, solar_production)
     solar_impact = env_calc.calculate_solar_impact(solar_production)
     
-    # Rainwater calculations
+    # Rainwater calculations: tank sized by a daily water balance, savings on the water actually used
     rain_collection = rain_calc.calculate_collection(
         roof_area, weather_data['climate']['annual_rainfall_mm']
     )
-    rain_savings = rain_calc.calculate_savings(rain_collection)
+    tank_sizing = size_rainwater_tank(float(roof_area), float(weather_data['climate']['annual_rainfall_mm']))
+    rain_savings = rain_calc.calculate_savings(tank_sizing['annual_supplied'], tank_sizing['tank_size'])
     
     # Gardening calculations
     garden_potential = garden_calc.calculate_potential(usable_area)
     
     # Scores
-    solar_score = min(10, (usable_area / 100) + (8 if orientation == 'South' else 6))
+    solar_score = min(10, (usable_area / 100) + (8 if orientation == 'South' else 6)) if panel_count > 0 else 0
     rain_score = min(10, (weather_data['climate']['annual_rainfall_mm'] / 100))
     garden_score = min(10, (usable_area * 0.3 / 50) + 5)
     
@@ -380,7 +474,8 @@ def generate_fallback_analysis(ml_features, weather_data):
             "payback_years": solar_roi['payback_period'],
             "key_points": [
                 f"{orientation}-facing orientation detected",
-                f"Can install {panel_count} solar panels",
+                f"Can install {panel_count} solar panels" if panel_count > 0
+                else "No panels fit around the setbacks and obstacles",
                 f"Expected payback period: {solar_roi['payback_period']} years"
             ],
             "pros": ["Reduces electricity bills significantly", "Low maintenance requirements"],
@@ -393,10 +488,11 @@ def generate_fallback_analysis(ml_features, weather_data):
             "tank_size_needed_liters": rain_savings['tank_size'],
             "installation_cost_usd": rain_savings['installation_cost'],
             "annual_savings_usd": rain_savings['annual_savings'],
-            "water_self_sufficiency_percent": min(100, int(rain_collection / 1000)),
+            "water_self_sufficiency_percent": tank_sizing['self_sufficiency_percent'],
             "key_points": [
                 f"Annual collection: {rain_collection:,} liters",
-                f"Tank size needed: {rain_savings['tank_size']:,}L",
+                f"Tank size needed: {rain_savings['tank_size']:,}L "
+                f"(covers demand on {tank_sizing['reliability']}% of days)",
                 f"Payback: {rain_savings['payback_period']} years"
             ],
             "pros": ["Reduces water bills", "Sustainable water source"],
@@ -542,6 +638,9 @@ def display_ml_features(features):
     with col4:
         shading = features.get('shading_percent', 0)
         st.markdown(f"**🌑 Shading:** {shading:.1f}%")
+        shadow = features.get('shadow_analysis')
+        if shadow and shadow.get('loss_map') is not None:
+            st.markdown(f"**🌗 Annual Obstacle Shading:** {shadow['annual_shading_percent']:.1f}%")
 
 
 def create_score_gauge(score, title):
@@ -713,6 +812,125 @@ def display_technology_card(tech_name, tech_data, icon):
                 st.markdown(f"<p style='color: #60efff;'>🌸 {tip}</p>", unsafe_allow_html=True)
 
 
+@st.cache_data(show_spinner=False)
+def simulate_uncertainty(usable_area, roof_area, shading, orientation, solar_irradiance, annual_rainfall_mm,
+                         system_size_kw, annual_production_kwh, annual_supplied, tank_size, annual_demand):
+    """Seeded Monte Carlo bands around the local solar and rainwater estimates (cached per roof)"""
+    
+    analyzer = MonteCarloAnalyzer(n_samples=MONTE_CARLO_SAMPLES)
+    solar = analyzer.simulate_solar(usable_area, solar_irradiance, shading, orientation,
+                                    system_size_kw=system_size_kw, annual_production_kwh=annual_production_kwh)
+    rainwater = analyzer.simulate_rainwater(roof_area, annual_rainfall_mm, annual_supplied_liters=annual_supplied,
+                                            tank_size_liters=tank_size, annual_demand_liters=annual_demand)
+    return solar, rainwater
+
+
+def run_uncertainty(ml_features, weather_data):
+    """simulate_uncertainty around generate_fallback_analysis's system, production and tank"""
+    
+    climate = weather_data['climate']
+    roof_area = float(ml_features.get('roof_area_sqft', 1000))
+    system_size, _, production = solar_estimate(ml_features, weather_data)
+    tank_sizing = size_rainwater_tank(roof_area, float(climate['annual_rainfall_mm']))
+    return simulate_uncertainty(
+        float(ml_features.get('usable_area_sqft', 800)), roof_area,
+        float(solar_shading_percent(ml_features)), ml_features.get('orientation', 'South'),
+        float(climate['solar_irradiance']), float(climate['annual_rainfall_mm']),
+        float(system_size), float(production), float(tank_sizing['annual_supplied']),
+        float(tank_sizing['tank_size']), float(tank_sizing['annual_supplied'] + tank_sizing['annual_unmet'])
+    )
+
+
+def display_uncertainty_bands(result, metrics):
+    """Table of P5 / P25 / P50 / P75 / P95 for the given {key: label} metrics"""
+    
+    rows = []
+    for key, label in metrics.items():
+        bands = result[key]
+        rows.append({'Metric': label, **{name.upper(): bands[name] for name in ['p5', 'p25', 'p50', 'p75', 'p95']}})
+    
+    st.dataframe(pd.DataFrame(rows).set_index('Metric'), use_container_width=True)
+    st.caption(f"{result['samples']:,} Monte Carlo samples of prices, rates and climate "
+               f"(seed {result['seed']}); P50 is the median outcome")
+
+
+@st.cache_data(show_spinner=False)
+def optimize_panel_orientation(latitude, solar_irradiance, avg_temp, orientation, tilt):
+    """Tilt x azimuth yield surface for the analysed roof (cached per roof)"""
+    return OrientationOptimizer().optimize(latitude, solar_irradiance, avg_temp=avg_temp,
+                                           orientation=orientation, tilt=tilt)
+
+
+def create_orientation_heatmap(optimum):
+    """Annual yield per kW over panel tilt x azimuth"""
+    
+    fig = go.Figure(data=go.Heatmap(
+        z=optimum['surface'],
+        x=optimum['azimuths'],
+        y=optimum['tilts'],
+        colorscale='Viridis',
+        colorbar=dict(title='kWh/kW')
+    ))
+    fig.add_trace(go.Scatter(
+        x=[optimum['best_azimuth']], y=[optimum['best_tilt']],
+        mode='markers', name='Optimum',
+        marker=dict(color='#00ff87', size=14, symbol='star')
+    ))
+    if optimum['detected']:
+        fig.add_trace(go.Scatter(
+            x=[optimum['detected']['azimuth']], y=[optimum['detected']['tilt']],
+            mode='markers', name='Detected',
+            marker=dict(color='#ff6b6b', size=12, symbol='x')
+        ))
+    
+    fig.update_layout(
+        title='Annual Yield by Panel Tilt & Azimuth',
+        xaxis_title='Azimuth (° from North)',
+        yaxis_title='Tilt (°)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(26, 31, 58, 0.5)',
+        font=dict(color='#60efff', family='Rajdhani'),
+        height=400
+    )
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def size_rainwater_tank(roof_area, annual_rainfall_mm):
+    """Daily water-balance tank sizing for the analysed roof (cached per roof)"""
+    return RainwaterCalculator().calculate_tank_sizing(roof_area, annual_rainfall_mm)
+
+
+def create_tank_sizing_chart(sizing, target_reliability):
+    """Share of days demand is met for each candidate tank size"""
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=sizing['tank_sizes'], y=sizing['reliabilities'] * 100,
+        mode='lines+markers', name='Reliability',
+        line=dict(color='#60efff', width=3)
+    ))
+    fig.add_trace(go.Scatter(
+        x=[sizing['tank_size']], y=[sizing['reliability']],
+        mode='markers', name='Recommended',
+        marker=dict(color='#00ff87', size=14, symbol='star')
+    ))
+    fig.add_hline(y=target_reliability * 100, line_dash='dash', line_color='#ffd700',
+                  annotation_text='Target')
+    
+    fig.update_layout(
+        title='Reliability by Tank Size',
+        xaxis_title='Tank Size (L)',
+        yaxis_title='Days Demand Met (%)',
+        xaxis_type='log',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(26, 31, 58, 0.5)',
+        font=dict(color='#60efff', family='Rajdhani'),
+        height=400
+    )
+    return fig
+
+
 def create_comparison_chart(results):
     """Create technology comparison chart"""
     
@@ -914,6 +1132,9 @@ def main():
         """, unsafe_allow_html=True)
         
         st.markdown("---")
+        model_states = load_model_registry().status()
+        if 'sam' in model_states:
+            st.caption(f"SAM model: {model_states['sam'].replace('_', ' ')}")
         st.caption("v1.0 | Built with Streamlit")
     
     # Main content area
@@ -931,6 +1152,21 @@ def main():
         with col1:
             image = Image.open(uploaded_file)
             st.image(image, caption="📷 Uploaded Rooftop Image", use_container_width=True)
+            
+            if st.session_state.analysis_complete and st.session_state.get('seg_result'):
+                overlay = render_overlay(image.convert('RGB'), st.session_state.seg_result, max_size=OVERLAY_MAX_SIZE)
+                layout = st.session_state.ml_features.get('panel_layout')
+                if layout and layout['panel_count'] > 0:
+                    overlay = render_panels(overlay, layout)
+                    st.image(overlay, caption=f"🟩 Roof / 🟥 Obstacles / 🟦 {layout['panel_count']} Panels", use_container_width=True)
+                else:
+                    st.image(overlay, caption="🟩 Roof / 🟥 Obstacles", use_container_width=True)
+                
+                shadow = st.session_state.ml_features.get('shadow_analysis')
+                if shadow and shadow['shaded_area_sqft'] > 0:
+                    shading_map = render_shading(image.convert('RGB').resize(overlay.shape[1::-1]), shadow)
+                    st.image(shading_map, caption=f"🌗 Annual shading loss ({shadow['shaded_area_sqft']:,} sqft lose over 10%)",
+                             use_container_width=True)
         
         with col2:
             st.markdown("### 🚀 READY TO ANALYZE")
@@ -1006,6 +1242,34 @@ def main():
                 )
                 
                 st.plotly_chart(fig, use_container_width=True)
+                
+                weather = st.session_state.weather_data
+                latitude = weather.get('location', {}).get('lat')
+                if latitude is not None:
+                    with st.expander("🧭 Panel Orientation", expanded=False):
+                        ml_features = st.session_state.ml_features
+                        optimum = optimize_panel_orientation(
+                            float(latitude), float(weather['climate']['solar_irradiance']),
+                            float(weather['climate'].get('avg_temp', 25)),
+                            ml_features.get('orientation'), SLOPE_TILTS.get(ml_features.get('roof_slope'))
+                        )
+                        ocol1, ocol2 = st.columns(2)
+                        with ocol1:
+                            st.metric("Optimal Tilt / Azimuth",
+                                      f"{optimum['best_tilt']:.0f}° / {optimum['best_azimuth']:.0f}°")
+                        with ocol2:
+                            if optimum['detected']:
+                                st.metric("Loss vs Optimum", f"{optimum['detected']['loss_percent']}%",
+                                          delta=f"{optimum['detected']['orientation']}-facing", delta_color="off")
+                        st.plotly_chart(create_orientation_heatmap(optimum), use_container_width=True)
+                
+                with st.expander("🎲 Uncertainty Range", expanded=False):
+                    solar_mc, _ = run_uncertainty(st.session_state.ml_features, st.session_state.weather_data)
+                    display_uncertainty_bands(solar_mc, {
+                        'payback_period': 'Payback (years)',
+                        'total_25yr_savings': '25-Year Savings ($)',
+                        'roi_percent': 'ROI (%)'
+                    })
             
             with tab2:
                 st.markdown("### 💧 Rainwater Harvesting Analysis")
@@ -1042,6 +1306,33 @@ def main():
                 )
                 
                 st.plotly_chart(fig, use_container_width=True)
+                
+                with st.expander("🛢️ Tank Sizing", expanded=False):
+                    rain_calc = RainwaterCalculator()
+                    sizing = size_rainwater_tank(float(st.session_state.ml_features.get('roof_area_sqft', 1000)),
+                                                 float(st.session_state.weather_data['climate']['annual_rainfall_mm']))
+                    tcol1, tcol2, tcol3 = st.columns(3)
+                    with tcol1:
+                        st.metric("Recommended Tank", f"{sizing['tank_size']:,}L",
+                                  delta="Meets target" if sizing['meets_target'] else "Below target",
+                                  delta_color="normal" if sizing['meets_target'] else "inverse")
+                    with tcol2:
+                        st.metric("Overflow", f"{sizing['annual_overflow']:,}L/yr")
+                    with tcol3:
+                        st.metric("Unmet Demand", f"{sizing['annual_unmet']:,}L/yr")
+                    st.plotly_chart(create_tank_sizing_chart(sizing, rain_calc.target_reliability),
+                                    use_container_width=True)
+                    st.caption(f"Daily water balance over {rain_calc.simulation_years} synthetic years of rainfall, "
+                               f"{rain_calc.daily_demand_liters}L/day demand, "
+                               f"{rain_calc.first_flush_mm}mm first flush per rain day")
+                
+                with st.expander("🎲 Uncertainty Range", expanded=False):
+                    _, rain_mc = run_uncertainty(st.session_state.ml_features, st.session_state.weather_data)
+                    display_uncertainty_bands(rain_mc, {
+                        'payback_period': 'Payback (years)',
+                        'total_savings': '25-Year Savings ($)',
+                        'roi_percent': 'ROI (%)'
+                    })
             
             with tab3:
                 st.markdown("### 🌱 Rooftop Gardening Analysis")
@@ -0,0 +1,119 @@
+# models/backbones.py
+# Registry of CNN backbones for deep roof embeddings
+
+import os
+
+import torch
+import torch.nn as nn
+
+
+PRETRAINED_DIR = "models/pretrained"
+DEFAULT_BACKBONE = "resnet50"
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+class Backbone:
+    """
+    One selectable backbone: how to build it and what it costs
+
+    The network built by load() maps a (B, 3, H, W) batch to pooled
+    (B, dim) embeddings, so every backbone is interchangeable for
+    get_deep_features / extract_embeddings. cpu_ms and memory_mb are
+    measured by benchmark_backbones.py (batch of 1, single CPU thread)
+    and only guide the choice; nothing depends on them.
+    """
+
+    def __init__(self, name, arch, dim, head, input_size=224, weights="IMAGENET1K_V1",
+                 params_m=None, gmacs=None, cpu_ms=None, memory_mb=None):
+        self.name = name
+        self.arch = arch  # torchvision model the weights belong to
+        self.dim = dim
+        self.head = head  # Builds the embedding network from the torchvision model
+        self.input_size = input_size
+        self.weights = weights
+        self.params_m = params_m
+        self.gmacs = gmacs
+        self.cpu_ms = cpu_ms
+        self.memory_mb = memory_mb
+
+    @property
+    def weights_file(self):
+        """Local state dict; backbones cut from the same model share it"""
+        return f"{self.arch}.pth"
+
+    def transform(self):
+        """Input preprocessing for this backbone"""
+        import torchvision.transforms as transforms
+        return transforms.Compose([
+            transforms.Resize((self.input_size, self.input_size)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+        ])
+
+    def build(self, pretrained=True, pretrained_dir=PRETRAINED_DIR):
+        """
+        Embedding network in eval mode
+
+        Weights come from pretrained_dir when download_models.py has
+        saved them there, otherwise from torchvision's download cache.
+        """
+
+        from torchvision import models
+
+        model = getattr(models, self.arch)(weights=None)
+        if pretrained:
+            path = os.path.join(pretrained_dir, self.weights_file)
+            if os.path.exists(path):
+                state = torch.load(path, map_location='cpu')
+            else:
+                state = self.download()
+            model.load_state_dict(state)
+        return self.head(model).eval()
+
+    def download(self):
+        """ImageNet state dict via torchvision (cached under ~/.cache/torch)"""
+        from torchvision.models import get_model_weights
+        return get_model_weights(self.arch)[self.weights].get_state_dict(progress=True)
+
+    def load(self, pretrained_dir=PRETRAINED_DIR):
+        """(network, transform), the pair RoofFeatureExtractor works with"""
+        return self.build(pretrained_dir=pretrained_dir), self.transform()
+
+
+def _resnet_head(stages=4):
+    """ResNet up to layer<stages>, globally average pooled"""
+    def head(model):
+        layers = [model.conv1, model.bn1, model.relu, model.maxpool,
+                  model.layer1, model.layer2, model.layer3, model.layer4][:4 + stages]
+        return nn.Sequential(*layers, nn.AdaptiveAvgPool2d(1), nn.Flatten())
+    return head
+
+
+def _mobilenet_head(model):
+    return nn.Sequential(model.features, model.avgpool, nn.Flatten())
+
+
+# Costs measured with benchmark_backbones.py (224 px, batch 1, one CPU thread)
+BACKBONES = {
+    backbone.name: backbone for backbone in [
+        Backbone("resnet50", "resnet50", 2048, _resnet_head(),
+                 params_m=23.5, gmacs=4.09, cpu_ms=172, memory_mb=223),
+        Backbone("resnet50_layer3", "resnet50", 1024, _resnet_head(stages=3),
+                 params_m=8.5, gmacs=3.28, cpu_ms=136, memory_mb=189),
+        Backbone("resnet18", "resnet18", 512, _resnet_head(),
+                 params_m=11.2, gmacs=1.81, cpu_ms=83, memory_mb=163),
+        Backbone("mobilenet_v3_large", "mobilenet_v3_large", 960, _mobilenet_head,
+                 params_m=3.0, gmacs=0.21, cpu_ms=28, memory_mb=141),
+        Backbone("mobilenet_v3_small", "mobilenet_v3_small", 576, _mobilenet_head,
+                 params_m=0.9, gmacs=0.05, cpu_ms=12, memory_mb=117),
+    ]
+}
+
+
+def get_backbone(name=DEFAULT_BACKBONE):
+    """Registered backbone by name (ValueError lists the choices)"""
+    if name not in BACKBONES:
+        raise ValueError(f"Unknown backbone '{name}', choose from: {', '.join(BACKBONES)}")
+    return BACKBONES[name]
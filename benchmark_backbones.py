@@ -0,0 +1,66 @@
+# Benchmark: CPU cost of every registered deep-feature backbone
+# Weights are random (cost does not depend on them), so no download is needed.
+#   python benchmark_backbones.py
+# The numbers are recorded on the BACKBONES entries in models/backbones.py.
+
+import multiprocessing as mp
+import resource
+import time
+
+RUNS = 10
+
+
+def measure(name, queue):
+    """Runs in a fresh process so peak memory belongs to this backbone alone"""
+
+    import numpy as np
+    import torch
+    from torch.utils.flop_counter import FlopCounterMode
+    from models.backbones import get_backbone
+
+    torch.set_num_threads(1)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    backbone = get_backbone(name)
+    network = backbone.build(pretrained=False)
+    batch = torch.randn(1, 3, backbone.input_size, backbone.input_size)
+
+    with torch.no_grad():
+        with FlopCounterMode(display=False) as counter:
+            output = network(batch)
+        times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            network(batch)
+            times.append((time.perf_counter() - start) * 1000)
+
+    queue.put({
+        'dim': output.shape[1],
+        'params_m': sum(p.numel() for p in network.parameters()) / 1e6,
+        'gmacs': counter.get_total_flops() / 2e9,
+        'cpu_ms': float(np.median(times)),
+        'memory_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024,
+    })
+
+
+if __name__ == "__main__":
+    from models.backbones import BACKBONES
+
+    context = mp.get_context('spawn')
+
+    print("Backbone Benchmark (batch 1, 1 CPU thread)")
+    print("="*72)
+    print(f"{'Backbone':<22}{'Dim':>6}{'Params M':>10}{'GMACs':>8}{'CPU ms':>10}{'Memory MB':>12}")
+    print("-"*72)
+
+    for name in BACKBONES:
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(name, queue))
+        process.start()
+        stats = queue.get()
+        process.join()
+        print(f"{name:<22}{stats['dim']:>6}{stats['params_m']:>10.1f}{stats['gmacs']:>8.2f}"
+              f"{stats['cpu_ms']:>10.1f}{stats['memory_mb']:>12.0f}")
+
+    print("-"*72)
+    print("Memory is the peak RSS growth from building the network and running it")
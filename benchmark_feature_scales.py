@@ -0,0 +1,95 @@
+# Regression harness: roof features should not depend on upload resolution
+# Each sample roof is upsampled x1..x8 (as if shot at a finer ground
+# sample distance) and its features are compared with the x1 baseline.
+#   python benchmark_feature_scales.py
+
+import time
+import cv2
+import numpy as np
+from PIL import Image
+from models.feature_context import FeatureContext
+from models.feature_extractor import MATERIAL_THRESHOLDS, RoofFeatureExtractor
+
+SAMPLES = [f"data/sample_images/roof{i}.jpg" for i in range(1, 5)]
+SCALES = [1, 2, 4, 8]
+BASE_GSD = 0.3  # Nominal m/px of the sample images
+
+# Allowed drift from the x1 baseline of the continuous outputs and of
+# the statistics the categorical features are thresholded on
+TOLERANCE = {'shading_percent': 2.0, 'complexity_score': 0.5, 'gray_std': 2.0, 'edge_density': 0.02}
+CATEGORICAL = ['orientation', 'roof_material', 'roof_slope']
+# Statistics each categorical feature is thresholded on (orientation and
+# slope come from the orientation field, which has no tolerance here)
+THRESHOLDS = {'roof_material': MATERIAL_THRESHOLDS}
+
+
+def extract(extractor, image, gsd, target_gsd):
+    """Features plus the context statistics behind them, and the time taken (ms)"""
+    start = time.perf_counter()
+    ctx = FeatureContext(image, max_dim=extractor.max_dim, gsd=gsd, target_gsd=target_gsd)
+    features = extractor.extract_all_features(ctx)
+    elapsed = (time.perf_counter() - start) * 1000
+    features.update(gray_std=ctx.gray_std, edge_density=ctx.edge_density)
+    return features, elapsed
+
+
+def crossed_threshold(name, features, baseline):
+    """Whether a statistic behind this categorical feature crossed one of its thresholds"""
+    return any((baseline[stat] < t) != (features[stat] < t)
+               for stat, thresholds in THRESHOLDS.get(name, {}).items() for t in thresholds)
+
+
+def compare(features, baseline):
+    """(drifted statistics, flipped categorical features, boundary flips)
+
+    A flip only counts as a boundary case when every statistic is in
+    tolerance and one of them crossed that feature's class threshold.
+    """
+    drifted = [name for name, tol in TOLERANCE.items() if abs(features[name] - baseline[name]) > tol]
+    flipped = [name for name in CATEGORICAL if features[name] != baseline[name]]
+    boundary = [name for name in flipped if not drifted and crossed_threshold(name, features, baseline)]
+    return drifted, [name for name in flipped if name not in boundary], boundary
+
+
+# Normalised: every scale is brought back to BASE_GSD before extraction
+normalised = RoofFeatureExtractor(target_gsd=BASE_GSD, max_workers=1)
+# Reference: features at the uploaded resolution
+full_res = RoofFeatureExtractor(max_dim=None, max_workers=1)
+
+print("Feature Scale Regression")
+print("="*92)
+print(f"{'Image':<12}{'Scale':>6}{'Size':>12}{'Shading %':>11}{'Complexity':>12}{'Edges':>8}"
+      f"{'Full edges':>12}{'Norm ms':>9}{'Full ms':>9}  Drift")
+print("-"*92)
+
+failures, boundary_flips = [], 0
+for path in SAMPLES:
+    image = np.array(Image.open(path).convert("RGB"))
+    baseline = None
+
+    for scale in SCALES:
+        scaled = image if scale == 1 else cv2.resize(
+            image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+        features, norm_ms = extract(normalised, scaled, BASE_GSD / scale, BASE_GSD)
+        full, full_ms = extract(full_res, scaled, None, None)
+
+        baseline = baseline or features
+        drifted, flipped, boundary = compare(features, baseline)
+        boundary_flips += len(boundary)
+        if drifted or flipped:
+            failures.append(f"{path.split('/')[-1]} x{scale}: {', '.join(drifted + flipped)}")
+
+        notes = drifted + flipped + [f"{name} (boundary)" for name in boundary]
+        size = f"{scaled.shape[1]}x{scaled.shape[0]}"
+        print(f"{path.split('/')[-1]:<12}{'x' + str(scale):>6}{size:>12}"
+              f"{features['shading_percent']:>11.1f}{features['complexity_score']:>12.1f}"
+              f"{features['edge_density']:>8.3f}{full['edge_density']:>12.3f}"
+              f"{norm_ms:>9.0f}{full_ms:>9.0f}  {', '.join(notes) or '✓'}")
+
+print("-"*92)
+print("Edges = edge density after normalisation; Full = at the uploaded resolution")
+if boundary_flips:
+    print(f"⚠️ {boundary_flips} categorical flips from in-tolerance statistics crossing a class threshold")
+assert not failures, "Drifted from the x1 baseline: " + "; ".join(failures)
+print("✅ Features stable across input scales")
@@ -0,0 +1,78 @@
+# Benchmark: coarse-to-fine pyramid vs full-resolution segmentation
+# Run from the project root: python benchmark_pyramid.py
+#
+# segment_roof_pyramid stays experimental (and off the app's path)
+# until every level passes these gates.
+
+import sys
+import time
+import numpy as np
+from PIL import Image
+from models.roof_segmentation import SimplifiedRoofSegmenter
+
+SAMPLES = [f"data/sample_images/roof{i}.jpg" for i in range(1, 5)]
+SCALES = [1, 2, 4]  # Upsampling factors to mimic higher-resolution inputs
+LEVELS = [1, 2]
+REPEATS = 7
+
+# Pass/fail at every pyramid level: median speedup over segment_roof,
+# and p90 roof-area error vs segment_roof (%). A pyramid that picks the
+# wrong roof on one image in ten is not a drop-in replacement.
+MIN_SPEEDUP = 1.5
+MAX_P90_AREA_ERROR = 5.0
+
+
+def best_time_ms(fn, *args, **kwargs):
+    """Fastest of several runs, in ms"""
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times), result
+
+
+segmenter = SimplifiedRoofSegmenter()
+
+print("Pyramid Segmentation Benchmark")
+print("="*78)
+print(f"{'Image':<12}{'Size':>12}{'Full ms':>10}" +
+      "".join(f"{f'L{l} ms':>10}{f'L{l} err%':>11}" for l in LEVELS))
+print("-"*78)
+
+errors = {level: [] for level in LEVELS}
+speedups = {level: [] for level in LEVELS}
+
+for path in SAMPLES:
+    base = Image.open(path).convert("RGB")
+    for scale in SCALES:
+        image = np.array(base.resize((base.size[0] * scale, base.size[1] * scale)))
+        full_ms, full = best_time_ms(segmenter.segment_roof, image)
+
+        row = f"{path.split('/')[-1]:<12}{f'{image.shape[1]}x{image.shape[0]}':>12}{full_ms:>10.1f}"
+        for level in LEVELS:
+            ms, result = best_time_ms(segmenter.segment_roof_pyramid, image, levels=level)
+            error = abs(result['roof_area_sqft'] - full['roof_area_sqft']) / max(full['roof_area_sqft'], 1) * 100
+            errors[level].append(error)
+            speedups[level].append(full_ms / ms)
+            row += f"{ms:>10.1f}{error:>11.1f}"
+        print(row)
+
+print("-"*78)
+failures = []
+for level in LEVELS:
+    speedup, p90 = np.median(speedups[level]), np.percentile(errors[level], 90)
+    print(f"L{level}: median speedup {speedup:.2f}x, "
+          f"median area error {np.median(errors[level]):.1f}%, "
+          f"p90 area error {p90:.1f}%, max area error {np.max(errors[level]):.1f}%")
+    if speedup < MIN_SPEEDUP:
+        failures.append(f"L{level} median speedup {speedup:.2f}x < {MIN_SPEEDUP:.2f}x")
+    if p90 > MAX_P90_AREA_ERROR:
+        failures.append(f"L{level} p90 area error {p90:.1f}% > {MAX_P90_AREA_ERROR:.1f}%")
+
+if failures:
+    print("\n❌ Pyramid outside tolerance, keep it experimental:")
+    for failure in failures:
+        print(f"  - {failure}")
+    sys.exit(1)
+print("\n✅ Pyramid within tolerance")
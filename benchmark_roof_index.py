@@ -0,0 +1,69 @@
+# Benchmark: exact vs IVF nearest-neighbour search over roof embeddings
+# Run from the project root: python benchmark_roof_index.py
+# Uses synthetic clustered 2048-d vectors (ResNet embeddings are not needed)
+
+import shutil
+import time
+import numpy as np
+from models.roof_index import BruteForceIndex, IVFIndex, normalize
+
+DIM = 2048
+SIZES = [10_000, 50_000]
+QUERIES = 50
+K = 10
+INDEX_DIR = "data/cache/benchmark_index"
+
+
+def synthetic(n, rng, clusters=200):
+    """Clustered vectors, roughly like embeddings of similar-looking roofs"""
+    centers = rng.normal(size=(clusters, DIM)).astype(np.float32)
+    return centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, DIM)).astype(np.float32)
+
+
+def query_ms(index, queries):
+    """Median single-query latency in ms, plus the results"""
+    times, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, K))
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times)), results
+
+
+def recall(results, exact):
+    return np.mean([len({key for key, _ in r} & {key for key, _ in e}) / K for r, e in zip(results, exact)])
+
+
+rng = np.random.default_rng(0)
+
+print("Roof Index Benchmark")
+print("="*72)
+print(f"{'Vectors':>10}{'Index':>18}{'Build s':>10}{'Query ms':>11}{'Recall@10':>12}")
+print("-"*72)
+
+for n in SIZES:
+    vectors = synthetic(n, rng)
+    keys = [f"roof{i}" for i in range(n)]
+    queries = normalize(vectors[rng.choice(n, QUERIES)] + 0.1 * rng.normal(size=(QUERIES, DIM)))
+
+    shutil.rmtree(INDEX_DIR, ignore_errors=True)
+    start = time.perf_counter()
+    exact_index = BruteForceIndex(f"{INDEX_DIR}/exact", DIM)
+    exact_index.add(keys, vectors)
+    build_s = time.perf_counter() - start
+    exact_ms, exact = query_ms(exact_index, queries)
+    print(f"{n:>10}{'brute force':>18}{build_s:>10.1f}{exact_ms:>11.2f}{1.0:>12.3f}")
+
+    n_lists = int(4 * np.sqrt(n))
+    for n_probe in [4, 16]:
+        start = time.perf_counter()
+        ivf = IVFIndex(f"{INDEX_DIR}/ivf{n_probe}", DIM, n_lists=n_lists, n_probe=n_probe)
+        ivf.add(keys, vectors)
+        ivf.train()
+        build_s = time.perf_counter() - start
+        ms, results = query_ms(ivf, queries)
+        print(f"{n:>10}{f'IVF {n_lists}/{n_probe}':>18}{build_s:>10.1f}{ms:>11.2f}{recall(results, exact):>12.3f}")
+
+shutil.rmtree(INDEX_DIR, ignore_errors=True)
+print("-"*72)
+print("Query ms is the median latency of one query; recall is vs brute force")
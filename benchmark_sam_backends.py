@@ -0,0 +1,86 @@
+# Benchmark: SAM CPU backends (ONNX Runtime / TorchScript / int8) vs eager PyTorch
+# Run from the project root after exporting:
+#   python download_models.py --export onnx
+#   python benchmark_sam_backends.py
+
+import os
+import time
+import numpy as np
+from PIL import Image
+from models.roof_segmentation import RoofSegmenter
+from models.sam_backends import (ENCODER_ARTIFACTS, PRETRAINED_DIR, TorchDecoder,
+                                 load_decoder, load_encoder, mask_iou)
+
+SAMPLES = [f"data/sample_images/roof{i}.jpg" for i in range(1, 5)]
+CHECKPOINT = "models/pretrained/sam_vit_b.pth"
+POINTS_PER_SIDE = 8  # Fixed prompt grid, decoded in DECODE_CHUNK batches
+MIN_IOU = 0.9  # Parity threshold against the torch reference
+
+
+def prompt_grid(image):
+    """(N, 2) point prompts at cell centres, the same for every backend"""
+    h, w = image.shape[:2]
+    offsets = (np.arange(POINTS_PER_SIDE) + 0.5) / POINTS_PER_SIDE
+    xs, ys = np.meshgrid(offsets * w, offsets * h)
+    return np.stack([xs.ravel(), ys.ravel()], axis=1)
+
+
+def run(segmenter, image):
+    """
+    Encode on a cold cache, then decode the fixed prompt grid
+
+    Returns:
+        (encode_ms, decode_ms, masks): decode_ms times the decoder calls
+        only; masks are the (N, 256, 256) low-res masks it produced
+    """
+
+    segmenter.reset_image()
+
+    start = time.perf_counter()
+    segmenter.set_image(image)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    logits, _ = segmenter.decode_points(prompt_grid(image))
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    return encode_ms, decode_ms, logits > segmenter.sam.mask_threshold
+
+
+segmenter = RoofSegmenter(CHECKPOINT, backend='torch')
+
+# Every encoder that can run here, each paired with the ONNX decoder if exported
+backends = ['torch', 'torch_int8'] + [
+    name for name, filename in ENCODER_ARTIFACTS.items()
+    if os.path.exists(os.path.join(PRETRAINED_DIR, filename))
+]
+
+images = [np.array(Image.open(path).convert("RGB")) for path in SAMPLES]
+
+# Reference masks from eager PyTorch
+reference = [run(segmenter, image) for image in images]
+
+print("SAM Backend Benchmark")
+print("="*72)
+print(f"{'Backend':<28}{'Encode ms':>12}{'Decode ms':>12}{'Min IoU':>10}{'Mean IoU':>10}")
+print("-"*72)
+
+for name in backends:
+    segmenter.encoder = load_encoder(segmenter.sam, name)
+    segmenter.decoder = TorchDecoder(segmenter.sam) if name.startswith('torch') else load_decoder(segmenter.sam)
+    label = f"{segmenter.encoder.name} + {segmenter.decoder.name}"
+
+    encode_times, decode_times, ious = [], [], []
+    for image, (_, _, ref) in zip(images, reference):
+        encode_ms, decode_ms, masks = run(segmenter, image)
+        encode_times.append(encode_ms)
+        decode_times.append(decode_ms)
+        ious += [mask_iou(mask, ref_mask) for mask, ref_mask in zip(masks, ref)]
+
+    status = "✓" if min(ious) >= MIN_IOU else "⚠️"
+    print(f"{label:<28}{np.median(encode_times):>12.0f}{np.median(decode_times):>12.0f}"
+          f"{min(ious):>10.3f}{np.mean(ious):>10.3f}  {status}")
+
+print("-"*72)
+print(f"Decode is {POINTS_PER_SIDE}x{POINTS_PER_SIDE} point prompts per image; "
+      f"IoU is per prompt mask vs eager PyTorch, parity target >= {MIN_IOU}")
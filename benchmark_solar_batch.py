@@ -0,0 +1,59 @@
+# Benchmark: SolarCalculator batch API on a synthetic portfolio
+# Checks the batch results against the per-roof methods, then times 1M roofs.
+#   python benchmark_solar_batch.py
+
+import time
+import numpy as np
+import pandas as pd
+from utils.calculations import SolarCalculator
+
+N_ROOFS = 1_000_000
+N_CHECK = 2000  # Roofs compared against the scalar methods
+ORIENTATIONS = list(SolarCalculator.ORIENTATION_FACTORS) + ["Unknown"]
+
+rng = np.random.default_rng(0)
+roofs = pd.DataFrame({
+    'usable_area_sqft': rng.uniform(100, 5000, N_ROOFS),
+    'solar_irradiance': rng.uniform(3, 7, N_ROOFS),
+    'shading_percent': rng.uniform(0, 60, N_ROOFS),
+    'orientation': rng.choice(ORIENTATIONS, N_ROOFS),
+})
+
+calc = SolarCalculator()
+
+print("Solar Batch Benchmark")
+print("="*60)
+
+# Parity with the per-roof methods
+sample = roofs.iloc[:N_CHECK]
+batch = calc.calculate_portfolio(sample)
+mismatches = 0
+start = time.perf_counter()
+for roof, row in zip(sample.itertuples(), batch.itertuples()):
+    size, panels = calc.calculate_system_size(roof.usable_area_sqft)
+    production = calc.calculate_production(size, roof.solar_irradiance, roof.shading_percent, roof.orientation)
+    roi = calc.calculate_roi(size, production)
+    expected = {'system_size_kw': size, 'panel_count': panels, 'annual_production_kwh': production, **roi}
+    mismatches += any(getattr(row, key) != value for key, value in expected.items())
+scalar_ms = (time.perf_counter() - start) * 1000
+
+print(f"Parity: {N_CHECK - mismatches}/{N_CHECK} roofs identical to the scalar methods")
+print(f"Scalar loop: {scalar_ms / N_CHECK * 1000:.1f} µs/roof "
+      f"(~{scalar_ms / N_CHECK * N_ROOFS / 1000:.0f} s for {N_ROOFS:,} roofs)")
+
+# Full portfolio
+times = []
+for _ in range(3):
+    start = time.perf_counter()
+    result = calc.calculate_portfolio(roofs)
+    times.append((time.perf_counter() - start) * 1000)
+
+print(f"Batch: {N_ROOFS:,} roofs in {min(times):.0f} ms")
+
+roofs['orientation'] = roofs['orientation'].astype('category')
+start = time.perf_counter()
+calc.calculate_portfolio(roofs)
+print(f"Batch, categorical orientation: {(time.perf_counter() - start) * 1000:.0f} ms")
+print(f"Portfolio production: {result['annual_production_kwh'].sum() / 1e9:.2f} TWh/yr, "
+      f"median payback {result['payback_period'].median():.1f} years")
+print("="*60)
@@ -4,8 +4,28 @@
 import numpy as np
 import pandas as pd
 
+from utils.solar_simulation import HourlySolarSimulator, orientation_azimuth
+from utils.rainwater_simulation import TankSimulator, synthetic_rainfall
+
 class SolarCalculator:
-    """Calculate solar metrics"""
+    """Calculate solar metrics
+    
+    Every calculate_* method has a *_batch twin taking NumPy arrays (one
+    entry per roof, scalars broadcast) for portfolio runs.
+    """
+    
+    # Production relative to a south-facing roof
+    ORIENTATION_FACTORS = {
+        "South": 1.0,
+        "South-West": 0.95,
+        "South-East": 0.95,
+        "West": 0.88,
+        "East": 0.88,
+        "North-West": 0.78,
+        "North-East": 0.78,
+        "North": 0.68
+    }
+    DEFAULT_ORIENTATION_FACTOR = 0.9  # Unknown orientation
     
     def __init__(self):
         self.panel_wattage = 400  # Watts per panel
@@ -14,6 +34,26 @@ class SolarCalculator:
         self.electricity_rate = 0.13  # USD per kWh
         self.degradation_rate = 0.005  # 0.5% per year
         self.federal_tax_credit = 0.30  # 30% ITC
+        self.rate_escalation = 0.03  # Electricity price rise per year
+        self.projection_years = 25
+    
+    def lifetime_savings_factor(self):
+        """
+        Sum over the projection of each year's savings relative to year 0
+        
+        Year y earns (1 - degradation)^y * (1 + escalation)^y of the first
+        year's savings, so the total is the geometric series
+        r + r^2 + ... + r^n = r (1 - r^n) / (1 - r).
+        
+        The rates may be arrays (e.g. Monte Carlo samples); the factor
+        then has their shape.
+        """
+        r = (1 - np.asarray(self.degradation_rate, dtype=np.float64)) * (1 + np.asarray(self.rate_escalation))
+        n = self.projection_years
+        near_one = np.isclose(r, 1.0)
+        r_safe = np.where(near_one, 0.5, r)  # Keeps the unused branch finite
+        factor = np.where(near_one, float(n), r_safe * (1 - r_safe ** n) / (1 - r_safe))
+        return factor if factor.ndim else float(factor)
     
     def calculate_system_size(self, usable_area_sqft):
         """Calculate system size in kW"""
@@ -21,6 +61,11 @@ class SolarCalculator:
         system_size_kw = (panel_count * self.panel_wattage) / 1000
         return system_size_kw, panel_count
     
+    def system_size_for_panels(self, panel_count):
+        """System size in kW for a laid-out panel count (PanelPacker)"""
+        panel_count = int(panel_count)
+        return (panel_count * self.panel_wattage) / 1000, panel_count
+    
     def calculate_production(self, system_size_kw, solar_irradiance, 
                             shading_percent=0, orientation="South"):
         """
@@ -37,17 +82,7 @@ class SolarCalculator:
         daily_production = system_size_kw * solar_irradiance * 0.75  # 75% system efficiency
         
         # Orientation factor
-        orientation_factors = {
-            "South": 1.0,
-            "South-West": 0.95,
-            "South-East": 0.95,
-            "West": 0.88,
-            "East": 0.88,
-            "North-West": 0.78,
-            "North-East": 0.78,
-            "North": 0.68
-        }
-        orientation_factor = orientation_factors.get(orientation, 0.9)
+        orientation_factor = self.ORIENTATION_FACTORS.get(orientation, self.DEFAULT_ORIENTATION_FACTOR)
         
         # Shading factor
         shading_factor = 1.0 - (shading_percent / 100)
@@ -57,6 +92,32 @@ class SolarCalculator:
         
         return int(annual_production)
     
+    def calculate_production_hourly(self, system_size_kw, latitude, solar_irradiance,
+                                    shading_percent=0, orientation="South", tilt=20, avg_temp=25):
+        """
+        Annual energy production from an hourly simulation of a typical year
+        
+        Replaces the flat 75% efficiency of calculate_production with
+        sun position, plane-of-array irradiance for the panel tilt and
+        orientation, and temperature derating (see solar_simulation.py).
+        
+        Args:
+            system_size_kw: System size in kilowatts
+            latitude: Site latitude in degrees
+            solar_irradiance: Mean daily irradiance (kWh/m²/day)
+            shading_percent: Percentage of shading (0-100)
+            orientation: Roof orientation
+            tilt: Panel tilt in degrees
+            avg_temp: Mean air temperature (°C)
+        """
+        
+        simulation = HourlySolarSimulator().simulate(
+            system_size_kw, latitude, solar_irradiance, tilt=tilt,
+            azimuth=orientation_azimuth(orientation, latitude),
+            avg_temp=avg_temp, shading_percent=shading_percent
+        )
+        return int(simulation['annual_kwh'][0])
+    
     def calculate_roi(self, system_size_kw, annual_production_kwh):
         """Calculate financial metrics"""
         
@@ -67,12 +128,8 @@ class SolarCalculator:
         annual_savings = annual_production_kwh * self.electricity_rate
         payback_period = net_cost / annual_savings if annual_savings > 0 else 99
         
-        # 25-year projection
-        total_savings = 0
-        for year in range(1, 26):
-            year_production = annual_production_kwh * ((1 - self.degradation_rate) ** year)
-            year_savings = year_production * self.electricity_rate * ((1 + 0.03) ** year)
-            total_savings += year_savings
+        # 25-year projection (degrading output, rising electricity prices)
+        total_savings = annual_savings * self.lifetime_savings_factor()
         
         return {
             'gross_cost': int(gross_cost),
@@ -80,17 +137,124 @@ class SolarCalculator:
             'annual_savings': int(annual_savings),
             'payback_period': round(payback_period, 1),
             'total_25yr_savings': int(total_savings),
-            'roi_percent': round(((total_savings - net_cost) / net_cost) * 100, 1)
+            'roi_percent': round(((total_savings - net_cost) / net_cost) * 100, 1) if net_cost > 0 else 0.0
+        }
+    
+    def calculate_system_size_batch(self, usable_area_sqft):
+        """calculate_system_size over an array of areas: (system_size_kw, panel_count) arrays"""
+        panel_count = (np.asarray(usable_area_sqft, dtype=np.float64) / self.panel_area_sqft).astype(np.int64)
+        system_size_kw = (panel_count * self.panel_wattage) / 1000
+        return system_size_kw, panel_count
+    
+    def orientation_factors_batch(self, orientation):
+        """
+        Orientation factor per roof (strings; unknown ones get the default)
+        
+        Categorical input (e.g. a 'category' column) skips hashing entirely.
+        """
+        
+        if isinstance(orientation, str):
+            return self.ORIENTATION_FACTORS.get(orientation, self.DEFAULT_ORIENTATION_FACTOR)
+        
+        if isinstance(getattr(orientation, 'dtype', None), pd.CategoricalDtype):
+            categorical = pd.Categorical(orientation)
+            codes, labels = categorical.codes, categorical.categories
+        else:
+            # Hash each distinct label once instead of looking up every roof
+            codes, labels = pd.factorize(np.asarray(orientation, dtype=object).ravel())
+        lookup = np.array([self.ORIENTATION_FACTORS.get(label, self.DEFAULT_ORIENTATION_FACTOR)
+                           for label in labels] + [self.DEFAULT_ORIENTATION_FACTOR])
+        # Missing values (code -1) pick the trailing default
+        return lookup[codes].reshape(np.shape(orientation))
+    
+    def calculate_production_batch(self, system_size_kw, solar_irradiance,
+                                   shading_percent=0, orientation="South"):
+        """
+        calculate_production over arrays (scalars broadcast)
+        
+        Returns:
+            int64 array of annual production in kWh
+        """
+        
+        orientation_factor = self.orientation_factors_batch(orientation)
+        shading_factor = 1.0 - np.asarray(shading_percent, dtype=np.float64) / 100
+        # Same operation order as calculate_production, so results match it exactly
+        daily_production = np.asarray(system_size_kw, dtype=np.float64) * solar_irradiance * 0.75
+        annual_production = daily_production * 365 * orientation_factor * shading_factor
+        return annual_production.astype(np.int64)
+    
+    def calculate_roi_batch(self, system_size_kw, annual_production_kwh):
+        """
+        calculate_roi over arrays
+        
+        Returns:
+            dict of arrays with calculate_roi's keys (roi_percent is 0
+            where the net cost is 0, as for an empty system)
+        """
+        
+        gross_cost = np.asarray(system_size_kw, dtype=np.float64) * 1000 * self.cost_per_watt
+        net_cost = gross_cost - gross_cost * self.federal_tax_credit
+        annual_savings = np.asarray(annual_production_kwh, dtype=np.float64) * self.electricity_rate
+        total_savings = annual_savings * self.lifetime_savings_factor()
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payback_period = np.where(annual_savings > 0, net_cost / annual_savings, 99)
+            roi_percent = np.where(net_cost > 0, (total_savings - net_cost) / net_cost * 100, 0.0)
+        
+        return {
+            'gross_cost': gross_cost.astype(np.int64),
+            'net_cost': net_cost.astype(np.int64),
+            'annual_savings': annual_savings.astype(np.int64),
+            'payback_period': np.round(payback_period, 1),
+            'total_25yr_savings': total_savings.astype(np.int64),
+            'roi_percent': np.round(roi_percent, 1)
         }
+    
+    def calculate_portfolio(self, roofs):
+        """
+        Size, production and ROI for many roofs at once
+        
+        Args:
+            roofs: DataFrame (or dict of arrays) with usable_area_sqft and
+                   solar_irradiance columns, and optionally shading_percent
+                   and orientation
+        
+        Returns:
+            DataFrame with one row per roof: system_size_kw, panel_count,
+            annual_production_kwh and the calculate_roi outputs
+        """
+        
+        roofs = pd.DataFrame(roofs)
+        shading = roofs['shading_percent'].to_numpy() if 'shading_percent' in roofs else 0
+        orientation = roofs['orientation'] if 'orientation' in roofs else "South"
+        
+        system_size_kw, panel_count = self.calculate_system_size_batch(roofs['usable_area_sqft'].to_numpy())
+        production = self.calculate_production_batch(
+            system_size_kw, roofs['solar_irradiance'].to_numpy(), shading, orientation)
+        
+        return pd.DataFrame({
+            'system_size_kw': system_size_kw,
+            'panel_count': panel_count,
+            'annual_production_kwh': production,
+            **self.calculate_roi_batch(system_size_kw, production)
+        }, index=roofs.index)
 
 
 class RainwaterCalculator:
-    """Calculate rainwater harvesting potential"""
+    """Calculate rainwater harvesting potential
+    
+    calculate_collection / calculate_savings have *_batch twins taking
+    NumPy arrays, like SolarCalculator.
+    """
     
     def __init__(self):
         self.collection_efficiency = 0.85  # 85% collection efficiency
         self.water_rate = 0.02  # USD per liter (varies by location)
         self.tank_cost_per_liter = 0.5  # USD
+        self.first_flush_mm = 0.5  # Diverted from each rain day
+        self.daily_demand_liters = 300  # Non-potable use: toilets, laundry, garden
+        self.target_reliability = 0.9  # Share of days the tank should cover
+        self.simulation_years = 10  # Synthetic daily rainfall when no series is given
     
     def calculate_collection(self, roof_area_sqft, annual_rainfall_mm):
         """
@@ -110,13 +274,74 @@ class RainwaterCalculator:
         
         return int(annual_collection)
     
-    def calculate_savings(self, annual_collection_liters):
-        """Calculate financial savings"""
+    def calculate_tank_sizing(self, roof_area_sqft, annual_rainfall_mm, daily_rainfall_mm=None,
+                              daily_demand_liters=None, demand_pattern=None):
+        """
+        Tank size from a daily water-balance simulation
+        
+        Every candidate tank is run through the rainfall series (see
+        rainwater_simulation.py); the smallest one meeting demand on
+        target_reliability of days is chosen. When no tank can (the roof
+        collects too little for the demand), the smallest tank within 95%
+        of the best achievable reliability is chosen instead.
+        
+        Args:
+            roof_area_sqft: Roof catchment area
+            annual_rainfall_mm: Annual rainfall in millimeters
+            daily_rainfall_mm: Optional measured daily series; synthesised
+                from annual_rainfall_mm when not given
+            daily_demand_liters: Mean daily demand (default daily_demand_liters)
+            demand_pattern: Optional demand multipliers (see TankSimulator.simulate)
+        
+        Returns:
+            dict: tank_size, meets_target, reliability and
+            self_sufficiency_percent for that tank, annual_supplied,
+            annual_overflow and annual_unmet liters, and the
+            tank_sizes / reliabilities curve
+        """
+        
+        if daily_rainfall_mm is None:
+            daily_rainfall_mm = synthetic_rainfall(annual_rainfall_mm, years=self.simulation_years)[0]
+        demand = self.daily_demand_liters if daily_demand_liters is None else daily_demand_liters
+        
+        simulation = TankSimulator(self.collection_efficiency, self.first_flush_mm).simulate(
+            daily_rainfall_mm, roof_area_sqft, demand, demand_pattern,
+            target_reliability=self.target_reliability
+        )
+        
+        reliability = simulation['reliability']
+        meets_target = not np.isnan(simulation['recommended_tank'])
+        if meets_target:
+            index = int(np.searchsorted(simulation['tank_sizes'], simulation['recommended_tank']))
+        else:
+            index = int(np.argmax(reliability >= 0.95 * reliability.max()))
+        
+        return {
+            'tank_size': int(simulation['tank_sizes'][index]),
+            'meets_target': meets_target,
+            'reliability': round(float(reliability[index]) * 100, 1),
+            'self_sufficiency_percent': round(float(simulation['volumetric_reliability'][index]) * 100, 1),
+            'annual_supplied': int(simulation['supplied_per_year'][index]),
+            'annual_overflow': int(simulation['overflow_per_year'][index]),
+            'annual_unmet': int(simulation['unmet_per_year'][index]),
+            'tank_sizes': simulation['tank_sizes'],
+            'reliabilities': reliability
+        }
+    
+    def calculate_savings(self, annual_collection_liters, tank_size_liters=None):
+        """
+        Calculate financial savings
+        
+        Args:
+            annual_collection_liters: Water used per year (all of it
+                collected, or calculate_tank_sizing's annual_supplied)
+            tank_size_liters: Tank size (default: two months of collection)
+        """
         
         annual_savings = annual_collection_liters * self.water_rate
         
         # Tank size (store 2 months supply)
-        tank_size = annual_collection_liters / 6
+        tank_size = annual_collection_liters / 6 if tank_size_liters is None else tank_size_liters
         tank_cost = tank_size * self.tank_cost_per_liter
         
         # Additional costs
@@ -132,6 +357,37 @@ class RainwaterCalculator:
             'annual_savings': int(annual_savings),
             'payback_period': round(payback_period, 1)
         }
+    
+    def calculate_collection_batch(self, roof_area_sqft, annual_rainfall_mm):
+        """calculate_collection over arrays (scalars broadcast): int64 liters"""
+        roof_area_m2 = np.asarray(roof_area_sqft, dtype=np.float64) * 0.092903
+        annual_collection = roof_area_m2 * annual_rainfall_mm * self.collection_efficiency
+        return annual_collection.astype(np.int64)
+    
+    def calculate_savings_batch(self, annual_collection_liters, tank_size_liters=None):
+        """calculate_savings over arrays: dict of arrays with the same keys"""
+        
+        annual_collection_liters = np.asarray(annual_collection_liters, dtype=np.float64)
+        annual_savings = annual_collection_liters * self.water_rate
+        
+        if tank_size_liters is None:
+            tank_size = annual_collection_liters / 6
+        else:
+            tank_size = np.broadcast_to(np.asarray(tank_size_liters, dtype=np.float64), annual_collection_liters.shape)
+        tank_cost = tank_size * self.tank_cost_per_liter
+        installation_cost = 500  # Pipes, filters, pump
+        total_cost = tank_cost + installation_cost
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payback_period = np.where(annual_savings > 0, total_cost / annual_savings, 99)
+        
+        return {
+            'annual_collection': annual_collection_liters.astype(np.int64),
+            'tank_size': tank_size.astype(np.int64),
+            'installation_cost': total_cost.astype(np.int64),
+            'annual_savings': annual_savings.astype(np.int64),
+            'payback_period': np.round(payback_period, 1)
+        }
 
 
 class GardeningCalculator:
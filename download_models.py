@@ -1,9 +1,11 @@
 # models/download_models.py
 # Download pre-trained models - NO TRAINING NEEDED!
 
+import argparse
 import os
 import torch
 from segment_anything import sam_model_registry, SamPredictor
+from models.backbones import BACKBONES, DEFAULT_BACKBONE, PRETRAINED_DIR, get_backbone
 import urllib.request
 from tqdm import tqdm
 
@@ -19,7 +21,102 @@ def download_file(url, filename):
     urllib.request.urlretrieve(url, filename, reporthook)
     print("\nDownload complete!")
 
-def setup_models():
+def export_sam_encoder(sam, fmt="onnx", quantize=True, out_dir="models/pretrained"):
+    """Export the image encoder (optionally plus a dynamic int8 copy)"""
+    
+    from models.sam_backends import ENCODER_ARTIFACTS
+    
+    encoder = sam.image_encoder
+    image = torch.randn(1, 3, encoder.img_size, encoder.img_size)
+    
+    if fmt == 'torchscript':
+        path = os.path.join(out_dir, ENCODER_ARTIFACTS['torchscript'])
+        with torch.no_grad():
+            torch.jit.trace(encoder, image).save(path)
+        print(f"✓ Encoder saved to {path}")
+        
+        if quantize:
+            quantized = torch.ao.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+            path = os.path.join(out_dir, ENCODER_ARTIFACTS['torchscript_int8'])
+            with torch.no_grad():
+                torch.jit.trace(quantized, image).save(path)
+            print(f"✓ Quantized encoder saved to {path}")
+        return
+    
+    path = os.path.join(out_dir, ENCODER_ARTIFACTS['onnx'])
+    torch.onnx.export(encoder, image, path, input_names=['image'],
+                      output_names=['image_embeddings'], opset_version=17, dynamo=False)
+    print(f"✓ Encoder saved to {path}")
+    
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(out_dir, ENCODER_ARTIFACTS['onnx_int8'])
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QUInt8)
+        print(f"✓ Quantized encoder saved to {int8_path}")
+
+def export_sam_decoder(sam, out_dir="models/pretrained"):
+    """Export the prompt encoder + mask decoder to ONNX, batched over prompts"""
+    
+    from segment_anything.utils.onnx import SamOnnxModel
+    from models.sam_backends import DECODER_ARTIFACT
+    
+    decoder = SamOnnxModel(sam, return_single_mask=False)
+    embed_size = sam.prompt_encoder.image_embedding_size
+    inputs = {
+        'image_embeddings': torch.randn(1, sam.prompt_encoder.embed_dim, *embed_size),
+        'point_coords': torch.randint(0, 1024, (2, 5, 2), dtype=torch.float),
+        'point_labels': torch.randint(0, 4, (2, 5), dtype=torch.float),
+        'mask_input': torch.randn(1, 1, 4 * embed_size[0], 4 * embed_size[1]),
+        'has_mask_input': torch.tensor([0], dtype=torch.float),
+        'orig_im_size': torch.tensor([1500, 2250], dtype=torch.float),
+    }
+    path = os.path.join(out_dir, DECODER_ARTIFACT)
+    torch.onnx.export(
+        decoder, tuple(inputs.values()), path,
+        input_names=list(inputs), output_names=['masks', 'iou_predictions', 'low_res_masks'],
+        dynamic_axes={
+            'point_coords': {0: 'num_prompts', 1: 'num_points'},
+            'point_labels': {0: 'num_prompts', 1: 'num_points'},
+        },
+        opset_version=17, dynamo=False
+    )
+    print(f"✓ Decoder saved to {path}")
+
+def export_sam(checkpoint="models/pretrained/sam_vit_b.pth", fmt="onnx", quantize=True,
+               out_dir="models/pretrained"):
+    """
+    Export SAM for the CPU backends in sam_backends.py
+    
+    Args:
+        checkpoint: SAM ViT-B checkpoint
+        fmt: Encoder format, 'onnx' (ONNX Runtime) or 'torchscript'
+        quantize: Also write a dynamic int8 version of the encoder
+        out_dir: Where the artifacts are written
+    """
+    
+    os.makedirs(out_dir, exist_ok=True)
+    sam = sam_model_registry["vit_b"](checkpoint=checkpoint)
+    sam.eval()
+    
+    export_sam_encoder(sam, fmt, quantize, out_dir)
+    if fmt == 'onnx':
+        export_sam_decoder(sam, out_dir)
+
+def download_backbone(name=DEFAULT_BACKBONE, out_dir=PRETRAINED_DIR):
+    """Save the ImageNet weights of one deep-feature backbone (skipped if present)"""
+    
+    backbone = get_backbone(name)
+    path = os.path.join(out_dir, backbone.weights_file)
+    if os.path.exists(path):
+        print(f"✓ {backbone.arch} weights already exist")
+        return path
+    
+    print("Downloading via PyTorch...")
+    torch.save(backbone.download(), path)
+    print(f"✓ {backbone.arch} weights saved to {path}")
+    return path
+
+def setup_models(backbone=DEFAULT_BACKBONE):
     """Download all required pre-trained models"""
     
     os.makedirs('models/pretrained', exist_ok=True)
@@ -39,25 +136,33 @@ def setup_models():
     else:
         print("✓ SAM model already exists")
     
-    # 2. ResNet for feature extraction (pre-trained on ImageNet)
-    print("\n[2/2] ResNet50 for feature extraction")
-    print("Downloading via PyTorch...")
-    
-    from torchvision import models
-    resnet = models.resnet50(pretrained=True)
-    torch.save(resnet.state_dict(), 'models/pretrained/resnet50.pth')
-    print("✓ ResNet50 downloaded")
+    # 2. Backbone for deep features (pre-trained on ImageNet); only the
+    # selected one is fetched, see models/backbones.py for the choices
+    print(f"\n[2/2] {backbone} for feature extraction")
+    download_backbone(backbone)
     
     print("\n" + "="*60)
     print("✅ ALL MODELS READY!")
     print("="*60)
     print("\nYou now have:")
     print("1. SAM for roof segmentation (no training needed)")
-    print("2. ResNet50 for feature extraction (pre-trained)")
+    print(f"2. {backbone} for feature extraction (pre-trained)")
     print("\nNo training required! These work out of the box.")
 
 if __name__ == "__main__":
-    setup_models()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', choices=['onnx', 'torchscript'],
+                        help="Also export SAM for the faster CPU backends")
+    parser.add_argument('--no-quantize', action='store_true', help="Skip the int8 encoder")
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=DEFAULT_BACKBONE,
+                        help="Deep-feature backbone to fetch (set ROOF_BACKBONE to match)")
+    args = parser.parse_args()
+    
+    setup_models(args.backbone)
+    
+    if args.export:
+        print(f"\nExporting SAM ({args.export})...")
+        export_sam(fmt=args.export, quantize=not args.no_quantize)
     
     # Test if models work
     print("\n" + "="*60)
@@ -71,10 +176,9 @@ if __name__ == "__main__":
         sam = sam_model_registry[model_type](checkpoint=sam_checkpoint)
         print("✓ SAM model loaded successfully")
         
-        # Test ResNet
-        resnet = models.resnet50()
-        resnet.load_state_dict(torch.load('models/pretrained/resnet50.pth'))
-        print("✓ ResNet50 loaded successfully")
+        # Test the feature backbone
+        get_backbone(args.backbone).build()
+        print(f"✓ {args.backbone} loaded successfully")
         
         print("\n🎉 All models working perfectly!")
         
@@ -0,0 +1,131 @@
+# models/embedding_store.py
+# Append-only, memory-mapped store of image embeddings
+
+import os
+import threading
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    float32 embeddings on disk, one row per image, indexed by image hash
+
+    Rows are only ever appended: vectors go to <dir>/embeddings.f32 and
+    their keys to <dir>/keys.txt, in the same order. Reads go through a
+    memory map, so a large fleet never has to fit in RAM. The vector
+    width is kept in <dir>/dim.txt, so a store built with one backbone
+    cannot be read with another's width.
+    """
+
+    def __init__(self, store_dir, dim=None):
+        """
+        Args:
+            store_dir: Directory holding the store (created if missing)
+            dim: Vector width, e.g. the backbone's embedding_dim. Must
+                match a non-empty store's; None takes the stored width,
+                or that of the first add
+        """
+
+        self.store_dir = store_dir
+        self.data_path = os.path.join(store_dir, "embeddings.f32")
+        self.keys_path = os.path.join(store_dir, "keys.txt")
+        self.dim_path = os.path.join(store_dir, "dim.txt")
+        self._lock = threading.Lock()
+        self._mmap = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        self.keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, 'r') as f:
+                self.keys = [line.strip() for line in f if line.strip()]
+
+        stored_dim = None
+        if os.path.exists(self.dim_path):
+            with open(self.dim_path, 'r') as f:
+                stored_dim = int(f.read().strip())
+        elif self.keys:
+            if dim is None:
+                raise ValueError(f"Embedding store {store_dir} has no {os.path.basename(self.dim_path)}, pass dim")
+            stored_dim = dim  # Written before widths were recorded
+            self._write_dim(dim)
+        if dim is not None and stored_dim is not None and dim != stored_dim:
+            raise ValueError(f"Embedding store {store_dir} holds {stored_dim}-d vectors, not {dim}-d")
+        self.dim = stored_dim if stored_dim is not None else dim
+
+        # Vectors are written before keys, so an interrupted append can
+        # leave extra rows but never keys without a vector
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        rows = size // (4 * self.dim) if self.dim else 0
+        if rows < len(self.keys):
+            print(f"⚠️ Embedding store has {len(self.keys)} keys but {rows} rows, dropping the extra keys")
+            self.keys = self.keys[:rows]
+        # Rows past the last key (and any partial row) would otherwise
+        # sit between the stored rows and the next append
+        if size > len(self.keys) * 4 * (self.dim or 0):
+            print(f"⚠️ Embedding store has rows without keys, truncating to {len(self.keys)}")
+            os.truncate(self.data_path, len(self.keys) * 4 * (self.dim or 0))
+        self.index = {key: row for row, key in enumerate(self.keys)}
+
+    def _write_dim(self, dim):
+        with open(self.dim_path, 'w') as f:
+            f.write(f"{dim}\n")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    @property
+    def vectors(self):
+        """(rows, dim) read-only memory map of every stored vector"""
+
+        with self._lock:
+            rows = len(self.keys)
+            if self._mmap is None or self._mmap.shape[0] != rows:
+                if rows == 0:
+                    return np.zeros((0, self.dim or 0), dtype=np.float32)
+                self._mmap = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+            return self._mmap
+
+    def get(self, key):
+        """Stored vector for a key, or None"""
+        row = self.index.get(key)
+        return None if row is None else np.array(self.vectors[row])
+
+    def add(self, keys, vectors):
+        """
+        Append vectors (keys already in the store are skipped)
+
+        Args:
+            keys: Image hashes
+            vectors: (len(keys), dim) array
+        """
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_dim(self.dim)
+
+            new, seen = [], set()
+            for i, key in enumerate(keys):
+                # Duplicates within one call are stored once
+                if key not in self.index and key not in seen:
+                    seen.add(key)
+                    new.append(i)
+            if not new:
+                return
+
+            with open(self.data_path, 'ab') as f:
+                f.write(np.ascontiguousarray(vectors[new]).tobytes())
+            with open(self.keys_path, 'a') as f:
+                f.write("".join(keys[i] + "\n" for i in new))
+
+            for i in new:
+                self.index[keys[i]] = len(self.keys)
+                self.keys.append(keys[i])
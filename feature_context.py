@@ -0,0 +1,272 @@
+# models/feature_context.py
+# Per-image preprocessing shared by all roof features
+
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from models.compact_mask import CompactMask
+
+
+# Canny thresholds used by every edge-based feature
+CANNY_LOW = 50
+CANNY_HIGH = 150
+
+# Orientation histogram: bins over [0, 180) degrees of the gradient direction
+ORIENTATION_BINS = 36
+# Gradients weaker than this (Sobel units, as for Canny) are texture noise
+GRADIENT_MIN = CANNY_LOW
+
+# Context kept around the roof bbox so edges at its outline are still found
+ROI_PAD = 4
+
+# Features are computed with the long side downsampled to at most this
+# many pixels. Pixel-sized parameters (blur, mask margins) are tuned for
+# this resolution and shrink with smaller images.
+MAX_DIM = 1024
+
+
+class memoized_property:
+    """
+    Like functools.cached_property, but with one lock per instance and
+    attribute: features running on different threads wait for a single
+    computation of a shared intermediate, while different intermediates
+    still compute concurrently.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        cache = obj.__dict__
+        if self.name not in cache:
+            with obj._lock_for(self.name):
+                if self.name not in cache:
+                    cache[self.name] = self.func(obj)
+        return cache[self.name]
+
+
+class FeatureContext:
+    """
+    Lazily computed, memoized views of one image
+
+    Each intermediate (grayscale, edges, histogram, orientation field,
+    ...) is computed the first time a feature asks for it and then
+    reused, so a full extraction converts and edge-detects the image
+    only once, even when features run on several threads.
+    New features should read from here instead of redoing conversions.
+
+    With a roof mask, the image is cropped to the roof bbox and every
+    statistic covers roof pixels only, so streets and neighbouring
+    roofs no longer leak into the features.
+
+    The (cropped) image is then downsampled once with area interpolation
+    to max_dim, or to target_gsd when the source gsd is known, so a
+    6000 px drone shot costs about the same as a satellite crop.
+    """
+
+    def __init__(self, image, mask=None, max_dim=MAX_DIM, gsd=None, target_gsd=None):
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        rgb = np.array(image) if isinstance(image, Image.Image) else image
+        self.origin = (0, 0)  # (y, x) of the crop in the source image
+        self.mask = None  # uint8 0/255 roof mask over the crop
+        self.max_dim = max_dim
+
+        if mask is not None:
+            mask = mask if isinstance(mask, CompactMask) else CompactMask.from_dense(mask)
+            if mask.area > 0 and mask.shape == rgb.shape[:2]:
+                rgb = self._crop_to_mask(rgb, mask)
+
+        # Working resolution relative to the source (1 = untouched)
+        self.scale = 1.0
+        h, w = rgb.shape[:2]
+        if max_dim and max(h, w) > max_dim:
+            self.scale = max_dim / max(h, w)
+        if gsd and target_gsd and gsd < target_gsd:
+            self.scale = min(self.scale, gsd / target_gsd)
+        self.gsd = gsd / self.scale if gsd else None  # Metres per working pixel
+
+        if self.scale < 1:
+            size = (max(round(w * self.scale), 1), max(round(h * self.scale), 1))
+            rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+            if self.mask is not None:
+                self.mask = cv2.resize(self.mask, size, interpolation=cv2.INTER_NEAREST)
+
+        self.rgb = rgb
+
+    def _crop_to_mask(self, rgb, mask):
+        """Crop to the mask bbox (plus padding) and decode only that window"""
+
+        h, w = rgb.shape[:2]
+        bx, by, bw, bh = mask.bbox
+        y0, x0 = max(by - ROI_PAD, 0), max(bx - ROI_PAD, 0)
+        y1, x1 = min(by + bh + ROI_PAD, h), min(bx + bw + ROI_PAD, w)
+
+        my, mx, crop = mask.crop()
+        window = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        # Overlap of the stored mask window with the ROI
+        oy0, ox0 = max(my, y0), max(mx, x0)
+        oy1, ox1 = min(my + crop.shape[0], y1), min(mx + crop.shape[1], x1)
+        window[oy0 - y0:oy1 - y0, ox0 - x0:ox1 - x0] = crop[oy0 - my:oy1 - my, ox0 - mx:ox1 - mx] * np.uint8(255)
+
+        self.origin = (y0, x0)
+        self.mask = window
+        return rgb[y0:y1, x0:x1]
+
+    def _lock_for(self, name):
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    @classmethod
+    def of(cls, image, mask=None, **kwargs):
+        """Context for an image (contexts are passed through unchanged)"""
+        return image if isinstance(image, cls) else cls(image, mask, **kwargs)
+
+    @property
+    def shape(self):
+        return self.rgb.shape[:2]
+
+    def kernel(self, size):
+        """
+        Odd kernel size for a parameter tuned at MAX_DIM resolution,
+        shrunk for smaller working images (never below 3)
+        """
+        detail = min(max(self.shape) / (self.max_dim or MAX_DIM), 1)
+        return max(int(round(size * detail)) | 1, 3)
+
+    @memoized_property
+    def pixel_count(self):
+        """Pixels the statistics cover (roof pixels when masked)"""
+        if self.mask is None:
+            return self.shape[0] * self.shape[1]
+        return cv2.countNonZero(self.mask)
+
+    @memoized_property
+    def outline_mask(self):
+        """Roof mask grown by ~2 px, so edges on the roof outline are kept"""
+        size = self.kernel(5)
+        return cv2.dilate(self.mask, np.ones((size, size), np.uint8))
+
+    @memoized_property
+    def interior_mask(self):
+        """Roof mask shrunk by ~2 px, for texture stats that must ignore the outline"""
+        size = self.kernel(5)
+        return cv2.erode(self.mask, np.ones((size, size), np.uint8))
+
+    @memoized_property
+    def gray(self):
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+
+    @memoized_property
+    def blurred(self):
+        size = self.kernel(5)
+        return cv2.GaussianBlur(self.gray, (size, size), 0)
+
+    @memoized_property
+    def edges(self):
+        """Canny edges (only on the roof and its outline when masked)"""
+        edges = cv2.Canny(self.gray, CANNY_LOW, CANNY_HIGH)
+        if self.mask is not None:
+            cv2.bitwise_and(edges, self.outline_mask, dst=edges)
+        return edges
+
+    @memoized_property
+    def histogram(self):
+        """256-bin grayscale histogram (of roof pixels when masked)"""
+        return cv2.calcHist([self.gray], [0], self.mask, [256], [0, 256])
+
+    @memoized_property
+    def gray_std(self):
+        if self.mask is None:
+            return float(np.std(self.gray))
+        _, std = cv2.meanStdDev(self.gray, mask=self.mask)
+        return float(std[0, 0])
+
+    @memoized_property
+    def edge_density(self):
+        """Fraction of pixels on an edge (roof interior only when masked)"""
+        if self.mask is None:
+            return cv2.countNonZero(self.edges) / self.edges.size
+        interior = cv2.countNonZero(self.interior_mask)
+        if interior == 0:
+            return 0.0
+        return cv2.countNonZero(cv2.bitwise_and(self.edges, self.interior_mask)) / interior
+
+    @memoized_property
+    def gradients(self):
+        """Sobel (gx, gy) of the blurred image, float32"""
+        gx = cv2.Sobel(self.blurred, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(self.blurred, cv2.CV_32F, 0, 1, ksize=3)
+        return gx, gy
+
+    @memoized_property
+    def orientation(self):
+        """
+        Edge orientation distribution from image gradients
+
+        Angles are gradient directions, i.e. the normals of edges, in
+        degrees over [0, 180) with y pointing down (the same convention
+        as Hough theta). Every pixel with a strong gradient votes with
+        its magnitude, so the distribution does not depend on image size.
+        The dominant direction comes from the structure tensor, which
+        averages orientations correctly across the 0/180 wrap.
+
+        Returns:
+            dict: histogram (sums to 1, or all zeros), bin_centers,
+                  dominant_angle, coherence (0 isotropic .. 1 one
+                  direction), support (fraction of pixels that voted)
+        """
+
+        gx, gy = self.gradients
+        magnitude = cv2.magnitude(gx, gy)
+        strong = magnitude > GRADIENT_MIN
+        region_pixels = magnitude.size
+        if self.mask is not None:
+            strong &= self.outline_mask > 0
+            region_pixels = cv2.countNonZero(self.outline_mask)
+
+        bin_width = 180 / ORIENTATION_BINS
+        centers = (np.arange(ORIENTATION_BINS) + 0.5) * bin_width
+        field = {
+            'histogram': np.zeros(ORIENTATION_BINS),
+            'bin_centers': centers,
+            'dominant_angle': None,
+            'coherence': 0.0,
+            'support': 0.0,
+        }
+
+        gx, gy, magnitude = gx[strong], gy[strong], magnitude[strong]
+        if magnitude.size == 0:
+            return field
+
+        angles = cv2.phase(gx, gy, angleInDegrees=True).ravel() % 180
+        bins = np.minimum((angles / bin_width).astype(np.intp), ORIENTATION_BINS - 1)
+        histogram = np.bincount(bins, weights=magnitude, minlength=ORIENTATION_BINS)
+
+        # Structure tensor summed over the voting pixels
+        jxx, jyy, jxy = float(np.dot(gx, gx)), float(np.dot(gy, gy)), float(np.dot(gx, gy))
+        dominant = np.degrees(0.5 * np.arctan2(2 * jxy, jxx - jyy)) % 180
+
+        field.update({
+            'histogram': histogram / histogram.sum(),
+            'dominant_angle': float(dominant),
+            'coherence': float(np.hypot(jxx - jyy, 2 * jxy) / (jxx + jyy)),
+            'support': magnitude.size / region_pixels,
+        })
+        return field
+
+    @memoized_property
+    def contours(self):
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
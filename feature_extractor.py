@@ -1,12 +1,46 @@
 # models/feature_extractor.py
 # Extract roof features using CV + simple ML
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 from PIL import Image
 import torch
-import torchvision.transforms as transforms
-from torchvision import models
+
+from models.backbones import DEFAULT_BACKBONE, get_backbone
+from models.feature_context import MAX_DIM, FeatureContext
+from models.model_registry import LazyModel
+from models.sam_cache import EmbeddingCache
+
+# Below this structure-tensor coherence edges point every way: no dominant direction
+MIN_COHERENCE = 0.1
+
+# Texture statistics detect_roof_material thresholds on (value < threshold)
+MATERIAL_THRESHOLDS = {'gray_std': (30, 50), 'edge_density': (0.1, 0.15)}
+
+# Feature name -> (method, value reported if that method fails).
+# Fallbacks match the defaults downstream code uses for missing features.
+FEATURES = {
+    'orientation': ('detect_orientation', "Unknown"),
+    'shading_percent': ('analyze_shading', 0),
+    'roof_material': ('detect_roof_material', "Unknown"),
+    'roof_slope': ('estimate_slope', "Unknown"),
+    'complexity_score': ('calculate_complexity', 0),
+}
+
+
+def load_rgb(item):
+    """PIL RGB image from a file path, PIL Image or numpy array"""
+    if isinstance(item, (str, os.PathLike)):
+        return Image.open(item).convert("RGB")
+    if isinstance(item, np.ndarray):
+        return Image.fromarray(item).convert("RGB")
+    return item if item.mode == "RGB" else item.convert("RGB")
+
 
 class RoofFeatureExtractor:
     """
@@ -14,79 +48,113 @@ class RoofFeatureExtractor:
     Uses pre-trained models + computer vision
     """
     
-    def __init__(self):
-        # Load pre-trained ResNet for deep features (optional)
-        self.use_deep_features = False
-        try:
-            self.resnet = models.resnet50(pretrained=True)
-            self.resnet.eval()
-            self.use_deep_features = True
-            print("✓ ResNet50 loaded for deep features")
-        except:
-            print("⚠ ResNet not available, using CV features only")
-        
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
-    
-    def extract_all_features(self, image, roof_mask=None):
+    def __init__(self, index=None, max_workers=None, max_dim=MAX_DIM, target_gsd=None,
+                 backbone=DEFAULT_BACKBONE):
+        # Backbone for deep features (optional, see models/backbones.py) is
+        # built on first use: the CV features below never need it
+        self.backbone = get_backbone(backbone)
+        self.deep_model = LazyModel(self.backbone.load, self.backbone.name)
+        
+        # Optional roof_index.BruteForceIndex / IVFIndex; every embedding
+        # computed by extract_embeddings is added to it
+        self.index = index
+        
+        # Thread pool shared by all extract_all_features calls (1 = run inline)
+        self.max_workers = max_workers or min(os.cpu_count() or 1, len(FEATURES))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        
+        # Resolution normalisation: long side cap (px) and optional target
+        # ground sample distance (m/px) for images with a known gsd
+        self.max_dim = max_dim
+        self.target_gsd = target_gsd
+    
+    @property
+    def use_deep_features(self):
+        """Whether the backbone is loaded (does not trigger loading)"""
+        return self.deep_model.ready
+    
+    @property
+    def embedding_dim(self):
+        return self.backbone.dim
+    
+    def extract_all_features(self, image, roof_mask=None, gsd=None):
         """
         Extract comprehensive features from rooftop image
         
-        Returns:
-            dict: All extracted features
-        """
-        
-        if isinstance(image, Image.Image):
-            image_np = np.array(image)
-        else:
-            image_np = image
-        
-        features = {}
-        
-        # 1. Orientation Detection
-        features['orientation'] = self.detect_orientation(image_np)
-        
-        # 2. Shading Analysis
-        features['shading_percent'] = self.analyze_shading(image_np)
+        All features share one FeatureContext, so grayscale, edges and
+        line detection are computed once per image. Features run
+        concurrently on the shared thread pool (OpenCV releases the GIL),
+        and a failing feature reports its fallback value instead of
+        aborting the rest.
         
-        # 3. Roof Material (texture analysis)
-        features['roof_material'] = self.detect_roof_material(image_np)
+        Args:
+            image: PIL Image, numpy array or FeatureContext
+            roof_mask: Optional roof mask (dense or CompactMask). Features
+                are then computed on the roof bbox over roof pixels only
+            gsd: Optional source ground sample distance in m/px, used
+                with target_gsd to pick the working resolution
         
-        # 4. Slope Detection
-        features['roof_slope'] = self.estimate_slope(image_np)
+        Returns:
+            dict: All extracted features, plus 'feature_timings_ms' and
+                  'feature_errors' (only if something failed)
+        """
         
-        # 5. Complexity Score
-        features['complexity_score'] = self.calculate_complexity(image_np)
+        ctx = FeatureContext.of(image, roof_mask, max_dim=self.max_dim, gsd=gsd, target_gsd=self.target_gsd)
         
+        executor = self._get_executor()
+        if executor is None:
+            results = {name: self._run_feature(name, ctx) for name in FEATURES}
+        else:
+            futures = {name: executor.submit(self._run_feature, name, ctx) for name in FEATURES}
+            results = {name: future.result() for name, future in futures.items()}
+        
+        features, timings, errors = {}, {}, {}
+        for name, (value, elapsed_ms, error) in results.items():
+            features[name] = value
+            timings[name] = round(elapsed_ms, 2)
+            if error is not None:
+                errors[name] = error
+        
+        features['feature_timings_ms'] = timings
+        if errors:
+            features['feature_errors'] = errors
         return features
     
+    def _get_executor(self):
+        """Shared feature thread pool, created on first use (None if running inline)"""
+        if self.max_workers <= 1:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="features")
+            return self._executor
+    
+    def _run_feature(self, name, ctx):
+        """Run one feature, isolating errors: (value, elapsed ms, error or None)"""
+        
+        method, fallback = FEATURES[name]
+        start = time.perf_counter()
+        try:
+            value, error = getattr(self, method)(ctx), None
+        except Exception as e:
+            print(f"⚠️ Feature {name} failed: {e}")
+            value, error = fallback, f"{type(e).__name__}: {e}"
+        return value, (time.perf_counter() - start) * 1000, error
+    
     def detect_orientation(self, image):
         """
         Detect roof orientation using edge analysis
         Returns: N, NE, E, SE, S, SW, W, NW
         """
         
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Detect lines using Hough transform
-        lines = cv2.HoughLines(edges, 1, np.pi/180, 200)
+        # Dominant edge normal from the gradient structure tensor
+        field = FeatureContext.of(image).orientation
         
-        if lines is None:
+        if field['dominant_angle'] is None or field['coherence'] < MIN_COHERENCE:
             return "Unknown"
         
-        # Calculate dominant angle
-        angles = []
-        for line in lines[:10]:  # Top 10 lines
-            rho, theta = line[0]
-            angle = np.degrees(theta)
-            angles.append(angle)
-        
-        avg_angle = np.mean(angles)
+        avg_angle = field['dominant_angle']
         
         # Convert to compass direction
         # Assuming image is oriented North-up
@@ -106,13 +174,11 @@ class RoofFeatureExtractor:
         Analyze shading percentage using brightness
         """
         
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        
-        # Calculate histogram
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        ctx = FeatureContext.of(image)
+        hist = ctx.histogram
         
         # Dark pixels (likely shadows) are in lower range
-        total_pixels = image.shape[0] * image.shape[1]
+        total_pixels = ctx.pixel_count
         dark_pixels = np.sum(hist[:80])  # Pixels with intensity < 80
         
         shading_percent = (dark_pixels / total_pixels) * 100
@@ -125,22 +191,24 @@ class RoofFeatureExtractor:
         Options: Asphalt, Metal, Tile, Concrete
         """
         
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        ctx = FeatureContext.of(image)
         
         # Calculate texture features
         # 1. Standard deviation (roughness)
-        std_dev = np.std(gray)
+        std_dev = ctx.gray_std
         
         # 2. Edge density
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
+        edge_density = ctx.edge_density
+        
+        smooth_std, rough_std = MATERIAL_THRESHOLDS['gray_std']
+        sparse_edges, dense_edges = MATERIAL_THRESHOLDS['edge_density']
         
         # Simple classification based on features
-        if std_dev > 50 and edge_density > 0.15:
+        if std_dev > rough_std and edge_density > dense_edges:
             return "Tile"  # Rough texture, many edges
-        elif std_dev < 30:
+        elif std_dev < smooth_std:
             return "Metal"  # Smooth, uniform
-        elif edge_density < 0.1:
+        elif edge_density < sparse_edges:
             return "Concrete"  # Smooth but matte
         else:
             return "Asphalt"  # Most common
@@ -151,24 +219,15 @@ class RoofFeatureExtractor:
         Returns: Flat, Low (<15°), Medium (15-30°), Steep (>30°)
         """
         
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        field = FeatureContext.of(image).orientation
         
-        # Detect lines
-        edges = cv2.Canny(gray, 50, 150)
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, 100, 
-                               minLineLength=100, maxLineGap=10)
-        
-        if lines is None:
+        if field['dominant_angle'] is None or field['coherence'] < MIN_COHERENCE:
             return "Flat"
         
-        # Calculate average line angle
-        angles = []
-        for line in lines[:20]:
-            x1, y1, x2, y2 = line[0]
-            angle = np.abs(np.degrees(np.arctan2(y2 - y1, x2 - x1)))
-            angles.append(angle)
-        
-        avg_angle = np.mean(angles)
+        # Dominant edges run perpendicular to the dominant gradient;
+        # use their tilt from horizontal
+        line_angle = (field['dominant_angle'] + 90) % 180
+        avg_angle = min(line_angle, 180 - line_angle)
         
         # Classify slope
         if avg_angle < 5:
@@ -186,18 +245,16 @@ class RoofFeatureExtractor:
         Based on: edges, contours, texture variation
         """
         
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        ctx = FeatureContext.of(image)
         
         # 1. Edge density
-        edges = cv2.Canny(gray, 50, 150)
-        edge_score = np.sum(edges > 0) / edges.size * 100
+        edge_score = ctx.edge_density * 100
         
         # 2. Number of contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contour_score = min(len(contours) / 10, 10)  # Normalize to 10
+        contour_score = min(len(ctx.contours) / 10, 10)  # Normalize to 10
         
         # 3. Texture variation
-        std_score = min(np.std(gray) / 10, 10)
+        std_score = min(ctx.gray_std / 10, 10)
         
         # Combined score
         complexity = (edge_score * 0.4 + contour_score * 0.3 + std_score * 0.3)
@@ -206,12 +263,16 @@ class RoofFeatureExtractor:
     
     def get_deep_features(self, image):
         """
-        Extract deep features using pre-trained ResNet
+        Extract deep features using the pre-trained backbone
         (Optional - for more advanced analysis)
+        Returns: (1, embedding_dim) pooled features
         """
         
-        if not self.use_deep_features:
+        loaded = self.deep_model.get()
+        if loaded is None:
+            print(f"⚠ {self.backbone.name} not available, using CV features only")
             return None
+        network, transform = loaded
         
         # Convert to PIL
         if isinstance(image, np.ndarray):
@@ -220,12 +281,106 @@ class RoofFeatureExtractor:
             image_pil = image
         
         # Transform and extract features
-        image_tensor = self.transform(image_pil).unsqueeze(0)
+        image_tensor = transform(image_pil).unsqueeze(0)
         
         with torch.no_grad():
-            features = self.resnet(image_tensor)
+            features = network(image_tensor)
         
         return features.numpy()
+    
+    def extract_embeddings(self, images, batch_size=32, max_workers=None, store=None):
+        """
+        Pooled backbone embeddings (embedding_dim wide) for many images
+        
+        Images are decoded, hashed and transformed in a thread pool while
+        the previous batch runs through the backbone. Images already in
+        the store are read back instead of recomputed.
+        
+        Args:
+            images: Iterable of file paths, PIL Images or numpy arrays
+            batch_size: Images per backbone forward pass
+            max_workers: Decode/transform threads (defaults to CPU count)
+            store: Optional EmbeddingStore that new embeddings are appended to
+                (keep one store per backbone: keys are image hashes only)
+            
+        New embeddings are also added to self.index when one is set.
+        
+        Returns:
+            (keys, embeddings): image hashes and an (N, embedding_dim)
+            float32 array, or None if the backbone is not available
+        """
+        
+        loaded = self.deep_model.get()
+        if loaded is None:
+            print(f"⚠ {self.backbone.name} not available, cannot compute embeddings")
+            return None
+        backbone, transform = loaded
+        
+        # Keys are image hashes only, so a store or index built with
+        # another backbone would silently mix embeddings
+        for target in (store, self.index):
+            if target is not None and target.dim not in (None, self.embedding_dim):
+                raise ValueError(f"{type(target).__name__} holds {target.dim}-d vectors, "
+                                 f"{self.backbone.name} gives {self.embedding_dim}-d")
+        
+        images = list(images)
+        keys = [None] * len(images)
+        embeddings = np.zeros((len(images), self.embedding_dim), dtype=np.float32)
+        batches = [range(start, min(start + batch_size, len(images)))
+                   for start in range(0, len(images), batch_size)]
+        
+        def prepare(item):
+            image = load_rgb(item)
+            key = EmbeddingCache.image_key(np.asarray(image))
+            if store is not None and key in store:
+                return key, None
+            return key, transform(image)
+        
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+            pending = [executor.submit(prepare, images[i]) for i in batches[0]] if batches else []
+            
+            for b, batch in enumerate(batches):
+                prepared = [future.result() for future in pending]
+                # Decode the next batch while this one runs through the backbone
+                next_batch = batches[b + 1] if b + 1 < len(batches) else []
+                pending = [executor.submit(prepare, images[i]) for i in next_batch]
+                
+                todo = [j for j, (_, tensor) in enumerate(prepared) if tensor is not None]
+                if todo:
+                    with torch.no_grad():
+                        output = backbone(torch.stack([prepared[j][1] for j in todo])).flatten(1).numpy()
+                    embeddings[[batch[j] for j in todo]] = output
+                    if store is not None:
+                        store.add([prepared[j][0] for j in todo], output)
+                    if self.index is not None:
+                        self.index.add([prepared[j][0] for j in todo], output)
+                
+                for j, (key, tensor) in enumerate(prepared):
+                    keys[batch[j]] = key
+                    if tensor is None:
+                        embeddings[batch[j]] = store.get(key)
+        
+        return keys, embeddings
+    
+    def find_similar(self, image, k=5):
+        """
+        Previously indexed roofs that look most like this image
+        
+        The image itself is indexed as a side effect (and left out of
+        its own results).
+        
+        Returns:
+            List of (image hash, cosine similarity), best first
+        """
+        
+        if self.index is None:
+            return []
+        result = self.extract_embeddings([image])
+        if result is None:
+            return []
+        keys, embeddings = result
+        neighbours = self.index.search(embeddings[0], k + 1)
+        return [(key, score) for key, score in neighbours if key != keys[0]][:k]
 
 
 # Usage example
@@ -0,0 +1,135 @@
+# models/model_registry.py
+# Build models on first use, optionally warming them in the background
+
+import threading
+import time
+
+
+class LazyModel:
+    """
+    A model built by factory() the first time it is needed
+
+    State goes not_loaded -> loading -> ready (or failed). Concurrent
+    callers wait for the one build in progress instead of starting another.
+    """
+
+    def __init__(self, factory, name=None):
+        self.factory = factory
+        self.name = name or getattr(factory, '__name__', 'model')
+        self.state = 'not_loaded'
+        self.error = None
+        self.load_ms = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The model, building it now if needed (None if loading failed)"""
+
+        if self.state == 'ready':
+            return self._model
+
+        with self._lock:
+            if self.state == 'not_loaded':
+                self._build()
+        return self._model
+
+    def get_if_ready(self):
+        """The model if it has finished loading, else None (never blocks)"""
+        return self._model if self.state == 'ready' else None
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def _build(self):
+        self.state = 'loading'
+        start = time.perf_counter()
+        try:
+            model = self.factory()
+        except Exception as e:
+            self.error = e
+            self.state = 'failed'
+            print(f"⚠️ {self.name} failed to load: {e}")
+            return
+
+        self._model = model
+        self.load_ms = (time.perf_counter() - start) * 1000
+        self.state = 'ready'
+        print(f"✓ {self.name} ready ({self.load_ms:.0f} ms)")
+
+
+class ModelRegistry:
+    """
+    Named lazy models shared by the app
+
+    Nothing is built at registration. Models load on the first get(),
+    or ahead of time in a background thread via warm().
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._warming = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Register factory() under name; returns its LazyModel"""
+        self._models[name] = LazyModel(factory, name)
+        return self._models[name]
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Model by name, loading it if needed (blocks until ready)"""
+        return self._models[name].get()
+
+    def get_if_ready(self, name):
+        """Model by name if loaded, else None (unknown names give None too)"""
+        entry = self._models.get(name)
+        return entry.get_if_ready() if entry else None
+
+    def get_or_warm(self, name):
+        """
+        Model by name if loaded, else None after starting a background
+        load (once). Lets a caller pull in a heavy model only when it is
+        actually wanted, without blocking the request that wants it.
+        """
+
+        entry = self._models.get(name)
+        if entry is None or entry.ready:
+            return entry.get_if_ready() if entry else None
+        with self._lock:
+            if entry.state == 'not_loaded' and name not in self._warming:
+                self._warming[name] = self.warm([name])
+        return None
+
+    def state(self, name):
+        entry = self._models.get(name)
+        return entry.state if entry else 'unavailable'
+
+    def status(self):
+        """{name: state} for every registered model"""
+        return {name: entry.state for name, entry in self._models.items()}
+
+    def warm(self, names=None):
+        """
+        Load models in a daemon thread so requests are not blocked
+
+        Models load one after another to avoid competing for the CPU.
+
+        Args:
+            names: Models to warm (defaults to all registered)
+
+        Returns:
+            The started thread
+        """
+
+        entries = [self._models[n] for n in (names or self._models) if n in self._models]
+
+        def run():
+            for entry in entries:
+                entry.get()
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
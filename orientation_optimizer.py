@@ -0,0 +1,128 @@
+# utils/orientation_optimizer.py
+# Best panel tilt / azimuth from a grid search over hourly simulations
+
+import numpy as np
+
+from utils.solar_simulation import HourlySolarSimulator, ORIENTATION_AZIMUTHS
+
+
+DEFAULT_TILTS = np.arange(0, 65, 5)  # Degrees from horizontal
+DEFAULT_AZIMUTHS = np.arange(0, 360, 10)  # Degrees clockwise from north
+
+
+class OrientationOptimizer:
+    """
+    Annual yield over a tilt x azimuth grid, one broadcast per roof
+
+    The angle of incidence separates into per-candidate coefficients
+    times per-hour sun terms,
+        cos(aoi) = cos(t) cos(z) + sin(t) cos(a) sin(z) cos(A) + sin(t) sin(a) sin(z) sin(A),
+    so plane-of-array irradiance for every candidate comes from one
+    (candidates x 3) @ (3 x daylight hours) product instead of a loop.
+    Night hours are dropped before the product.
+    """
+
+    def __init__(self, simulator=None, tilts=DEFAULT_TILTS, azimuths=DEFAULT_AZIMUTHS):
+        self.simulator = simulator or HourlySolarSimulator()
+        self.tilts = np.asarray(tilts, dtype=np.float64)
+        self.azimuths = np.asarray(azimuths, dtype=np.float64)
+
+        # Candidate coefficients, (tilts * azimuths, 3) in row-major grid order
+        tilt, azimuth = np.meshgrid(np.radians(self.tilts), np.radians(self.azimuths), indexing='ij')
+        tilt, azimuth = tilt.ravel(), azimuth.ravel()
+        self._coefficients = np.stack(
+            [np.cos(tilt), np.sin(tilt) * np.cos(azimuth), np.sin(tilt) * np.sin(azimuth)], axis=1)
+        self._sky_view = (1 + np.cos(tilt))[:, None] / 2
+        self._ground_view = (1 - np.cos(tilt))[:, None] / 2
+
+    def yield_surface(self, weather, system_size_kw=1, shading_percent=0):
+        """
+        Annual kWh for every grid candidate, (len(tilts), len(azimuths))
+
+        Args:
+            weather: One roof's typical_year() arrays, each (1, 8760) or (8760,)
+        """
+
+        day = np.ravel(weather['ghi']) > 0
+        zenith = np.radians(np.ravel(weather['zenith'])[day])
+        sun_azimuth = np.radians(np.ravel(weather['azimuth'])[day])
+        sun = np.stack([np.cos(zenith),
+                        np.sin(zenith) * np.cos(sun_azimuth),
+                        np.sin(zenith) * np.sin(sun_azimuth)])
+
+        # Built in place: these are (candidates x daylight hours) arrays
+        poa = self._coefficients @ sun
+        np.maximum(poa, 0, out=poa)
+        poa *= np.ravel(weather['dni'])[day]
+        poa += self._sky_view * np.ravel(weather['dhi'])[day]
+        poa += self._ground_view * (self.simulator.albedo * np.ravel(weather['ghi'])[day])
+
+        annual = self.simulator.annual_production(
+            system_size_kw, poa, np.ravel(weather['temp_air'])[day], shading_percent)
+        return annual.reshape(len(self.tilts), len(self.azimuths))
+
+    def optimize(self, latitude, daily_irradiance, system_size_kw=1, avg_temp=25,
+                 shading_percent=0, orientation=None, tilt=None):
+        """
+        Best tilt / azimuth for one roof or a batch of roofs
+
+        Args:
+            latitude, daily_irradiance, system_size_kw, avg_temp, shading_percent:
+                Scalars, or (R,) arrays for a batch
+            orientation: Detected orientation (RoofFeatureExtractor.detect_orientation),
+                one label or one per roof
+            tilt: Tilt of the detected roof plane (None = best tilt for
+                the detected orientation)
+
+        Returns:
+            dict (or a list of them for a batch): best_tilt, best_azimuth,
+            best_annual_kwh, surface (annual kWh over tilts x azimuths),
+            tilts, azimuths and detected (the detected orientation's
+            azimuth, tilt, annual_kwh and loss_percent vs the optimum;
+            None when the orientation is unknown)
+        """
+
+        single = np.ndim(latitude) == 0
+        latitude = np.atleast_1d(np.asarray(latitude, dtype=np.float64))
+        count = len(latitude)
+        per_roof = lambda value: np.broadcast_to(np.asarray(value, dtype=object), (count,))
+
+        weather = self.simulator.typical_year(latitude, daily_irradiance, avg_temp)
+        sizes, shadings = per_roof(system_size_kw), per_roof(shading_percent)
+        orientations, tilts = per_roof(orientation), per_roof(tilt)
+
+        results = []
+        for r in range(count):
+            roof_weather = {key: values[r] for key, values in weather.items()}
+            surface = self.yield_surface(roof_weather, float(sizes[r]), float(shadings[r]))
+            results.append(self._summarize(surface, orientations[r], tilts[r]))
+        return results[0] if single else results
+
+    def _summarize(self, surface, orientation, tilt):
+        best_t, best_a = np.unravel_index(np.argmax(surface), surface.shape)
+        best = float(surface[best_t, best_a])
+
+        detected = None
+        if orientation in ORIENTATION_AZIMUTHS:
+            # Nearest grid azimuth (circular) and tilt
+            azimuth = ORIENTATION_AZIMUTHS[orientation]
+            a = int(np.argmin(np.abs((self.azimuths - azimuth + 180) % 360 - 180)))
+            t = int(np.argmax(surface[:, a])) if tilt is None else int(np.argmin(np.abs(self.tilts - tilt)))
+            annual = float(surface[t, a])
+            detected = {
+                'orientation': orientation,
+                'azimuth': float(self.azimuths[a]),
+                'tilt': float(self.tilts[t]),
+                'annual_kwh': annual,
+                'loss_percent': round((1 - annual / best) * 100, 1) if best > 0 else 0.0
+            }
+
+        return {
+            'best_tilt': float(self.tilts[best_t]),
+            'best_azimuth': float(self.azimuths[best_a]),
+            'best_annual_kwh': best,
+            'surface': surface,
+            'tilts': self.tilts,
+            'azimuths': self.azimuths,
+            'detected': detected
+        }
@@ -0,0 +1,274 @@
+# models/panel_layout.py
+# Pack solar panels onto the segmented roof, respecting setbacks and obstacles
+
+import cv2
+import numpy as np
+
+from models.compact_mask import CompactMask
+from models.roof_segmentation import PIXEL_TO_SQM, SQM_TO_SQFT, as_compact_mask
+
+# Ground size of one image pixel (PIXEL_TO_SQM is its area)
+PIXEL_SIZE_M = float(np.sqrt(PIXEL_TO_SQM))
+
+PANEL_FILL_COLOR = (30, 144, 255)
+PANEL_EDGE_COLOR = (255, 255, 255)
+
+
+def _empty_layout(image_shape):
+    return {
+        'panel_count': 0,
+        'panels': np.zeros((0, 4, 2), dtype=np.float32),
+        'panel_mask': CompactMask.empty(image_shape) if image_shape else None,
+        'rotation': 0.0,
+        'portrait': True,
+        'free_area_sqft': 0,
+        'image_shape': image_shape
+    }
+
+
+def roof_window(segmentation_result, values=None):
+    """
+    Roof and obstacle rasters over the roof's bounding box (plus a 1 px
+    border that is outside the roof)
+
+    Args:
+        segmentation_result: segment_roof output
+        values: Optional per-obstacle value painted on its pixels (the
+            larger one where obstacles overlap); 1 when not given
+
+    Returns:
+        (roof, obstacles, origin): uint8 0/1 roof window, obstacle window
+        (uint8, or float32 with values), and the window's (y, x) in the
+        image; None if there is no roof
+    """
+
+    roof = as_compact_mask(segmentation_result.get('roof_mask'))
+    if roof is None or roof.area == 0:
+        return None
+
+    y, x, crop = roof.crop()
+    bx, by, bw, bh = roof.bbox
+    window = np.zeros((bh + 2, bw + 2), dtype=np.uint8)
+    window[1:-1, 1:-1] = crop[by - y:by - y + bh, bx - x:bx - x + bw]
+    origin = (by - 1, bx - 1)
+
+    obstacles = np.zeros(window.shape, dtype=np.uint8 if values is None else np.float32)
+    for i, obs in enumerate(segmentation_result.get('obstacles', [])):
+        mask = as_compact_mask(obs.get('mask'))
+        if mask is None or mask.area == 0:
+            continue
+        oy, ox, ocrop = mask.crop()
+        # Overlap of the obstacle's window with the roof window
+        y0, x0 = max(oy, origin[0]), max(ox, origin[1])
+        y1 = min(oy + ocrop.shape[0], origin[0] + window.shape[0])
+        x1 = min(ox + ocrop.shape[1], origin[1] + window.shape[1])
+        if y1 > y0 and x1 > x0:
+            target = obstacles[y0 - origin[0]:y1 - origin[0], x0 - origin[1]:x1 - origin[1]]
+            painted = ocrop[y0 - oy:y1 - oy, x0 - ox:x1 - ox] * (1 if values is None else values[i])
+            np.maximum(target, painted.astype(obstacles.dtype), out=target)
+    return window, obstacles, origin
+
+
+def best_row_lattice(fits, panel_w, row_pitch):
+    """
+    Best non-overlapping placement on a lattice of rows
+
+    Rows are row_pitch apart; each row independently picks the column
+    offset (0 .. panel_w - 1) that fits the most panels, since panels in
+    one row never overlap another row's.
+
+    Args:
+        fits: (H, W) bool, True where a panel's top-left corner fits
+        panel_w: Panel width in pixels (column step within a row)
+        row_pitch: Row step in pixels (panel height plus any gap)
+
+    Returns:
+        (N, 2) int array of (y, x) top-left corners
+    """
+
+    h, w = fits.shape
+    cols = -(-w // panel_w) * panel_w
+    padded = np.zeros((h, cols), dtype=np.int32)
+    padded[:, :w] = fits
+
+    # counts[y, ox] = panels in row y at column offset ox
+    counts = padded.reshape(h, cols // panel_w, panel_w).sum(axis=1)
+    row_best = counts.max(axis=1)
+    row_offset = counts.argmax(axis=1)
+
+    # Row offset oy: rows oy, oy + pitch, ...; pick the best total
+    totals = [row_best[oy::row_pitch].sum() for oy in range(min(row_pitch, h))]
+    if not totals or max(totals) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    oy = int(np.argmax(totals))
+
+    corners = []
+    for y in range(oy, h, row_pitch):
+        xs = np.arange(row_offset[y], w, panel_w)
+        xs = xs[fits[y, xs]]
+        corners.append(np.stack([np.full(len(xs), y), xs], axis=1))
+    return np.concatenate(corners)
+
+
+class PanelPacker:
+    """
+    Raster panel layout on a roof mask
+
+    The roof is resampled to a fine working grid, shrunk by the fire
+    setback, and cut around obstacles (plus a clearance). For each
+    candidate rotation (along the roof's dominant edge and the image
+    axes, portrait and landscape) the free area is rotated upright and
+    a summed-area table gives, in one vectorised pass, every position
+    where a whole panel fits: each candidate is O(1). A row lattice is
+    then picked per rotation and the layout with the most panels wins.
+    """
+
+    def __init__(self, panel_length_m=1.7, panel_width_m=1.15, setback_m=0.9,
+                 obstacle_clearance_m=0.3, row_gap_m=0.0, resolution_m=0.1,
+                 pixel_size_m=PIXEL_SIZE_M):
+        self.panel_length_m = panel_length_m
+        self.panel_width_m = panel_width_m
+        self.setback_m = setback_m  # Clear walkway along the roof edge
+        self.obstacle_clearance_m = obstacle_clearance_m
+        self.row_gap_m = row_gap_m  # Spacing between rows (tilted racks on flat roofs)
+        self.resolution_m = resolution_m  # Working grid cell size
+        self.pixel_size_m = pixel_size_m  # Ground size of an image pixel
+
+    def free_area(self, segmentation_result):
+        """
+        Where panels may go, on the working grid
+
+        Returns:
+            (free, origin, scale): uint8 0/1 grid over the roof bbox,
+            (y, x) of the bbox in the image, and grid cells per image pixel;
+            None if there is no roof
+        """
+
+        windows = roof_window(segmentation_result)
+        if windows is None:
+            return None
+        window, obstacles, origin = windows
+
+        scale = self.pixel_size_m / self.resolution_m
+        size = (max(round(window.shape[1] * scale), 1), max(round(window.shape[0] * scale), 1))
+        roof_grid = cv2.resize(window, size, interpolation=cv2.INTER_NEAREST)
+        obstacle_grid = cv2.resize(obstacles, size, interpolation=cv2.INTER_NEAREST)
+
+        # Distance (in grid cells) to the roof edge / nearest obstacle
+        inside = cv2.distanceTransform(roof_grid, cv2.DIST_L2, 3) > self.setback_m / self.resolution_m
+        clear = cv2.distanceTransform(1 - obstacle_grid, cv2.DIST_L2, 3) > self.obstacle_clearance_m / self.resolution_m
+        return (inside & clear).astype(np.uint8), origin, scale
+
+    def rotations(self, free):
+        """Candidate layout angles: image axes plus the roof's dominant edge"""
+        contours, _ = cv2.findContours(free, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        angles = [0.0]
+        if contours:
+            angle = cv2.minAreaRect(max(contours, key=cv2.contourArea))[2] % 90
+            if min(angle, 90 - angle) > 1:
+                angles.append(float(angle))
+        return angles
+
+    def _pack_rotated(self, free, angle, portrait):
+        """Panel corners (N, 4, 2) as (x, y) on the working grid for one rotation"""
+
+        h, w = free.shape
+        # Rotate about the centre onto a canvas large enough for the whole roof
+        rotation = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(rotation[0, 0]), abs(rotation[0, 1])
+        out_w, out_h = int(np.ceil(h * sin + w * cos)), int(np.ceil(h * cos + w * sin))
+        rotation[0, 2] += out_w / 2 - w / 2
+        rotation[1, 2] += out_h / 2 - h / 2
+        upright = free if angle == 0 else cv2.warpAffine(free, rotation, (out_w, out_h), flags=cv2.INTER_NEAREST)
+
+        length = int(np.ceil(self.panel_length_m / self.resolution_m))
+        width = int(np.ceil(self.panel_width_m / self.resolution_m))
+        panel_h, panel_w = (length, width) if portrait else (width, length)
+        if upright.shape[0] < panel_h or upright.shape[1] < panel_w:
+            return np.zeros((0, 4, 2), dtype=np.float32)
+
+        # Summed-area table: the sum over any panel-sized window is 4 lookups
+        table = cv2.integral(upright)
+        window_sum = (table[panel_h:, panel_w:] - table[:-panel_h, panel_w:]
+                      - table[panel_h:, :-panel_w] + table[:-panel_h, :-panel_w])
+        fits = window_sum == panel_h * panel_w
+
+        row_pitch = panel_h + int(round(self.row_gap_m / self.resolution_m))
+        corners = best_row_lattice(fits, panel_w, row_pitch)
+        if len(corners) == 0:
+            return np.zeros((0, 4, 2), dtype=np.float32)
+
+        y, x = corners[:, 0:1], corners[:, 1:2]
+        quads = np.stack([np.hstack([x, y]), np.hstack([x + panel_w, y]),
+                          np.hstack([x + panel_w, y + panel_h]), np.hstack([x, y + panel_h])], axis=1)
+        quads = quads.astype(np.float32)
+        if angle != 0:
+            quads = cv2.transform(quads.reshape(-1, 1, 2), cv2.invertAffineTransform(rotation)).reshape(-1, 4, 2)
+        return quads
+
+    def pack(self, segmentation_result):
+        """
+        Lay out panels on a segment_roof result
+
+        Returns:
+            dict: panel_count, panels ((N, 4, 2) float32 corner (x, y)
+            image pixels), panel_mask (CompactMask layer of panel pixels),
+            rotation (degrees), portrait, free_area_sqft (after setbacks
+            and obstacle clearance) and image_shape
+        """
+
+        roof = as_compact_mask(segmentation_result.get('roof_mask'))
+        image_shape = roof.shape if roof is not None else None
+        prepared = self.free_area(segmentation_result)
+        if prepared is None:
+            return _empty_layout(image_shape)
+        free, origin, scale = prepared
+
+        best = None
+        for angle in self.rotations(free):
+            for portrait in (True, False):
+                quads = self._pack_rotated(free, angle, portrait)
+                if best is None or len(quads) > len(best[0]):
+                    best = (quads, angle, portrait)
+        quads, angle, portrait = best
+
+        # Working grid -> image pixels
+        panels = quads / scale + np.array([origin[1], origin[0]], dtype=np.float32)
+
+        layer = np.zeros(image_shape, dtype=np.uint8)
+        if len(panels):
+            cv2.fillPoly(layer, np.round(panels).astype(np.int32), 1)
+
+        return {
+            'panel_count': len(panels),
+            'panels': panels,
+            'panel_mask': CompactMask.from_dense(layer.view(bool)),
+            'rotation': angle,
+            'portrait': portrait,
+            'free_area_sqft': int(free.sum() * self.resolution_m ** 2 * SQM_TO_SQFT),
+            'image_shape': image_shape
+        }
+
+
+def render_panels(image, layout, alpha=0.6):
+    """
+    Draw a panel layout over an image of any size (e.g. render_overlay's output)
+
+    Panel corners are scaled from layout['image_shape'] to the image.
+
+    Returns:
+        RGB uint8 numpy array
+    """
+
+    image_np = np.array(image)
+    if not layout or layout['panel_count'] == 0:
+        return image_np
+
+    scale = image_np.shape[1] / layout['image_shape'][1]
+    polygons = np.round(layout['panels'] * scale).astype(np.int32)
+
+    filled = image_np.copy()
+    cv2.fillPoly(filled, polygons, PANEL_FILL_COLOR)
+    cv2.addWeighted(filled, alpha, image_np, 1 - alpha, 0, dst=image_np)
+    cv2.polylines(image_np, polygons, True, PANEL_EDGE_COLOR, 1)
+    return image_np
@@ -0,0 +1,232 @@
+# models/roof_index.py
+# Nearest-neighbour search over roof embeddings ("which roofs look like this one")
+
+import os
+
+import numpy as np
+
+from models.embedding_store import EmbeddingStore
+
+
+def normalize(vectors):
+    """L2-normalize rows so dot products are cosine similarities"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores per row, best first"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class BruteForceIndex:
+    """
+    Exact cosine search over every stored embedding
+
+    Vectors are normalized and appended to an EmbeddingStore in
+    index_dir, so the index persists and grows incrementally. Queries
+    scan the memory map in chunks, so memory stays flat as it grows.
+    Best for up to ~100k roofs.
+    """
+
+    def __init__(self, index_dir, dim=None, chunk_rows=65536):
+        self.store = EmbeddingStore(index_dir, dim)
+        self.chunk_rows = chunk_rows
+
+    @property
+    def dim(self):
+        """Vector width (None until the first add to a new index)"""
+        return self.store.dim
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def add(self, keys, vectors):
+        """Add embeddings (keys already indexed are skipped)"""
+        self.store.add(list(keys), normalize(vectors))
+
+    def _search_rows(self, queries, rows, k):
+        """Top-k (row ids, scores) per query among the given rows (None = all)"""
+
+        vectors = self.store.vectors
+        total = len(vectors) if rows is None else len(rows)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, total, self.chunk_rows):
+            if rows is None:
+                chunk_rows = np.arange(start, min(start + self.chunk_rows, total))
+                chunk = vectors[start:start + self.chunk_rows]
+            else:
+                chunk_rows = rows[start:start + self.chunk_rows]
+                chunk = vectors[chunk_rows]
+
+            # Merge this chunk's candidates with the best so far
+            scores = np.hstack([best_scores, queries @ chunk.T])
+            ids = np.hstack([best_rows, np.broadcast_to(chunk_rows, (len(queries), len(chunk_rows)))])
+            top = _top_k(scores, k)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(ids, top, axis=1)
+
+        return best_rows, best_scores
+
+    def search(self, queries, k=5):
+        """
+        Most similar indexed roofs
+
+        Args:
+            queries: (dim,) embedding or (Q, dim) batch
+            k: Neighbours per query
+
+        Returns:
+            List of (key, cosine similarity) best first, or one such
+            list per query for a batch
+        """
+
+        single = np.ndim(queries) == 1
+        queries = normalize(queries)
+        results = [[] for _ in queries]
+
+        if len(self) > 0:
+            rows, scores = self._search_batch(queries, k)
+            results = [
+                [(self.store.keys[r], float(s)) for r, s in zip(row, score) if r >= 0]
+                for row, score in zip(rows, scores)
+            ]
+        return results[0] if single else results
+
+    def _search_batch(self, queries, k):
+        return self._search_rows(queries, None, k)
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Approximate search with an inverted file (IVF)
+
+    Vectors are grouped into n_lists clusters by spherical k-means. A
+    query only scans the n_probe lists whose centroids are closest,
+    so cost grows with n_probe / n_lists of the data, not all of it.
+    Until train() has run, searches fall back to brute force.
+
+    Persisted next to the vectors: ivf_centroids.npy and the list id of
+    every row in ivf_lists.i32 (append-only, like the vectors).
+    """
+
+    def __init__(self, index_dir, dim=None, n_lists=256, n_probe=8, chunk_rows=65536):
+        super().__init__(index_dir, dim, chunk_rows)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids_path = os.path.join(index_dir, "ivf_centroids.npy")
+        self.lists_path = os.path.join(index_dir, "ivf_lists.i32")
+        self.centroids = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._inverted = None
+
+        if os.path.exists(self.centroids_path):
+            self.centroids = np.load(self.centroids_path)
+            self.n_lists = len(self.centroids)
+            if os.path.exists(self.lists_path):
+                self._assignments = np.fromfile(self.lists_path, dtype=np.int32)[:len(self)]
+                # Drop ids of rows the store truncated, so appends stay aligned
+                os.truncate(self.lists_path, self._assignments.nbytes)
+            # Rows appended after the last assignment (e.g. an interrupted add)
+            self._assign_new_rows()
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _nearest_lists(self, vectors, n=1):
+        return _top_k(vectors @ self.centroids.T, n)
+
+    def _assign_rows(self, start, stop):
+        """List ids for stored rows [start, stop), chunked"""
+        vectors = self.store.vectors
+        parts = [self._nearest_lists(vectors[i:min(i + self.chunk_rows, stop)])[:, 0]
+                 for i in range(start, stop, self.chunk_rows)]
+        return np.concatenate(parts).astype(np.int32) if parts else np.zeros(0, dtype=np.int32)
+
+    def _assign_new_rows(self):
+        start = len(self._assignments)
+        if not self.trained or start >= len(self):
+            return
+        new = self._assign_rows(start, len(self))
+        with open(self.lists_path, 'ab') as f:
+            f.write(new.tobytes())
+        self._assignments = np.concatenate([self._assignments, new])
+        self._inverted = None
+
+    def train(self, iterations=10, sample_size=50000, seed=0):
+        """
+        Fit the coarse centroids on (a sample of) the stored vectors
+
+        Every stored row is then reassigned; later adds are assigned
+        incrementally. Retrain when the data has drifted a lot.
+        """
+
+        vectors = self.store.vectors
+        if len(vectors) < self.n_lists:
+            print(f"⚠️ IVF needs at least {self.n_lists} vectors to train, have {len(vectors)}")
+            return
+
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        sample = np.asarray(vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)]
+
+        for _ in range(iterations):
+            labels = _top_k(sample @ centroids.T, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.n_lists)
+            # Empty lists are re-seeded from random sample points
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        self.centroids = centroids
+        np.save(self.centroids_path, centroids)
+
+        self._assignments = np.zeros(0, dtype=np.int32)
+        if os.path.exists(self.lists_path):
+            os.remove(self.lists_path)
+        self._assign_new_rows()
+        print(f"✓ IVF trained: {self.n_lists} lists over {len(self)} vectors")
+
+    def add(self, keys, vectors):
+        super().add(keys, vectors)
+        self._assign_new_rows()
+
+    @property
+    def inverted_lists(self):
+        """(row ids sorted by list, start offset of each list)"""
+        if self._inverted is None:
+            order = np.argsort(self._assignments, kind='stable')
+            offsets = np.searchsorted(self._assignments[order], np.arange(self.n_lists + 1))
+            self._inverted = (order, offsets)
+        return self._inverted
+
+    def _search_batch(self, queries, k):
+        if not self.trained:
+            return super()._search_batch(queries, k)
+
+        order, offsets = self.inverted_lists
+        probes = self._nearest_lists(queries, min(self.n_probe, self.n_lists))
+
+        all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            rows = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists]))
+            if len(rows) == 0:
+                continue
+            found_rows, found_scores = self._search_rows(queries[q:q + 1], rows, k)
+            all_rows[q, :found_rows.shape[1]] = found_rows[0]
+            all_scores[q, :found_scores.shape[1]] = found_scores[0]
+        return all_rows, all_scores
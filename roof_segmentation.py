@@ -1,19 +1,210 @@
 # models/roof_segmentation.py
 # Use Meta's SAM - Zero training required!
 
+import functools
+import threading
+
 import cv2
 import numpy as np
-from segment_anything import sam_model_registry, SamAutomaticMaskGenerator
+from segment_anything import sam_model_registry, SamAutomaticMaskGenerator, SamPredictor
 import torch
 from PIL import Image
 
+from models.compact_mask import CompactMask, union_all
+from models.sam_backends import PRETRAINED_DIR, load_decoder, load_encoder
+from models.sam_cache import EmbeddingCache
+from models.tiling import segment_edges_tiled, segment_tiled
+
+# Prompts per decoder call. Each prompt's low-res logits are 1 MB, so
+# memory per call stays flat however many prompts a grid has
+DECODE_CHUNK = 16
+
+# Area conversion (assuming 1 pixel = 0.3m based on typical satellite images)
+PIXEL_TO_SQM = 0.09  # (0.3m)^2
+SQM_TO_SQFT = 10.764
+
+# Overlay lookup tables, indexed by label (bit 0 = roof, bit 1 = obstacle).
+# out = (pixel >> SHIFT) + OFFSET gives 50/50 blends in uint8: roof over
+# the image, then obstacles over that. 256 entries so cv2.LUT can use them.
+OVERLAY_ROOF_COLOR = np.array([0, 255, 0], dtype=np.uint8)
+OVERLAY_OBSTACLE_COLOR = np.array([255, 0, 0], dtype=np.uint8)
+OVERLAY_SHIFT = np.zeros(256, dtype=np.uint8)
+OVERLAY_SHIFT[:4] = [0, 1, 1, 2]
+OVERLAY_OFFSET = np.zeros((1, 256, 3), dtype=np.uint8)
+OVERLAY_OFFSET[0, 1] = OVERLAY_ROOF_COLOR // 2
+OVERLAY_OFFSET[0, 2] = OVERLAY_OBSTACLE_COLOR // 2
+OVERLAY_OFFSET[0, 3] = OVERLAY_ROOF_COLOR // 4 + OVERLAY_OBSTACLE_COLOR // 2
+
+
+def as_compact_mask(mask):
+    """CompactMask for a dense boolean array (compact masks pass through)"""
+    if mask is None or isinstance(mask, CompactMask):
+        return mask
+    return CompactMask.from_dense(mask)
+
+
+def build_segmentation_result(roof_mask, roof_area_pixels, obstacles):
+    """
+    Assemble the segment_roof output dict from pixel measurements
+    
+    Masks are stored as CompactMask so results stay small in session state.
+    """
+    
+    if roof_mask is None:
+        return {
+            'roof_mask': None,
+            'roof_area_sqft': 0,
+            'obstacles': [],
+            'usable_area_sqft': 0
+        }
+    
+    roof_mask = as_compact_mask(roof_mask)
+    for obs in obstacles:
+        if 'mask' in obs:
+            obs['mask'] = as_compact_mask(obs['mask'])
+    
+    roof_area_sqft = roof_area_pixels * PIXEL_TO_SQM * SQM_TO_SQFT
+    
+    # Usable area = roof - obstacles
+    if obstacles and all('mask' in obs for obs in obstacles):
+        # Only obstacle pixels on the roof count, and overlaps count once
+        covered = roof_mask & union_all([obs['mask'] for obs in obstacles], roof_mask.shape)
+        obstacle_area_pixels = covered.area
+    else:
+        obstacle_area_pixels = sum([obs['area'] for obs in obstacles])
+    usable_area_sqft = (roof_area_pixels - obstacle_area_pixels) * PIXEL_TO_SQM * SQM_TO_SQFT
+    
+    return {
+        'roof_mask': roof_mask,
+        'roof_area_sqft': int(roof_area_sqft),
+        'obstacles': obstacles,
+        'usable_area_sqft': int(usable_area_sqft),
+        'obstacle_count': len(obstacles)
+    }
+
+
+def _scaled_crop(mask, scale):
+    """(y, x, crop) of a compact mask resized to the output resolution"""
+    
+    y, x, crop = mask.crop()
+    if scale == 1:
+        return y, x, crop
+    
+    y0, x0 = int(y * scale), int(x * scale)
+    y1 = max(int(np.ceil((y + crop.shape[0]) * scale)), y0 + 1)
+    x1 = max(int(np.ceil((x + crop.shape[1]) * scale)), x0 + 1)
+    resized = cv2.resize(crop.view(np.uint8), (x1 - x0, y1 - y0), interpolation=cv2.INTER_NEAREST)
+    return y0, x0, resized.astype(bool)
+
+
+def render_overlay(image, segmentation_result, max_size=None, in_place=False):
+    """
+    Draw the roof (green) and obstacles (red) over the image in one pass
+    
+    A small uint8 label map is built over the masks' combined window,
+    then the window is blended in place through the OVERLAY lookup
+    tables using uint8 arithmetic only (no float temporaries).
+    
+    Args:
+        image: PIL Image or RGB uint8 numpy array
+        segmentation_result: dict from segment_roof
+        max_size: Render with at most this long side (display resolution)
+        in_place: Draw into a numpy input instead of a copy
+        
+    Returns:
+        RGB uint8 numpy array
+    """
+    
+    if isinstance(image, Image.Image):
+        image_np = np.array(image)
+    else:
+        image_np = image if in_place else image.copy()
+    
+    h, w = image_np.shape[:2]
+    scale = 1
+    if max_size and max(h, w) > max_size:
+        scale = max_size / max(h, w)
+        size = (max(round(w * scale), 1), max(round(h * scale), 1))
+        image_np = cv2.resize(image_np, size, interpolation=cv2.INTER_AREA)
+    
+    roof_mask = as_compact_mask(segmentation_result['roof_mask'])
+    if roof_mask is None:
+        return image_np
+    
+    masks = [(roof_mask, 1)] + [
+        (as_compact_mask(obs['mask']), 2)
+        for obs in segmentation_result['obstacles'] if obs.get('mask') is not None
+    ]
+    crops = [(_scaled_crop(mask, scale), bit) for mask, bit in masks if mask.area > 0]
+    if not crops:
+        return image_np
+    
+    # Label map over the union of the masks' windows only
+    out_h, out_w = image_np.shape[:2]
+    y0 = min(y for (y, _, _), _ in crops)
+    x0 = min(x for (_, x, _), _ in crops)
+    y1 = min(max(y + c.shape[0] for (y, _, c), _ in crops), out_h)
+    x1 = min(max(x + c.shape[1] for (_, x, c), _ in crops), out_w)
+    labels = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    for (y, x, crop), bit in crops:
+        crop = crop[:y1 - y, :x1 - x]
+        window = labels[y - y0:y - y0 + crop.shape[0], x - x0:x - x0 + crop.shape[1]]
+        window |= crop.view(np.uint8) * np.uint8(bit)
+    
+    region = image_np[y0:y1, x0:x1]
+    labels = cv2.merge([labels] * 3)
+    np.right_shift(region, cv2.LUT(labels, OVERLAY_SHIFT), out=region)
+    region += cv2.LUT(labels, OVERLAY_OFFSET)
+    
+    return image_np
+
+
+def _dedupe_masks(masks, areas, iou_threshold=0.8, min_area=100):
+    """Indices of masks, largest first, skipping noise and near-duplicates"""
+    
+    kept = []
+    for i in np.argsort(-areas):
+        if areas[i] <= min_area:  # Filter small noise
+            break
+        overlaps = [(masks[i] & masks[j]).sum() for j in kept]
+        if all(o < iou_threshold * (areas[i] + areas[j] - o) for o, j in zip(overlaps, kept)):
+            kept.append(i)
+    return kept
+
+
+def _mask_obstacle(mask, area=None):
+    """Obstacle entry (mask, area, XYWH bbox) for a boolean or compact mask"""
+    
+    compact = as_compact_mask(mask)
+    return {
+        'mask': compact,
+        'area': int(compact.area if area is None else area),
+        'bbox': compact.bbox
+    }
+
+
+def _holds_predictor(method):
+    """Run a RoofSegmenter method under its predictor lock"""
+    
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
 class RoofSegmenter:
     """
     Roof segmentation using pre-trained SAM (Segment Anything Model)
     NO TRAINING NEEDED - Works out of the box!
+    
+    The predictor and mask generator keep the current image between
+    calls, so one instance serves one request at a time: the public
+    methods share a lock (re-entrant, as they call set_image).
     """
     
-    def __init__(self, model_path="models/pretrained/sam_vit_b.pth"):
+    def __init__(self, model_path="models/pretrained/sam_vit_b.pth",
+                 cache_dir=None, cache_size=8, backend="auto", pretrained_dir=PRETRAINED_DIR):
         print("Loading SAM model...")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
@@ -22,15 +213,33 @@ class RoofSegmenter:
         sam.to(device=self.device)
         
         # Create mask generator
+        self.sam = sam
         self.mask_generator = SamAutomaticMaskGenerator(sam)
-        print(f"✓ SAM loaded on {self.device}")
+        
+        # Predictor path: encode once, then decode prompts against cached embeddings
+        self.predictor = SamPredictor(sam)
+        self.embedding_cache = EmbeddingCache(cache_size, cache_dir)
+        self._current_key = None
+        self._embedding = None
+        self._lock = threading.RLock()
+        
+        # Encoder/decoder used by the predictor path ('auto' picks exported ONNX/TorchScript if present)
+        self.encoder = load_encoder(sam, backend, pretrained_dir)
+        self.decoder = load_decoder(sam, 'torch' if backend.startswith('torch') else 'auto', pretrained_dir)
+        print(f"✓ SAM loaded on {self.device} (encoder: {self.encoder.name}, decoder: {self.decoder.name})")
     
-    def segment_roof(self, image):
+    def make_mask_generator(self, **kwargs):
+        """Mask generator with custom settings that shares the loaded SAM weights"""
+        return SamAutomaticMaskGenerator(self.sam, **kwargs)
+    
+    @_holds_predictor
+    def segment_roof(self, image, mask_generator=None):
         """
         Segment the roof from aerial image
         
         Args:
             image: PIL Image or numpy array
+            mask_generator: Optional generator from make_mask_generator
             
         Returns:
             dict with roof_mask, roof_area, obstacles
@@ -44,16 +253,11 @@ class RoofSegmenter:
         
         # Generate masks
         print("Generating segments...")
-        masks = self.mask_generator.generate(image_np)
+        masks = (mask_generator or self.mask_generator).generate(image_np)
         
         # Find largest mask (usually the roof)
         if len(masks) == 0:
-            return {
-                'roof_mask': None,
-                'roof_area_sqft': 0,
-                'obstacles': [],
-                'usable_area_sqft': 0
-            }
+            return build_segmentation_result(None, 0, [])
         
         # Sort by area
         masks = sorted(masks, key=lambda x: x['area'], reverse=True)
@@ -66,53 +270,440 @@ class RoofSegmenter:
         for mask in masks[1:6]:  # Top 5 other segments
             if mask['area'] > 100:  # Filter small noise
                 obstacles.append({
-                    'mask': mask['segmentation'],
+                    'mask': CompactMask.from_dense(mask['segmentation']),
                     'area': mask['area'],
                     'bbox': mask['bbox']
                 })
         
-        # Calculate areas (assuming 1 pixel = 0.3m based on typical satellite images)
-        pixel_to_sqm = 0.09  # (0.3m)^2
-        sqm_to_sqft = 10.764
+        return build_segmentation_result(roof_mask, np.sum(roof_mask), obstacles)
+    
+    @_holds_predictor
+    def set_image(self, image):
+        """
+        Load an image into the predictor, reusing a cached embedding if possible
         
-        roof_area_pixels = np.sum(roof_mask)
-        roof_area_sqft = roof_area_pixels * pixel_to_sqm * sqm_to_sqft
+        Args:
+            image: PIL Image or numpy array
+            
+        Returns:
+            numpy array of the image
+        """
         
-        # Calculate usable area (roof - obstacles)
-        obstacle_area_pixels = sum([obs['area'] for obs in obstacles])
-        usable_area_sqft = (roof_area_pixels - obstacle_area_pixels) * pixel_to_sqm * sqm_to_sqft
+        image_np = np.array(image) if isinstance(image, Image.Image) else image
+        key = EmbeddingCache.image_key(image_np, namespace=self.encoder.name)
         
-        return {
-            'roof_mask': roof_mask,
-            'roof_area_sqft': int(roof_area_sqft),
-            'obstacles': obstacles,
-            'usable_area_sqft': int(usable_area_sqft),
-            'obstacle_count': len(obstacles)
-        }
+        if key == self._current_key and self.predictor.is_image_set:
+            return image_np
+        
+        embedding = self.embedding_cache.get(key)
+        
+        if embedding is None:
+            print("Encoding image...")
+            embedding = self.encoder(self._preprocess(image_np))
+            self.embedding_cache.put(key, embedding)
+        
+        # Load predictor state directly so the torch encoder never runs twice
+        h, w = image_np.shape[:2]
+        target = self.predictor.model.image_encoder.img_size
+        self.predictor.reset_image()
+        self.predictor.original_size = (h, w)
+        self.predictor.input_size = self.predictor.transform.get_preprocess_shape(h, w, target)
+        self.predictor.features = torch.from_numpy(embedding).to(self.device)
+        self.predictor.is_image_set = True
+        
+        self._embedding = embedding
+        self._current_key = key
+        return image_np
     
-    def visualize_segmentation(self, image, segmentation_result):
-        """Create visualization of segmentation"""
+    @_holds_predictor
+    def reset_image(self):
+        """Forget the current image and in-memory embeddings, so the next set_image encodes again"""
+        
+        self.predictor.reset_image()
+        self.embedding_cache.clear()
+        self._current_key = None
+        self._embedding = None
+    
+    def _preprocess(self, image_np):
+        """Resize, normalize and pad an RGB image to the encoder's (1, 3, 1024, 1024) input"""
         
-        if isinstance(image, Image.Image):
-            image_np = np.array(image)
+        resized = self.predictor.transform.apply_image(image_np)
+        tensor = torch.as_tensor(resized, device=self.device).permute(2, 0, 1).contiguous()[None, :, :, :]
+        return self.sam.preprocess(tensor.float())
+    
+    def _decode(self, coords, labels, multimask):
+        """
+        Run the decoder backend on prompts for the current image
+        
+        Args:
+            coords: (B, P, 2) pixel coordinates
+            labels: (B, P) prompt labels (1 point, 2/3 box corners, -1 padding)
+            multimask: Choose the best of the three multimask outputs
+            
+        Returns:
+            (logits, scores): (B, 256, 256) low-res logits of each
+            prompt's best mask (see _low_res / _upscale) and (B,)
+            predicted IoU
+        """
+        
+        coords = self.predictor.transform.apply_coords(
+            np.asarray(coords, dtype=np.float32), self.predictor.original_size)
+        labels = np.asarray(labels, dtype=np.float32)
+        
+        best_logits, best_scores = [], []
+        for start in range(0, len(coords), DECODE_CHUNK):
+            chunk = slice(start, start + DECODE_CHUNK)
+            logits, scores = self.decoder(self._embedding, coords[chunk], labels[chunk])
+            
+            # Output 0 is the single-mask head, 1-3 are the multimask candidates
+            logits, scores = (logits[:, 1:], scores[:, 1:]) if multimask else (logits[:, :1], scores[:, :1])
+            best = scores.argmax(axis=1)
+            index = np.arange(len(best))
+            best_logits.append(logits[index, best])
+            best_scores.append(scores[index, best])
+        
+        if not best_logits:
+            return np.zeros((0, 256, 256), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(best_logits), np.concatenate(best_scores)
+    
+    def _low_res(self, logits):
+        """
+        Binary low-res masks over the image (the padding SAM adds is cropped)
+        
+        Returns:
+            (masks, pixel_area): (B, h, w) bool masks and the number of
+            image pixels one low-res pixel covers
+        """
+        
+        h, w = self.predictor.input_size
+        low_h, low_w = -(-h * 256 // 1024), -(-w * 256 // 1024)
+        masks = logits[:, :low_h, :low_w] > self.sam.mask_threshold
+        height, width = self.predictor.original_size
+        return masks, height * width / (low_h * low_w)
+    
+    def _upscale(self, logits):
+        """
+        Full-resolution CompactMask from one (256, 256) logit map
+        
+        Same resampling as SAM's postprocessing (bilinear to the 1024 px
+        frame, crop the padding, bilinear to the image), one mask at a time.
+        """
+        
+        h, w = self.predictor.input_size
+        height, width = self.predictor.original_size
+        size = self.predictor.model.image_encoder.img_size
+        frame = cv2.resize(logits, (size, size), interpolation=cv2.INTER_LINEAR)[:h, :w]
+        full = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+        return CompactMask.from_dense(full > self.sam.mask_threshold)
+    
+    @_holds_predictor
+    def decode_points(self, points):
+        """
+        Decode one mask per point prompt with the mask decoder only
+        
+        Runs against the image loaded by set_image, DECODE_CHUNK
+        prompts per decoder call.
+        
+        Args:
+            points: (N, 2) array of (x, y) pixel coordinates
+            
+        Returns:
+            (logits, scores): as for _decode
+        """
+        
+        # The exported decoder expects a padding point when no box is given
+        coords = np.zeros((len(points), 2, 2), dtype=np.float32)
+        coords[:, 0] = points
+        labels = np.tile(np.array([1, -1], dtype=np.float32), (len(points), 1))
+        return self._decode(coords, labels, multimask=True)
+    
+    def _grid_proposals(self, image, points_per_side):
+        """
+        Deduplicated masks decoded from a point grid over the whole image
+        
+        Noise filtering and deduplication run on the low-res masks, so
+        only the masks a caller keeps are ever upscaled (_upscale).
+        
+        Returns:
+            (logits, areas, kept): (N, 256, 256) low-res logits, their
+            approximate areas in image pixels and the indices of distinct
+            masks, largest first
+        """
+        
+        image_np = self.set_image(image)
+        h, w = image_np.shape[:2]
+        
+        # Point grid at cell centres
+        offsets = (np.arange(points_per_side) + 0.5) / points_per_side
+        xs, ys = np.meshgrid(offsets * w, offsets * h)
+        points = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        
+        logits, _ = self.decode_points(points)
+        masks, pixel_area = self._low_res(logits)
+        areas = masks.reshape(len(masks), -1).sum(axis=1)
+        kept = _dedupe_masks(masks, areas, min_area=100 / pixel_area)
+        return logits, areas * pixel_area, kept
+    
+    @_holds_predictor
+    def segment_roof_fast(self, image, points_per_side=4):
+        """
+        Segment the roof from cached embeddings and a sparse point grid
+        
+        The first call on an image pays for one encoder pass; repeat
+        calls on the same image only run the mask decoder.
+        
+        Args:
+            image: PIL Image or numpy array
+            points_per_side: Grid density for roof/obstacle candidates
+        """
+        
+        logits, _, kept = self._grid_proposals(image, points_per_side)
+        
+        if len(kept) == 0:
+            return build_segmentation_result(None, 0, [])
+        
+        # Largest segment is likely the roof, the next five are obstacles
+        roof_mask = self._upscale(logits[kept[0]])
+        obstacles = [_mask_obstacle(self._upscale(logits[i])) for i in kept[1:6]]
+        
+        return build_segmentation_result(roof_mask, roof_mask.area, obstacles)
+    
+    @_holds_predictor
+    def segment_roof_prompted(self, image, point=None, box=None, points_per_side=8):
+        """
+        Segment only the target building using a point/box prompt
+        
+        Instead of segmenting everything and assuming the largest mask
+        is the roof, SAM is asked for the building under the prompt.
+        Obstacles are then decoded only from grid points inside it.
+        
+        Args:
+            image: PIL Image or numpy array
+            point: (x, y) pixel on the target roof (defaults to image centre)
+            box: Optional footprint box [x0, y0, x1, y1] in pixels
+            points_per_side: Obstacle grid density over the roof bbox
+        """
+        
+        image_np = self.set_image(image)
+        h, w = image_np.shape[:2]
+        
+        if point is None and box is None:
+            point = (w / 2, h / 2)
+        
+        # Box corners are prompt points labelled 2 and 3
+        coords, labels = [], []
+        if point is not None:
+            coords.append(point)
+            labels.append(1)
+        if box is not None:
+            coords += [box[:2], box[2:]]
+            labels += [2, 3]
         else:
-            image_np = image.copy()
+            coords.append((0, 0))
+            labels.append(-1)
+        
+        roof_logits, _ = self._decode(
+            np.array([coords], dtype=np.float32),
+            np.array([labels], dtype=np.float32),
+            multimask=box is None  # A lone point is ambiguous
+        )
+        
+        roof_mask = self._upscale(roof_logits[0])
+        
+        if roof_mask.area == 0:
+            return build_segmentation_result(None, 0, [])
+        
+        # Obstacle prompts: grid over the roof bbox, kept only where it lands on the roof
+        x0, y0, bw, bh = roof_mask.bbox
+        offsets = (np.arange(points_per_side) + 0.5) / points_per_side
+        gx, gy = np.meshgrid(x0 + offsets * bw, y0 + offsets * bh)
+        points = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        top, left, crop = roof_mask.crop()
+        points = points[crop[points[:, 1].astype(int) - top, points[:, 0].astype(int) - left]]
+        
+        # Obstacles must sit inside the roof and be clearly smaller than it.
+        # Both tests run on the low-res masks, one decoder chunk at a time
+        roof_low, pixel_area = self._low_res(roof_logits)
+        roof_low = roof_low[0]
+        roof_low_area = roof_low.sum()
+        
+        candidates, masks, areas = [], [], []
+        for start in range(0, len(points), DECODE_CHUNK):
+            logits, _ = self.decode_points(points[start:start + DECODE_CHUNK])
+            low, _ = self._low_res(logits)
+            inside = (low & roof_low).sum(axis=(1, 2))
+            area = low.sum(axis=(1, 2))
+            valid = (area > 0) & (inside >= 0.9 * area) & (area < 0.25 * roof_low_area)
+            candidates += list(logits[valid])
+            masks += list(low[valid] & roof_low)
+            areas += list(inside[valid])
         
-        roof_mask = segmentation_result['roof_mask']
+        obstacles = []
+        for i in _dedupe_masks(masks, np.array(areas), min_area=100 / pixel_area)[:5]:
+            mask = self._upscale(candidates[i]) & roof_mask
+            if mask.area > 0:
+                obstacles.append(_mask_obstacle(mask))
         
-        if roof_mask is None:
-            return image_np
+        return build_segmentation_result(roof_mask, roof_mask.area, obstacles)
+    
+    @_holds_predictor
+    def segment_roof_tiled(self, image, tile_size=1024, overlap=128, points_per_side=None):
+        """
+        Segment a large orthophoto tile by tile
+        
+        Mask proposals are joined across tile seams before the roof and
+        obstacles are ranked, so they are chosen once for the whole
+        image (see segment_tiled). Tiles run one at a time: the mask generator and the
+        predictor keep per-image state, so they cannot be shared between threads.
         
-        # Create colored overlay
-        overlay = image_np.copy()
-        overlay[roof_mask] = overlay[roof_mask] * 0.5 + np.array([0, 255, 0]) * 0.5
+        Args:
+            image: PIL Image or numpy array
+            tile_size: Tile edge length in pixels
+            overlap: Overlap between neighbouring tiles in pixels
+            points_per_side: Decode each tile's proposals from a point grid
+                with cached embeddings (as segment_roof_fast) instead of
+                the automatic mask generator
+        """
+        
+        def tile_masks(tile):
+            if points_per_side:
+                logits, _, kept = self._grid_proposals(tile, points_per_side)
+                return [self._upscale(logits[i]) for i in kept]
+            return [mask['segmentation'] for mask in self.mask_generator.generate(tile)]
         
-        # Draw obstacles
-        for obs in segmentation_result['obstacles']:
-            obs_mask = obs['mask']
-            overlay[obs_mask] = overlay[obs_mask] * 0.5 + np.array([255, 0, 0]) * 0.5
+        roof_mask, roof_area, obstacles = segment_tiled(
+            tile_masks, image, tile_size, overlap, max_workers=1
+        )
         
-        return overlay.astype(np.uint8)
+        return build_segmentation_result(roof_mask, roof_area, obstacles)
+    
+    def visualize_segmentation(self, image, segmentation_result, max_size=None):
+        """Create visualization of segmentation (see render_overlay)"""
+        return render_overlay(image, segmentation_result, max_size)
+
+
+CANNY_LOW, CANNY_HIGH = 50, 150
+
+
+def _blurred_gray(image_np):
+    return cv2.GaussianBlur(cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+
+
+def _gray_edges(gray):
+    """roof_edges of an already grayscale image"""
+    return cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), CANNY_LOW, CANNY_HIGH)
+
+
+def roof_edges(image_np):
+    """Canny edge map of an RGB image, as used for roof contours"""
+    return _gray_edges(cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY))
+
+
+def roof_edge_candidates(image_np):
+    """
+    roof_edges before hysteresis, for tiled segmentation
+    
+    Returns:
+        (weak, strong): edge pixels above the low / high threshold. The
+        edges are the weak pixels 8-connected to a strong one.
+    """
+    blurred = _blurred_gray(image_np)
+    return cv2.Canny(blurred, CANNY_LOW, CANNY_LOW), cv2.Canny(blurred, CANNY_HIGH, CANNY_HIGH)
+
+
+def largest_contour(edges):
+    """Largest external contour of an edge map (None if there is none)"""
+    
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) == 0:
+        return None
+    
+    areas = np.fromiter((cv2.contourArea(c) for c in contours), dtype=np.float64, count=len(contours))
+    return contours[np.argmax(areas)]
+
+
+def label_roof_regions(roof_contour, window_edges, origin, shape, min_area=100):
+    """
+    Roof region and interior obstacles in one labelling pass
+    
+    The roof contour is filled inside its bounding-box window and split
+    by the window's edges into 4-connected regions (so 1 px edges are
+    enough to separate them) with connectedComponentsWithStats. The
+    largest region is the roof surface; regions that do not touch the
+    roof outline are holes in it, i.e. obstacles.
+    
+    Args:
+        roof_contour: Roof contour in full-image coordinates
+        window_edges: Edge map of the roof's bounding-box window
+        origin: (x, y) of the window in the full image
+        shape: Full image (height, width)
+        min_area: Smallest obstacle kept, in pixels
+    
+    Returns:
+        dict with 'roof_crop' (bool window mask), 'roof_area', 'labels',
+        and obstacle arrays (largest first): 'ids', 'areas',
+        'bboxes' (N x [x, y, w, h]), 'centroids' (N x [x, y]) in image coordinates
+    """
+    
+    x0, y0 = origin
+    roof_crop = np.zeros(window_edges.shape, dtype=np.uint8)
+    cv2.drawContours(roof_crop, [roof_contour], -1, 1, -1, offset=(-x0, -y0))
+    
+    surface = roof_crop & (window_edges == 0).astype(np.uint8)
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(surface, connectivity=4)
+    
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    
+    # Regions touching the roof outline are part of the roof, not holes in it
+    outline = roof_crop - cv2.erode(roof_crop, np.ones((3, 3), dtype=np.uint8))
+    touching = np.zeros(count, dtype=bool)
+    touching[np.unique(labels[outline > 0])] = True
+    
+    keep = ~touching[1:] & (areas > min_area)
+    if len(areas) > 0:
+        keep[np.argmax(areas)] = False  # Main roof surface
+    
+    ids = np.arange(1, count)[keep]
+    ids = ids[np.argsort(-stats[ids, cv2.CC_STAT_AREA], kind='stable')]
+    
+    bboxes = stats[ids, :4].copy()
+    bboxes[:, 0] += x0
+    bboxes[:, 1] += y0
+    
+    return {
+        'roof_crop': roof_crop > 0,
+        'roof_area': cv2.countNonZero(roof_crop),
+        'origin': (x0, y0),
+        'shape': tuple(shape),
+        'labels': labels,
+        'ids': ids,
+        'areas': stats[ids, cv2.CC_STAT_AREA],
+        'bboxes': bboxes,
+        'centroids': centroids[ids] + [x0, y0]
+    }
+
+
+def result_from_regions(regions, max_obstacles=5):
+    """segment_roof dict from label_roof_regions output"""
+    
+    x0, y0 = regions['origin']
+    labels = regions['labels']
+    
+    roof_mask = CompactMask.from_dense(regions['roof_crop'], offset=(y0, x0), shape=regions['shape'])
+    
+    obstacles = []
+    for label, area, bbox, centroid in list(zip(regions['ids'], regions['areas'],
+                                                  regions['bboxes'], regions['centroids']))[:max_obstacles]:
+        x, y, w, h = [int(v) for v in bbox]
+        window = labels[y - y0:y - y0 + h, x - x0:x - x0 + w] == label
+        obstacles.append({
+            'mask': CompactMask.from_dense(window, offset=(y, x), shape=regions['shape']),
+            'area': int(area),
+            'bbox': [x, y, w, h],
+            'centroid': [float(centroid[0]), float(centroid[1])]
+        })
+    
+    return build_segmentation_result(roof_mask, regions['roof_area'], obstacles)
 
 
 # Alternative: Simple Computer Vision approach (if SAM is too heavy)
@@ -130,60 +721,140 @@ class SimplifiedRoofSegmenter:
         else:
             image_np = image
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+        # Grayscale, blur, Canny
+        edges = roof_edges(image_np)
+        
+        # Roof = largest contour, obstacles = holes inside it
+        roof_contour = largest_contour(edges)
+        
+        if roof_contour is None:
+            return build_segmentation_result(None, 0, [])
+        
+        x, y, w, h = cv2.boundingRect(roof_contour)
+        regions = label_roof_regions(roof_contour, edges[y:y + h, x:x + w], (x, y), edges.shape)
+        
+        return result_from_regions(regions)
+    
+    def segment_roof_tiled(self, image, tile_size=1024, overlap=128, max_workers=None):
+        """
+        Segment a large orthophoto in overlapping tiles
+        
+        Matches segment_roof on the whole image: regions are joined
+        across tile seams and the roof is picked once, globally (see
+        segment_edges_tiled). OpenCV releases the GIL, so tiles run in
+        parallel, and no full-size array is allocated.
+        
+        Args:
+            image: PIL Image or numpy array
+            tile_size: Tile edge length in pixels
+            overlap: Overlap between neighbouring tiles in pixels
+            max_workers: Parallel tiles (defaults to CPU count)
+        """
+        
+        roof_mask, roof_area, obstacles = segment_edges_tiled(
+            roof_edge_candidates, image, tile_size, overlap, max_workers
+        )
+        
+        return build_segmentation_result(roof_mask, roof_area, obstacles)
+    
+    def segment_roof_pyramid(self, image, levels=1, band_width=None, candidates=5):
+        """
+        Coarse-to-fine segmentation (experimental)
+        
+        Not used by the app: on the sample images it is barely faster
+        than segment_roof and, at either level, picks a different roof
+        on a third or more of them (see benchmark_pyramid.py, which
+        gates it on speedup and p90 area error).
+        
+        Roof candidates are the largest contours of an image downsampled
+        `levels` times (1/4 of the pixels per level). Each is snapped to
+        the largest full-res contour touching a thin band around it, and
+        the largest snapped contour is the roof, as segment_roof would
+        rank them. Full-res blur + Canny only run on candidate windows:
+        a candidate whose window cannot hold a contour larger than the
+        best so far is skipped, and the roof's obstacles are labelled
+        from its window's edges rather than a second pass.
+        
+        Args:
+            image: PIL Image or numpy array
+            levels: Number of pyrDown steps (0 = full resolution)
+            band_width: Half-width of the refinement band in full-res pixels
+                        (defaults to two coarse pixels)
+            candidates: Coarse contours considered at full resolution
+        """
+        
+        if isinstance(image, Image.Image):
+            image_np = np.array(image)
+        else:
+            image_np = image
         
-        # Apply GaussianBlur
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # One channel from here on, for the pyramid and the full-res windows
+        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+        small = gray
+        for _ in range(levels):
+            small = cv2.pyrDown(small)
         
-        # Edge detection
-        edges = cv2.Canny(blurred, 50, 150)
+        height, width = gray.shape
+        scale = np.array([width / small.shape[1], height / small.shape[0]])
         
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Coarse pass: same pipeline as segment_roof on the small image
+        contours, _ = cv2.findContours(_gray_edges(small), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # Find largest contour (roof)
         if len(contours) == 0:
-            return {
-                'roof_mask': None,
-                'roof_area_sqft': 0,
-                'obstacles': [],
-                'usable_area_sqft': 0
-            }
-        
-        largest_contour = max(contours, key=cv2.contourArea)
-        
-        # Create mask
-        mask = np.zeros(gray.shape, dtype=np.uint8)
-        cv2.drawContours(mask, [largest_contour], -1, 255, -1)
-        
-        # Calculate area
-        roof_area_pixels = cv2.contourArea(largest_contour)
-        pixel_to_sqm = 0.09
-        sqm_to_sqft = 10.764
-        roof_area_sqft = roof_area_pixels * pixel_to_sqm * sqm_to_sqft
-        
-        # Simple obstacle detection (smaller contours)
-        obstacles = []
-        for contour in contours[1:6]:
-            area = cv2.contourArea(contour)
-            if area > 100:
-                x, y, w, h = cv2.boundingRect(contour)
-                obstacles.append({
-                    'area': area,
-                    'bbox': [x, y, w, h]
-                })
+            return build_segmentation_result(None, 0, [])
+        
+        if band_width is None:
+            band_width = int(np.ceil(2 * scale.max()))
+        
+        # The coarse winner is not always the full-res winner, so refine the top few
+        roof, best_area = None, -1
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:candidates]:
+            contour = np.round(contour * scale).astype(np.int32)
+            x, y, w, h = cv2.boundingRect(contour)
+            if (w + 2 * band_width) * (h + 2 * band_width) <= best_area:
+                continue  # No contour in this window can be larger
+            refined = self._refine_contour(gray, contour, band_width)
+            area = cv2.contourArea(refined[0])
+            if area > best_area:
+                roof, best_area = refined, area
+        
+        # Obstacles: holes inside the roof, from the edges already found in its window
+        roof_contour, window_edges, (x0, y0) = roof
+        x, y, w, h = cv2.boundingRect(roof_contour)
+        roi_edges = window_edges[y - y0:y - y0 + h, x - x0:x - x0 + w]
+        regions = label_roof_regions(roof_contour, roi_edges, (x, y), (height, width))
+        
+        return result_from_regions(regions)
+    
+    @staticmethod
+    def _refine_contour(gray, contour, band_width):
+        """
+        Full-res contour near a (rescaled) coarse one, searched only in its bbox window
         
-        obstacle_area = sum([obs['area'] for obs in obstacles])
-        usable_area_sqft = (roof_area_pixels - obstacle_area) * pixel_to_sqm * sqm_to_sqft
+        Returns:
+            (contour, window_edges, (x0, y0)): refined contour in image
+            coordinates, the window's edge map and its origin
+        """
         
-        return {
-            'roof_mask': mask > 0,
-            'roof_area_sqft': int(roof_area_sqft),
-            'obstacles': obstacles,
-            'usable_area_sqft': int(usable_area_sqft),
-            'obstacle_count': len(obstacles)
-        }
+        height, width = gray.shape
+        x, y, w, h = cv2.boundingRect(contour)
+        x0, y0 = max(x - band_width, 0), max(y - band_width, 0)
+        x1, y1 = min(x + w + band_width, width), min(y + h + band_width, height)
+        
+        window_edges = _gray_edges(gray[y0:y1, x0:x1])
+        band = np.zeros(window_edges.shape, dtype=np.uint8)
+        cv2.drawContours(band, [contour - [x0, y0]], -1, 255, 2 * band_width + 1)
+        
+        # Candidates must touch the band around the coarse contour
+        refined, _ = cv2.findContours(window_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        refined = [c for c in refined if band[c[:, 0, 1], c[:, 0, 0]].any()]
+        
+        # Keep the coarse contour if the band held no usable edges
+        if len(refined) > 0:
+            best = max(refined, key=cv2.contourArea)
+            if cv2.contourArea(best) > 0:
+                contour = best + [x0, y0]
+        return contour, window_edges, (x0, y0)
 
 
 # Usage example
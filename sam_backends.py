@@ -0,0 +1,198 @@
+# models/sam_backends.py
+# Pluggable CPU inference backends for the SAM encoder and mask decoder
+
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from segment_anything.utils.onnx import SamOnnxModel
+
+
+PRETRAINED_DIR = "models/pretrained"
+
+# Exported encoder artifacts, in order of preference for backend="auto"
+ENCODER_ARTIFACTS = {
+    'onnx_int8': "sam_vit_b_encoder_int8.onnx",
+    'onnx': "sam_vit_b_encoder.onnx",
+    'torchscript_int8': "sam_vit_b_encoder_int8.pt",
+    'torchscript': "sam_vit_b_encoder.pt",
+}
+DECODER_ARTIFACT = "sam_vit_b_decoder.onnx"
+
+# The exported decoder also upsamples its masks to orig_im_size; asking for
+# the 1024 px input frame keeps that by-product bounded for any upload
+DECODER_FRAME = (1024, 1024)
+
+
+def _onnxruntime():
+    """onnxruntime module, or None if it is not installed"""
+    try:
+        import onnxruntime
+        return onnxruntime
+    except ImportError:
+        return None
+
+
+class TorchEncoder:
+    """SAM ViT encoder in eager PyTorch (optionally dynamic int8 quantized)"""
+
+    def __init__(self, sam, quantize=False):
+        self.model = sam.image_encoder
+        self.name = 'torch'
+        if quantize:
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {nn.Linear}, dtype=torch.qint8)
+            self.name = 'torch_int8'
+
+    def __call__(self, input_image):
+        """(1, 3, 1024, 1024) preprocessed tensor -> (1, 256, 64, 64) embedding"""
+        with torch.no_grad():
+            return self.model(input_image).cpu().numpy()
+
+
+class TorchScriptEncoder:
+    """Traced encoder saved by download_models.export_sam_encoder"""
+
+    def __init__(self, path, device="cpu"):
+        self.model = torch.jit.load(path, map_location=device)
+        self.model.eval()
+        self.name = 'torchscript_int8' if 'int8' in os.path.basename(path) else 'torchscript'
+
+    def __call__(self, input_image):
+        with torch.no_grad():
+            return self.model(input_image).cpu().numpy()
+
+
+class OnnxEncoder:
+    """ONNX Runtime encoder (CPU execution provider)"""
+
+    def __init__(self, path, threads=None):
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.name = 'onnx_int8' if 'int8' in os.path.basename(path) else 'onnx'
+
+    def __call__(self, input_image):
+        return self.session.run(None, {'image': input_image.cpu().numpy()})[0]
+
+
+class TorchDecoder:
+    """
+    Prompt encoder + mask decoder in PyTorch
+
+    Uses the same graph that gets exported to ONNX, so both decoder
+    backends take identical inputs and can be compared directly. Only
+    the low-res logits are computed: upscaling is left to the caller,
+    for the few masks it keeps.
+    """
+
+    name = 'torch'
+
+    def __init__(self, sam):
+        self.model = SamOnnxModel(sam, return_single_mask=False)
+        self.device = next(sam.parameters()).device
+
+    def __call__(self, embedding, point_coords, point_labels):
+        """
+        Decode a batch of prompts against one image embedding
+
+        Args:
+            embedding: (1, 256, 64, 64) image embedding
+            point_coords: (B, P, 2) coords in the 1024 px input frame
+            point_labels: (B, P) labels (1 fg, 0 bg, 2/3 box corners, -1 padding)
+
+        Returns:
+            (low_res_logits, scores): (B, 4, 256, 256) mask logits over
+            the padded 1024 px input frame, and (B, 4) predicted IoU
+        """
+
+        def to_tensor(array):
+            return torch.as_tensor(array, dtype=torch.float, device=self.device)
+
+        with torch.no_grad():
+            sparse = self.model._embed_points(to_tensor(point_coords), to_tensor(point_labels))
+            dense = self.model._embed_masks(torch.zeros((1, 1, 256, 256), device=self.device),
+                                            torch.zeros(1, device=self.device))
+            masks, scores = self.model.mask_decoder.predict_masks(
+                image_embeddings=to_tensor(embedding),
+                image_pe=self.model.model.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse,
+                dense_prompt_embeddings=dense,
+            )
+        return masks.cpu().numpy(), scores.cpu().numpy()
+
+
+class OnnxDecoder:
+    """ONNX Runtime prompt encoder + mask decoder"""
+
+    name = 'onnx'
+
+    def __init__(self, path, threads=None):
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, embedding, point_coords, point_labels):
+        """Same contract as TorchDecoder.__call__"""
+        scores, low_res = self.session.run(['iou_predictions', 'low_res_masks'], {
+            'image_embeddings': np.asarray(embedding, dtype=np.float32),
+            'point_coords': np.asarray(point_coords, dtype=np.float32),
+            'point_labels': np.asarray(point_labels, dtype=np.float32),
+            'mask_input': np.zeros((1, 1, 256, 256), dtype=np.float32),
+            'has_mask_input': np.zeros(1, dtype=np.float32),
+            'orig_im_size': np.asarray(DECODER_FRAME, dtype=np.float32),
+        })
+        return low_res, scores
+
+
+def load_encoder(sam, backend="auto", pretrained_dir=PRETRAINED_DIR):
+    """
+    Encoder backend for a loaded SAM model
+
+    Args:
+        sam: Loaded SAM model (used by the torch backends)
+        backend: 'auto', 'torch', 'torch_int8', or a key of ENCODER_ARTIFACTS
+        pretrained_dir: Where exported artifacts live
+    """
+
+    if backend == 'torch':
+        return TorchEncoder(sam)
+    if backend == 'torch_int8':
+        return TorchEncoder(sam, quantize=True)
+
+    names = list(ENCODER_ARTIFACTS) if backend == 'auto' else [backend]
+    for name in names:
+        path = os.path.join(pretrained_dir, ENCODER_ARTIFACTS[name])
+        if not os.path.exists(path):
+            continue
+        if name.startswith('onnx'):
+            if _onnxruntime() is None:
+                print("⚠ onnxruntime not installed, skipping ONNX encoder")
+                continue
+            return OnnxEncoder(path)
+        return TorchScriptEncoder(path, device=next(sam.parameters()).device)
+
+    if backend != 'auto':
+        raise FileNotFoundError(f"No exported SAM encoder for backend '{backend}' in {pretrained_dir}")
+    return TorchEncoder(sam)
+
+
+def load_decoder(sam, backend="auto", pretrained_dir=PRETRAINED_DIR):
+    """Decoder backend: ONNX if exported (and onnxruntime is available), else torch"""
+
+    path = os.path.join(pretrained_dir, DECODER_ARTIFACT)
+    if backend in ('auto', 'onnx') and os.path.exists(path) and _onnxruntime() is not None:
+        return OnnxDecoder(path)
+    if backend == 'onnx':
+        raise FileNotFoundError(f"No exported SAM decoder (or onnxruntime) for {path}")
+    return TorchDecoder(sam)
+
+
+def mask_iou(a, b):
+    """IoU of two boolean masks (1.0 if both are empty)"""
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
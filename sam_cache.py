@@ -0,0 +1,87 @@
+# models/sam_cache.py
+# Cache SAM image embeddings so the encoder runs once per upload
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    LRU cache of SAM image embeddings keyed by image content hash
+    (and the encoder backend that produced them, see image_key)
+    Optionally mirrors entries to .npy files so they survive restarts
+    """
+
+    def __init__(self, max_items=8, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def image_key(image_np, namespace=None):
+        """
+        Content hash of an image array (shape is part of the key)
+
+        Args:
+            namespace: Optional producer of the cached value, e.g. the
+                encoder backend, so int8 and fp32 embeddings never mix
+        """
+        digest = hashlib.sha1(str(image_np.shape).encode())
+        if namespace:
+            digest.update(f"|{namespace}".encode())
+        digest.update(np.ascontiguousarray(image_np).data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Return the cached embedding or None"""
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                embedding = np.load(self._path(key))
+            except (OSError, ValueError):
+                return None  # Partially written or corrupt file
+            self._remember(key, embedding)
+            return embedding
+
+        return None
+
+    def put(self, key, embedding):
+        """Store an embedding in memory (and on disk if enabled)"""
+
+        self._remember(key, embedding)
+
+        if self.cache_dir:
+            # Write then rename so readers never see a half-written file
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, embedding)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key, embedding):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop the in-memory entries (files in cache_dir are kept)"""
+        self._entries.clear()
+
+    def __contains__(self, key):
+        return key in self._entries or bool(self.cache_dir and os.path.exists(self._path(key)))
+
+    def __len__(self):
+        return len(self._entries)
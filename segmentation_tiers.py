@@ -0,0 +1,365 @@
+# models/segmentation_tiers.py
+# Pick the best segmentation engine that fits a latency budget
+
+import argparse
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from models.tiling import get_image_size, iter_tiles
+
+
+# Tiers from cheapest to best quality
+TIERS = ['cv', 'sam_sparse', 'sam_dense']
+
+# RoofSegmenter path and point grid per SAM tier. Both decode prompts
+# against cached image embeddings, so a repeat analysis of the same
+# upload only runs the mask decoder.
+SAM_TIER_SETTINGS = {
+    'sam_sparse': ('segment_roof_fast', 4),  # Largest of a few grid masks
+    'sam_dense': ('segment_roof_prompted', 16),  # Target building + obstacle grid
+}
+
+# Uncalibrated CPU latency guesses as (fixed ms, ms per megapixel).
+# SAM resizes every image to 1024 px, so its cost is mostly fixed: one
+# encoder pass (skipped on a cached embedding) plus the decoder prompts.
+PRIOR_LATENCY_MS = {
+    'cv': (5, 40),
+    'sam_sparse': (4000, 200),
+    'sam_dense': (5000, 200),
+}
+
+
+def prior_ms(tier, megapixels, tiles=1):
+    """Uncalibrated latency guess for a tier (the fixed cost is paid per tile)"""
+    fixed, per_megapixel = PRIOR_LATENCY_MS[tier]
+    return fixed * tiles + per_megapixel * megapixels
+
+
+def timing_key(tier, tiled=False):
+    """Calibration table a run is recorded in; tiled runs are timed separately"""
+    return f"{tier}_tiled" if tiled else tier
+
+
+class TieredRoofSegmenter:
+    """
+    Segmentation front-end with a latency budget
+
+    Each tier's runtime is recorded per image size class, separately for
+    whole-image and tiled runs. A request runs the best tier whose
+    predicted p99 latency fits the budget, falling back to the CV tier
+    when nothing else does.
+
+    Tiers that are never chosen keep their uncalibrated prior until
+    calibrate() measures them. It runs SAM on the CPU for several seconds
+    per pass, so it is never triggered by requests: run it out of band,
+    e.g. `python -m models.segmentation_tiers` before starting the app,
+    and point both at the same timings_path.
+
+    SAM can be passed directly or as sam_provider, a callable returning
+    the segmenter once it has loaded (None until then). The provider is
+    only asked when a request would choose a configured SAM tier, so SAM
+    is never loaded for a deployment that cannot use it; calibrate()
+    measures only the tiers already attached. SAM tiers join the
+    candidates once the provider returns a model.
+    """
+
+    def __init__(self, cv_segmenter, sam_segmenter=None, default_budget_ms=800,
+                 timings_path=None, history=200, percentile=99, sam_provider=None,
+                 min_samples=3, save_interval_s=30, tiers=TIERS):
+        self.cv_segmenter = cv_segmenter
+        self.sam_segmenter = None
+        self.sam_provider = sam_provider
+        if sam_segmenter is not None:
+            self.sam_provider = lambda: sam_segmenter
+        self.default_budget_ms = default_budget_ms
+        self.tiers = [tier for tier in TIERS if tier in tiers or tier == 'cv']  # Cheapest first
+        self.timings_path = timings_path
+        self.history = history
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.save_interval_s = save_interval_s
+
+        # {timing_key: {size_class: deque of ms}}, shared across Streamlit sessions
+        self.timings = {timing_key(tier, tiled): {} for tier in TIERS for tiled in (False, True)}
+        self._lock = threading.Lock()
+        self._load_timings()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if timings_path:
+            atexit.register(self.flush)
+
+        # {tier: (whole-image engine, tiled engine)}
+        self.engines = {'cv': (self.cv_segmenter.segment_roof, self.cv_segmenter.segment_roof_tiled)}
+        if sam_segmenter is not None:
+            self._attach_sam()  # Already loaded, so free to calibrate
+
+    def _available(self, tier):
+        """Whether a configured tier can run now, asking the SAM provider if needed"""
+
+        if tier not in self.engines and tier in SAM_TIER_SETTINGS:
+            self._attach_sam()
+        return tier in self.engines
+
+    def _attach_sam(self):
+        """Add the SAM tiers once the provider has a model"""
+
+        if self.sam_segmenter is not None or self.sam_provider is None:
+            return
+        sam_segmenter = self.sam_provider()
+        if sam_segmenter is None:
+            return
+
+        with self._lock:
+            if self.sam_segmenter is not None:
+                return
+            for tier, (method, points_per_side) in SAM_TIER_SETTINGS.items():
+                self.engines[tier] = self._sam_engine(sam_segmenter, method, points_per_side)
+            self.sam_segmenter = sam_segmenter
+
+    @staticmethod
+    def _sam_engine(sam_segmenter, method, points_per_side):
+        segment = getattr(sam_segmenter, method)
+        return (lambda image: segment(image, points_per_side=points_per_side),
+                lambda image, **kwargs: sam_segmenter.segment_roof_tiled(image, points_per_side=points_per_side, **kwargs))
+
+    @staticmethod
+    def size_class(width, height):
+        """Bucket images by long side, rounded up to a power of two"""
+        return 2 ** math.ceil(math.log2(max(width, height, 1)))
+
+    @staticmethod
+    def _prior(tier, width, height, tiling):
+        """prior_ms for a whole-image run, or for every tile of a tiled one"""
+        tiles = 1 if tiling is None else sum(1 for _ in iter_tiles(round(width), round(height), *tiling))
+        return prior_ms(tier, width * height / 1e6, tiles)
+
+    def predict_ms(self, tier, width, height, tiling=None):
+        """
+        Predicted p99 latency for a tier at this image size
+
+        Args:
+            tiling: (tile_size, overlap) to predict a tiled run
+        """
+
+        with self._lock:
+            samples = {s: list(ms) for s, ms in self.timings[timing_key(tier, tiling is not None)].items()}
+        size = self.size_class(width, height)
+
+        if samples.get(size):
+            return float(np.percentile(samples[size], self.percentile))
+
+        if samples:
+            # Rescale the nearest measured size class using the prior's cost curve
+            nearest = min(samples, key=lambda s: abs(math.log2(s / size)))
+            nearest_ms = float(np.percentile(samples[nearest], self.percentile))
+            ratio = nearest / size
+            scale = (self._prior(tier, width, height, tiling)
+                     / self._prior(tier, width * ratio, height * ratio, tiling))
+            return nearest_ms * scale
+
+        return self._prior(tier, width, height, tiling)
+
+    def choose_tier(self, width, height, budget_ms, tiling=None):
+        """Best available tier predicted to finish within budget"""
+
+        chosen = 'cv'
+        for tier in self.tiers:
+            if self.predict_ms(tier, width, height, tiling) <= budget_ms and self._available(tier):
+                chosen = tier
+        return chosen
+
+    def segment(self, image, budget_ms=None, tier=None):
+        """
+        Segment within a latency budget
+
+        Args:
+            image: PIL Image or numpy array
+            budget_ms: Latency budget (defaults to default_budget_ms)
+            tier: Force a specific tier (still timed and recorded)
+
+        Returns:
+            segment_roof dict plus 'segmentation_tier' and 'segmentation_ms'
+        """
+
+        return self._run(image, budget_ms, tier, None)
+
+    def segment_roof(self, image):
+        """Drop-in replacement for the single-engine segmenters"""
+        return self.segment(image)
+
+    def segment_roof_tiled(self, image, budget_ms=None, tier=None, tile_size=1024, overlap=128):
+        """
+        Tiled segmentation of a large image within a latency budget
+
+        Tiers are chosen and calibrated as in segment(), on the timings
+        of tiled runs; 'segmentation_tier' is reported as e.g. 'cv_tiled'.
+        """
+
+        return self._run(image, budget_ms, tier, (tile_size, overlap))
+
+    def _run(self, image, budget_ms, tier, tiling):
+        """Choose, run, time and record one tier, whole-image or tiled"""
+
+        width, height = get_image_size(image)
+        if budget_ms is None:
+            budget_ms = self.default_budget_ms
+        if tier is None:
+            tier = self.choose_tier(width, height, budget_ms, tiling)
+
+        elapsed_ms, result = self._time(tier, image, tiling)
+
+        result['segmentation_tier'] = timing_key(tier, tiling is not None)
+        result['segmentation_ms'] = round(elapsed_ms, 1)
+        return result
+
+    def _time(self, tier, image, tiling):
+        """Run one tier and record its runtime: (ms, result)"""
+
+        whole, tiled = self.engines[tier]
+        start = time.perf_counter()
+        if tiling is None:
+            result = whole(image)
+        else:
+            tile_size, overlap = tiling
+            result = tiled(image, tile_size=tile_size, overlap=overlap)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        width, height = get_image_size(image)
+        self.record(tier, width, height, elapsed_ms, tiled=tiling is not None)
+        return elapsed_ms, result
+
+    def _next_to_calibrate(self, width, height, budget_ms, tiling):
+        """Cheapest attached tier short of min_samples timings at this size, if any is worth measuring"""
+
+        size = self.size_class(width, height)
+        for tier in self.tiers:
+            if tier not in self.engines:  # Never load SAM just to measure it
+                continue
+            with self._lock:
+                count = len(self.timings[timing_key(tier, tiling is not None)].get(size, ()))
+            if count < self.min_samples:
+                return tier
+            # Tiers are ordered by cost: past one measured over budget, none can fit
+            if self.predict_ms(tier, width, height, tiling) > budget_ms:
+                return None
+        return None
+
+    def calibrate(self, image, budget_ms=None, tiling=None):
+        """
+        Measure every tier that could fit the budget at this image size
+
+        Runs tiers until each has min_samples timings for the image's
+        size class, stopping at the first tier measured over budget.
+        Slow for SAM tiers: run it off the request path (see main()).
+
+        Returns:
+            Number of calibration runs
+        """
+
+        if budget_ms is None:
+            budget_ms = self.default_budget_ms
+        width, height = get_image_size(image)
+        runs = 0
+        while (tier := self._next_to_calibrate(width, height, budget_ms, tiling)) is not None:
+            self._time(tier, image, tiling)
+            runs += 1
+        self.flush()
+        return runs
+
+    def record(self, tier, width, height, elapsed_ms, tiled=False):
+        """Add a measured runtime to the calibration table (saved every save_interval_s)"""
+
+        size = self.size_class(width, height)
+        with self._lock:
+            samples = self.timings[timing_key(tier, tiled)].setdefault(size, deque(maxlen=self.history))
+            samples.append(elapsed_ms)
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval_s
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the calibration table if it changed since the last save"""
+
+        if not self.timings_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                key: {str(size): list(samples) for size, samples in sizes.items()}
+                for key, sizes in self.timings.items()
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+        self._save_timings(data)
+
+    def _load_timings(self):
+        if not self.timings_path or not os.path.exists(self.timings_path):
+            return
+
+        try:
+            with open(self.timings_path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read segmentation timings: {e}")
+            return
+
+        for key, sizes in saved.items():
+            if key in self.timings:
+                for size, samples in sizes.items():
+                    self.timings[key][int(size)] = deque(samples, maxlen=self.history)
+
+    def _save_timings(self, data):
+        # Write then rename, so a crash never leaves a truncated table
+        os.makedirs(os.path.dirname(self.timings_path) or '.', exist_ok=True)
+        temp_path = f"{self.timings_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.timings_path)
+        except OSError as e:
+            print(f"⚠️ Could not save segmentation timings: {e}")
+
+
+def main():
+    """Calibrate the tiers on sample images before the app serves traffic"""
+
+    from PIL import Image
+    from models.roof_segmentation import RoofSegmenter, SimplifiedRoofSegmenter
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('images', nargs='*', default=sorted(glob.glob("data/sample_images/*.jpg")),
+                        help="Images at the sizes the app will see")
+    parser.add_argument('--budget-ms', type=float, default=800)
+    parser.add_argument('--tiers', default='cv,sam_sparse,sam_dense')
+    parser.add_argument('--tiled', action='store_true', help="Calibrate tiled runs (1024 px tiles)")
+    parser.add_argument('--timings', default="models/pretrained/segmentation_timings.json")
+    parser.add_argument('--sam-checkpoint', default="models/pretrained/sam_vit_b.pth")
+    args = parser.parse_args()
+
+    tiers = args.tiers.split(',')
+    sam = None
+    if any(tier in SAM_TIER_SETTINGS for tier in tiers) and os.path.exists(args.sam_checkpoint):
+        sam = RoofSegmenter(args.sam_checkpoint)
+    segmenter = TieredRoofSegmenter(SimplifiedRoofSegmenter(), sam_segmenter=sam, default_budget_ms=args.budget_ms,
+                                    timings_path=args.timings, tiers=tiers)
+
+    tiling = (1024, 128) if args.tiled else None
+    for path in args.images:
+        image = Image.open(path).convert("RGB")
+        runs = segmenter.calibrate(image, tiling=tiling)
+        print(f"{path}: {runs} runs, best tier within {args.budget_ms:.0f} ms: "
+              f"{segmenter.choose_tier(*image.size, args.budget_ms, tiling)}")
+
+
+if __name__ == "__main__":
+    main()
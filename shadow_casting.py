@@ -0,0 +1,270 @@
+# models/shadow_casting.py
+# Annual shading loss on the roof from obstacle shadows over the sun path
+
+import cv2
+import numpy as np
+
+from models.panel_layout import PIXEL_SIZE_M, roof_window
+from models.roof_segmentation import PIXEL_TO_SQM, SQM_TO_SQFT, as_compact_mask
+from utils.solar_simulation import HourlySolarSimulator
+
+DEFAULT_OBSTACLE_HEIGHT_M = 1.5  # HVAC units, vents, skylight curbs
+MIN_SUN_ELEVATION = 3  # Degrees; lower suns carry no beam in typical_year()
+
+# Loss shown at the top of the colour scale
+SHADING_MAP_MAX = 0.5
+
+
+def _mask_window(mask, origin, shape):
+    """Boolean (H, W) window of a mask whose top-left is origin (y, x) in the image"""
+
+    window = np.zeros(shape, dtype=bool)
+    mask = as_compact_mask(mask)
+    if mask is None or mask.area == 0:
+        return window
+    my, mx, crop = mask.crop()
+    y0, x0 = max(my, origin[0]), max(mx, origin[1])
+    y1, x1 = min(my + crop.shape[0], origin[0] + shape[0]), min(mx + crop.shape[1], origin[1] + shape[1])
+    if y1 > y0 and x1 > x0:
+        window[y0 - origin[0]:y1 - origin[0], x0 - origin[1]:x1 - origin[1]] = crop[y0 - my:y1 - my, x0 - mx:x1 - mx]
+    return window
+
+
+def obstacle_heights(obstacles, heights=None, default_height_m=DEFAULT_OBSTACLE_HEIGHT_M):
+    """
+    Height in metres for each obstacle
+
+    An obstacle's own 'height_m' wins, then heights (one value, or one
+    per obstacle), then the default.
+    """
+
+    if heights is None or np.ndim(heights) == 0:
+        heights = [default_height_m if heights is None else heights] * len(obstacles)
+    return np.array([obs.get('height_m', h) for obs, h in zip(obstacles, heights)], dtype=np.float32)
+
+
+class ShadowCaster:
+    """
+    Annual per-pixel shading loss from rooftop obstacles
+
+    Obstacles become a height map over the roof. For each of `sectors`
+    sun azimuths the horizon (tan of the elevation angle the obstacles
+    block) is computed for every roof cell at once by shifting the
+    height map along the sun direction, one shift per distance step.
+    Every daylight hour of a typical year then only needs a lookup:
+    hours are grouped by azimuth sector and sorted by sun elevation, so
+    the beam energy an obstacle blocks at a cell is one searchsorted
+    into the cumulative hourly beam. Diffuse loss comes from the sky
+    view factor of the same horizons.
+    """
+
+    def __init__(self, obstacle_height_m=DEFAULT_OBSTACLE_HEIGHT_M, sectors=36,
+                 resolution_m=0.5, max_distance_m=30, simulator=None, pixel_size_m=PIXEL_SIZE_M):
+        self.obstacle_height_m = obstacle_height_m
+        self.sectors = sectors  # Sun azimuth bins over 360°
+        self.resolution_m = resolution_m  # Working grid cell size
+        self.max_distance_m = max_distance_m  # Longest shadow considered
+        self.simulator = simulator or HourlySolarSimulator()
+        self.pixel_size_m = pixel_size_m  # Ground size of an image pixel
+
+    def height_map(self, segmentation_result, heights=None):
+        """
+        Roof and obstacle heights on the working grid
+
+        Returns:
+            (roof, height, origin, scale): uint8 0/1 roof grid, float32
+            obstacle heights in metres (0 on open roof), (y, x) of the
+            roof window in the image and grid cells per image pixel;
+            None if there is no roof
+        """
+
+        obstacles = segmentation_result.get('obstacles', [])
+        windows = roof_window(segmentation_result, obstacle_heights(obstacles, heights, self.obstacle_height_m))
+        if windows is None:
+            return None
+        roof, height, origin = windows
+
+        scale = self.pixel_size_m / self.resolution_m
+        size = (max(round(roof.shape[1] * scale), 1), max(round(roof.shape[0] * scale), 1))
+        # Pixel-centred sampling, so the map lines up again when scaled back
+        roof = cv2.resize(roof, size, interpolation=cv2.INTER_NEAREST_EXACT)
+        height = cv2.resize(height, size, interpolation=cv2.INTER_NEAREST_EXACT)
+        return roof, height, origin, scale
+
+    def sector_azimuths(self):
+        """Centre azimuth (degrees clockwise from north) of each sector"""
+        return np.arange(self.sectors) * 360 / self.sectors
+
+    def horizons(self, height):
+        """
+        Obstacle horizon per sector, (sectors, H, W) tan(elevation)
+
+        The image is taken as north-up: the sun at azimuth A lies along
+        (x, y) = (sin A, -cos A). A cell's horizon towards A is the
+        steepest obstacle top along that ray, max(height / distance).
+        """
+
+        rows, cols = height.shape
+        horizon = np.zeros((self.sectors, rows, cols), dtype=np.float32)
+        tallest = float(height.max())
+        if tallest <= 0:
+            return horizon
+
+        reach_m = min(self.max_distance_m, tallest / np.tan(np.radians(MIN_SUN_ELEVATION)))
+        reach = max(int(np.ceil(reach_m / self.resolution_m)), 1)
+        padded = np.zeros((rows + 2 * reach, cols + 2 * reach), dtype=np.float32)
+        padded[reach:reach + rows, reach:reach + cols] = height
+
+        steps = np.arange(1, reach + 1)
+        for k, azimuth in enumerate(np.radians(self.sector_azimuths())):
+            # Grid offsets along the ray, each once, with their true distance
+            offsets = np.unique(np.stack([np.rint(-np.cos(azimuth) * steps),
+                                          np.rint(np.sin(azimuth) * steps)], axis=1).astype(int), axis=0)
+            for dy, dx in offsets:
+                distance = np.hypot(dy, dx) * self.resolution_m
+                if distance == 0:
+                    continue
+                shifted = padded[reach + dy:reach + dy + rows, reach + dx:reach + dx + cols]
+                np.maximum(horizon[k], shifted * np.float32(1 / distance), out=horizon[k])
+        return horizon
+
+    def loss_fraction(self, horizon, weather):
+        """
+        Fraction of a year's horizontal irradiance lost at each cell
+
+        Args:
+            horizon: horizons() output
+            weather: One roof's typical_year() arrays, each (1, 8760) or (8760,)
+
+        Returns:
+            (H, W) float32 loss, 0 (unshaded) to 1
+        """
+
+        ghi = np.ravel(weather['ghi'])
+        day = ghi > 0
+        zenith = np.radians(np.ravel(weather['zenith'])[day])
+        beam = np.ravel(weather['dni'])[day] * np.cos(zenith)  # On the horizontal
+        sun_tan = np.cos(zenith) / np.maximum(np.sin(zenith), 1e-9)  # tan(elevation)
+        sector = np.rint(np.ravel(weather['azimuth'])[day] / (360 / self.sectors)).astype(int) % self.sectors
+
+        blocked = np.zeros(horizon.shape[1:], dtype=np.float64)
+        for k in range(self.sectors):
+            hours = sector == k
+            if not hours.any() or not horizon[k].any():
+                continue
+            order = np.argsort(sun_tan[hours])
+            elevations = sun_tan[hours][order]
+            energy = np.concatenate([[0], np.cumsum(beam[hours][order])])
+            # Beam from every hour whose sun is below this cell's horizon
+            blocked += energy[np.searchsorted(elevations, horizon[k])]
+
+        # Isotropic sky: each sector hides sin² of its horizon angle
+        squared = horizon.astype(np.float64) ** 2
+        hidden_sky = (squared / (1 + squared)).mean(axis=0)
+        blocked += hidden_sky * np.ravel(weather['dhi']).sum()
+
+        return (blocked / max(ghi.sum(), 1e-9)).astype(np.float32)
+
+    def annual_shading(self, segmentation_result, latitude, daily_irradiance, avg_temp=25,
+                       heights=None, panel_mask=None, weather=None):
+        """
+        Annual obstacle shading over the roof
+
+        Args:
+            segmentation_result: segment_roof output
+            latitude, daily_irradiance, avg_temp: Site climate, as for
+                HourlySolarSimulator.typical_year
+            heights: Obstacle heights in metres (one value or one per
+                obstacle; default obstacle_height_m)
+            panel_mask: Optional panel layout mask (PanelPacker) to
+                average the loss over
+            weather: Optional hourly weather with typical_year() keys
+
+        Returns:
+            dict: loss_map (float32 fraction of the year's irradiance
+            lost over the roof's bounding window, NaN off the roof and
+            on obstacles), origin ((y, x) of that window in the image),
+            annual_shading_percent (mean over the open roof),
+            panel_shading_percent (mean under the panels, else the roof
+            figure), shaded_area_sqft (pixels losing over 10%),
+            obstacle_height_m and image_shape
+        """
+
+        roof = as_compact_mask(segmentation_result.get('roof_mask'))
+        image_shape = roof.shape if roof is not None else None
+        empty = {
+            'loss_map': None,
+            'origin': None,
+            'annual_shading_percent': 0.0,
+            'panel_shading_percent': 0.0,
+            'shaded_area_sqft': 0,
+            'obstacle_height_m': self.obstacle_height_m,
+            'image_shape': image_shape
+        }
+        prepared = self.height_map(segmentation_result, heights)
+        if prepared is None:
+            return empty
+        roof_grid, height, origin, scale = prepared
+
+        weather = weather or self.simulator.typical_year(latitude, daily_irradiance, avg_temp)
+        loss = self.loss_fraction(self.horizons(height), weather)
+
+        # Working grid -> image pixels over the roof window, clipped to the image
+        roof_win, obstacle_win, _ = roof_window(segmentation_result)
+        loss = cv2.resize(loss, roof_win.shape[::-1], interpolation=cv2.INTER_LINEAR)
+        y0, x0 = max(origin[0], 0), max(origin[1], 0)
+        y1, x1 = min(origin[0] + loss.shape[0], image_shape[0]), min(origin[1] + loss.shape[1], image_shape[1])
+        window = (slice(y0 - origin[0], y1 - origin[0]), slice(x0 - origin[1], x1 - origin[1]))
+        loss_map = loss[window]
+        open_roof = (roof_win[window] > 0) & (obstacle_win[window] == 0)
+        loss_map[~open_roof] = np.nan
+
+        roof_loss = loss_map[open_roof]
+        annual = float(roof_loss.mean() * 100) if roof_loss.size else 0.0
+        panel = annual
+        if panel_mask is not None:
+            under_panels = loss_map[_mask_window(panel_mask, (y0, x0), loss_map.shape) & open_roof]
+            if under_panels.size:
+                panel = float(under_panels.mean() * 100)
+
+        return {
+            'loss_map': loss_map,
+            'origin': (y0, x0),
+            'annual_shading_percent': round(annual, 1),
+            'panel_shading_percent': round(panel, 1),
+            'shaded_area_sqft': int((roof_loss > 0.1).sum() * PIXEL_TO_SQM * SQM_TO_SQFT),
+            'obstacle_height_m': self.obstacle_height_m,
+            'image_shape': image_shape
+        }
+
+
+def render_shading(image, shading, alpha=0.6):
+    """
+    Colour the roof by annual shading loss over an image of any size
+
+    The loss window is scaled to the image and pasted back at its origin,
+    so only the roof's bounding box is resized and blended.
+
+    Returns:
+        RGB uint8 numpy array
+    """
+
+    image_np = np.array(image)
+    if not shading or shading.get('loss_map') is None:
+        return image_np
+
+    sy = image_np.shape[0] / shading['image_shape'][0]
+    sx = image_np.shape[1] / shading['image_shape'][1]
+    (oy, ox), (h, w) = shading['origin'], shading['loss_map'].shape
+    y0, x0 = round(oy * sy), round(ox * sx)
+    y1, x1 = max(round((oy + h) * sy), y0 + 1), max(round((ox + w) * sx), x0 + 1)
+    region = image_np[y0:y1, x0:x1]
+
+    loss = cv2.resize(shading['loss_map'], (region.shape[1], region.shape[0]), interpolation=cv2.INTER_NEAREST)
+    on_roof = ~np.isnan(loss)
+    levels = np.clip(np.nan_to_num(loss) / SHADING_MAP_MAX * 255, 0, 255).astype(np.uint8)
+    colors = cv2.cvtColor(cv2.applyColorMap(levels, cv2.COLORMAP_INFERNO), cv2.COLOR_BGR2RGB)
+
+    blended = cv2.addWeighted(colors, alpha, region, 1 - alpha, 0)
+    region[on_roof] = blended[on_roof]
+    return image_np
@@ -0,0 +1,244 @@
+# utils/solar_simulation.py
+# Hourly (8760-step) PV production over a typical year, vectorised over hours and roofs
+
+import numpy as np
+
+
+HOURS_PER_YEAR = 8760
+SOLAR_CONSTANT = 1367  # W/m²
+
+# Panel azimuth (degrees clockwise from north) for each detected orientation
+ORIENTATION_AZIMUTHS = {
+    "North": 0,
+    "North-East": 45,
+    "East": 90,
+    "South-East": 135,
+    "South": 180,
+    "South-West": 225,
+    "West": 270,
+    "North-West": 315
+}
+
+# Panel tilt (degrees) for each detected roof slope; flat roofs get
+# low-profile racks
+SLOPE_TILTS = {
+    "Flat": 10,
+    "Low": 10,
+    "Medium": 22,
+    "Steep": 35
+}
+
+
+def _column(values):
+    """(R, 1) float array so per-roof values broadcast against hours"""
+    return np.atleast_1d(np.asarray(values, dtype=np.float64)).reshape(-1, 1)
+
+
+def orientation_azimuth(orientation, latitude=0):
+    """Azimuth for an orientation label; unknown labels face the equator"""
+    return ORIENTATION_AZIMUTHS.get(orientation, 180 if latitude >= 0 else 0)
+
+
+def solar_position(latitude):
+    """
+    Sun position at every hour of a typical (non-leap) year
+
+    Times are local solar time at the middle of each hour, so there is
+    no longitude / time zone / equation-of-time term: annual totals do
+    not depend on them.
+
+    Args:
+        latitude: Degrees, scalar or (R,) array
+
+    Returns:
+        (zenith, azimuth, day_of_year): zenith and azimuth in degrees
+        (azimuth clockwise from north) with shape (R, 8760), and the
+        (8760,) day of year
+    """
+
+    hours = np.arange(HOURS_PER_YEAR)
+    day_of_year = hours // 24 + 1
+    hour_angle = np.radians(15 * (hours % 24 + 0.5 - 12))
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + day_of_year) / 365)
+
+    lat = np.radians(_column(latitude))
+    cos_zenith = (np.sin(lat) * np.sin(declination)
+                  + np.cos(lat) * np.cos(declination) * np.cos(hour_angle))
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+
+    # Azimuth from south (west positive), shifted to clockwise from north
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)
+    )) + 180
+
+    return zenith, azimuth, day_of_year
+
+
+class HourlySolarSimulator:
+    """
+    Hourly PV simulation: sun position -> plane-of-array irradiance ->
+    temperature-derated output
+
+    Everything is an (roofs x 8760 hours) array; there is no Python loop
+    over hours or roofs, so one roof-year takes a few milliseconds and
+    batches of roofs cost little more per roof. Without measured hourly
+    weather, a typical year is synthesised: clear-sky irradiance scaled
+    to the climate's mean daily irradiance (the number WeatherAPI
+    reports), split into beam and diffuse, and a seasonal + daily
+    temperature cycle around the average temperature.
+    """
+
+    def __init__(self):
+        self.system_losses = 0.14  # Soiling, wiring, mismatch, availability
+        self.inverter_efficiency = 0.96
+        self.temp_coefficient = -0.004  # Power change per °C above 25 °C
+        self.noct = 45  # Nominal operating cell temperature, °C
+        self.albedo = 0.2  # Ground reflectance
+        self.diurnal_temp_swing = 5  # ± °C around the daily mean
+
+    def typical_year(self, latitude, daily_irradiance, avg_temp=25):
+        """
+        Synthetic hourly weather for a typical year
+
+        Args:
+            latitude: Degrees, scalar or (R,) array
+            daily_irradiance: Mean global horizontal irradiance in
+                kWh/m²/day, scalar or (R,)
+            avg_temp: Mean air temperature in °C, scalar or (R,)
+
+        Returns:
+            dict of (R, 8760) arrays: ghi, dni, dhi (W/m²), temp_air (°C),
+            zenith, azimuth (degrees)
+        """
+
+        zenith, azimuth, day_of_year = solar_position(latitude)
+        cos_zenith = np.cos(np.radians(zenith))
+        sun_up = cos_zenith > 0
+
+        # Haurwitz clear-sky GHI, scaled so the year averages daily_irradiance
+        # (capped at clear sky: no site gets more than a cloudless year)
+        clear_ghi = np.where(sun_up, 1098 * cos_zenith * np.exp(-0.057 / np.maximum(cos_zenith, 1e-3)), 0)
+        target_wh = _column(daily_irradiance) * 1000 * 365
+        ghi = clear_ghi * np.minimum(target_wh / np.maximum(clear_ghi.sum(axis=1, keepdims=True), 1e-9), 1)
+
+        # Erbs decomposition into diffuse and beam from the clearness index
+        extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * day_of_year / 365))
+        kt = np.clip(ghi / np.maximum(extraterrestrial * cos_zenith, 1e-9), 0, 1)
+        diffuse_fraction = np.select(
+            [kt <= 0.22, kt <= 0.8],
+            [1 - 0.09 * kt, 0.9511 - 0.1604 * kt + 4.388 * kt**2 - 16.638 * kt**3 + 12.336 * kt**4],
+            0.165
+        )
+        dhi = ghi * diffuse_fraction
+        # Beam is unreliable with the sun on the horizon; treat it as diffuse
+        low_sun = cos_zenith < 0.05
+        dhi = np.where(low_sun, ghi, dhi)
+        dni = np.where(low_sun, 0, (ghi - dhi) / np.maximum(cos_zenith, 0.05))
+
+        # Seasonal cycle (warmest late July north, late January south) + daily cycle peaking at 15:00
+        lat = _column(latitude)
+        seasonal_swing = np.minimum(0.3 * np.abs(lat), 15)
+        warmest_day = np.where(lat >= 0, 205, 22)
+        hour_of_day = np.arange(HOURS_PER_YEAR) % 24 + 0.5
+        temp_air = (_column(avg_temp)
+                    + seasonal_swing * np.cos(2 * np.pi * (day_of_year - warmest_day) / 365)
+                    + self.diurnal_temp_swing * np.cos(2 * np.pi * (hour_of_day - 15) / 24))
+
+        return {'ghi': ghi, 'dni': dni, 'dhi': dhi, 'temp_air': temp_air,
+                'zenith': zenith, 'azimuth': azimuth}
+
+    def plane_of_array(self, weather, tilt, azimuth):
+        """
+        Irradiance on a tilted panel (isotropic sky), W/m²
+
+        Args:
+            weather: typical_year() output (or measured arrays, same keys)
+            tilt: Panel tilt from horizontal in degrees, scalar or (R,)
+            azimuth: Panel azimuth clockwise from north, scalar or (R,)
+
+        Returns:
+            (R, 8760) plane-of-array irradiance
+        """
+
+        tilt = np.radians(_column(tilt))
+        zenith = np.radians(weather['zenith'])
+        cos_aoi = (np.cos(zenith) * np.cos(tilt)
+                   + np.sin(zenith) * np.sin(tilt) * np.cos(np.radians(weather['azimuth'] - _column(azimuth))))
+
+        beam = weather['dni'] * np.maximum(cos_aoi, 0)
+        sky_diffuse = weather['dhi'] * (1 + np.cos(tilt)) / 2
+        ground = weather['ghi'] * self.albedo * (1 - np.cos(tilt)) / 2
+        return beam + sky_diffuse + ground
+
+    def production(self, system_size_kw, poa, temp_air, shading_percent=0):
+        """
+        Hourly AC output in kWh from plane-of-array irradiance
+
+        Output scales with POA / 1000 W/m² (the STC rating), derated by
+        cell temperature (NOCT model), shading, system losses and the
+        inverter.
+        """
+
+        temp_cell = temp_air + (self.noct - 20) / 800 * poa
+        temp_factor = 1 + self.temp_coefficient * (temp_cell - 25)
+        shading_factor = 1 - _column(shading_percent) / 100
+        dc = _column(system_size_kw) * poa / 1000 * temp_factor * shading_factor
+        return dc * (1 - self.system_losses) * self.inverter_efficiency
+    
+    def annual_production(self, system_size_kw, poa, temp_air, shading_percent=0):
+        """
+        production(...).sum(axis=-1) without building the hourly array
+        
+        Cell temperature is linear in POA, so hourly output is
+        c * (u * poa + g * poa^2) with a per-hour u and constant c, g,
+        and the annual sum reduces to two dot products over hours.
+        
+        Args:
+            system_size_kw, shading_percent: Scalars or arrays broadcasting
+                against poa.shape[:-1]
+            poa: (..., hours) plane-of-array irradiance
+            temp_air: (hours,) air temperature
+        """
+        
+        u = 1 + self.temp_coefficient * (np.ravel(temp_air) - 25)
+        g = self.temp_coefficient * (self.noct - 20) / 800
+        c = (np.asarray(system_size_kw) * (1 - np.asarray(shading_percent) / 100) / 1000
+             * (1 - self.system_losses) * self.inverter_efficiency)
+        return c * (poa @ u + g * np.einsum('...h,...h->...', poa, poa))
+
+    def simulate(self, system_size_kw, latitude, daily_irradiance, tilt=20, azimuth=180,
+                 avg_temp=25, shading_percent=0, weather=None):
+        """
+        Hourly production of one roof or a batch of roofs
+
+        Args:
+            system_size_kw, latitude, daily_irradiance, tilt, azimuth,
+            avg_temp, shading_percent: Scalars or (R,) arrays (broadcast)
+            weather: Optional hourly weather (typical_year() keys, e.g.
+                from a TMY file); synthesised when not given
+
+        Returns:
+            dict: hourly_kwh (R, 8760), annual_kwh (R,), monthly_kwh (R, 12),
+                  poa_kwh_m2 (R,) annual plane-of-array insolation and
+                  performance_ratio (R,)
+        """
+
+        weather = weather or self.typical_year(latitude, daily_irradiance, avg_temp)
+        poa = self.plane_of_array(weather, tilt, azimuth)
+        hourly = self.production(system_size_kw, poa, weather['temp_air'], shading_percent)
+
+        annual = hourly.sum(axis=1)
+        poa_kwh = poa.sum(axis=1) / 1000
+        month_starts = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])[:12] * 24
+        size = np.broadcast_to(_column(system_size_kw)[:, 0], annual.shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            performance_ratio = np.where(size * poa_kwh > 0, annual / (size * poa_kwh), 0)
+
+        return {
+            'hourly_kwh': hourly,
+            'annual_kwh': annual,
+            'monthly_kwh': np.add.reduceat(hourly, month_starts, axis=1),
+            'poa_kwh_m2': poa_kwh,
+            'performance_ratio': performance_ratio
+        }
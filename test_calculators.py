@@ -26,6 +26,24 @@ print(f"Annual Savings: ${roi['annual_savings']:,}")
 print(f"Payback Period: {roi['payback_period']} years")
 print(f"25-Year ROI: {roi['roi_percent']}%")
 
+# A laid-out roof where no panel fits is an empty system, not an error
+empty = solar_calc.calculate_roi(solar_calc.system_size_for_panels(0)[0], 0)
+assert empty['net_cost'] == 0 and empty['roi_percent'] == 0
+
+# Batch API: one row per roof
+portfolio = solar_calc.calculate_portfolio({
+    'usable_area_sqft': [1000, 500, 2500],
+    'solar_irradiance': [5.5, 4.0, 6.2],
+    'shading_percent': [10, 0, 25],
+    'orientation': ["South", "East", "Unknown"],
+})
+print(f"Batch (3 roofs): {portfolio['annual_production_kwh'].tolist()} kWh, "
+      f"payback {portfolio['payback_period'].tolist()} years")
+
+# Batch ROI agrees with the scalar one, empty systems included
+batch = solar_calc.calculate_roi_batch([system_size, 0], [production, 0])
+assert batch['roi_percent'].tolist() == [roi['roi_percent'], empty['roi_percent']]
+
 # Test Rainwater Calculator
 print("\n2. RAINWATER CALCULATOR")
 print("-" * 60)
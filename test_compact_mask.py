@@ -0,0 +1,26 @@
+import numpy as np
+from PIL import Image
+from models.roof_segmentation import SimplifiedRoofSegmenter
+from models.compact_mask import CompactMask
+
+print("Testing Compact Masks...")
+print("="*60)
+
+image = Image.open("data/sample_images/roof3.jpg")
+result = SimplifiedRoofSegmenter().segment_roof(image)
+roof_mask = result['roof_mask']
+
+dense = np.asarray(roof_mask)
+print(f"Dense Size: {dense.nbytes:,} bytes")
+print(f"Compact Size: {roof_mask.nbytes:,} bytes")
+print(f"Area: {roof_mask.area} px (dense: {dense.sum()})")
+print(f"BBox: {roof_mask.bbox}")
+
+# Set operations on the packed form
+box = np.zeros(dense.shape, dtype=bool)
+box[100:300, 200:500] = True
+box_mask = CompactMask.from_dense(box)
+print(f"Union Area: {(roof_mask | box_mask).area} (dense: {(dense | box).sum()})")
+print(f"Difference Area: {(roof_mask - box_mask).area} (dense: {(dense & ~box).sum()})")
+
+print("\n✅ Compact Masks Working!")
@@ -0,0 +1,53 @@
+import shutil
+import time
+import numpy as np
+from models.embedding_store import EmbeddingStore
+from models.feature_extractor import RoofFeatureExtractor
+
+print("Testing Batched Embeddings + Embedding Store...")
+print("="*60)
+
+STORE_DIR = "data/cache/test_embeddings"
+shutil.rmtree(STORE_DIR, ignore_errors=True)
+
+# Store round trip (no model needed)
+store = EmbeddingStore(STORE_DIR, dim=4)
+store.add(["a", "b", "a"], np.arange(12, dtype=np.float32).reshape(3, 4))
+reopened = EmbeddingStore(STORE_DIR, dim=4)
+print(f"Stored rows: {len(reopened)}, b -> {reopened.get('b')}")
+shutil.rmtree(STORE_DIR)
+
+# Interrupted append: a vector row was written but its key was not
+store = EmbeddingStore(STORE_DIR)
+store.add(["a"], [[1, 1]])
+with open(store.data_path, 'ab') as f:
+    f.write(np.float32([9, 9]).tobytes())
+reopened = EmbeddingStore(STORE_DIR)
+reopened.add(["b"], [[2, 2]])
+assert reopened.dim == 2 and len(reopened.vectors) == 2
+assert reopened.get("b").tolist() == [2, 2]
+print("✓ Rows without keys are dropped on open")
+
+# A store only opens with the width it was built with
+try:
+    EmbeddingStore(STORE_DIR, dim=4)
+    raise AssertionError("dim mismatch not detected")
+except ValueError as e:
+    print(f"✓ {e}")
+shutil.rmtree(STORE_DIR)
+
+# Batched ResNet embeddings (needs the pre-trained weights)
+paths = [f"data/sample_images/roof{i}.jpg" for i in range(1, 5)]
+extractor = RoofFeatureExtractor()
+store = EmbeddingStore(STORE_DIR)
+
+for batch_size in [1, 4]:
+    start = time.perf_counter()
+    result = extractor.extract_embeddings(paths, batch_size=batch_size, store=store)
+    if result is None:
+        break
+    keys, embeddings = result
+    print(f"Batch {batch_size}: {embeddings.shape} in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({len(store)} stored)")
+
+print("\n✅ Embedding Store Working!")
@@ -0,0 +1,33 @@
+import time
+from PIL import Image
+from models.feature_context import FeatureContext
+from models.feature_extractor import RoofFeatureExtractor
+from models.roof_segmentation import SimplifiedRoofSegmenter
+
+print("Testing Shared Feature Context...")
+print("="*60)
+
+image = Image.open("data/sample_images/roof2.jpg")
+extractor = RoofFeatureExtractor()
+
+ctx = FeatureContext(image)
+start = time.perf_counter()
+features = extractor.extract_all_features(ctx)
+first_ms = (time.perf_counter() - start) * 1000
+
+# Every intermediate is memoized, so a second pass does no image work
+start = time.perf_counter()
+extractor.extract_all_features(ctx)
+second_ms = (time.perf_counter() - start) * 1000
+
+print(f"Features: {features}")
+print(f"Cached: {sorted(k for k in vars(ctx) if k not in ('rgb', 'origin', 'mask') and not k.startswith('_'))}")
+print(f"First pass: {first_ms:.1f} ms, reusing context: {second_ms:.2f} ms")
+
+# Roof-only statistics on the roof bbox
+roof_mask = SimplifiedRoofSegmenter().segment_roof(image)['roof_mask']
+roof_ctx = FeatureContext(image, roof_mask)
+print(f"Roof ROI: {roof_ctx.shape} of {ctx.shape}, {roof_ctx.pixel_count} roof px")
+print(f"Roof features: {extractor.extract_all_features(roof_ctx)}")
+
+print("\n✅ Feature Context Working!")
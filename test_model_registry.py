@@ -0,0 +1,64 @@
+import time
+from PIL import Image
+from models.model_registry import ModelRegistry
+from models.roof_segmentation import SimplifiedRoofSegmenter
+from models.segmentation_tiers import TieredRoofSegmenter
+
+print("Testing Lazy Model Registry...")
+print("="*60)
+
+
+class SlowModel:
+    """Stand-in for a heavy model (e.g. SAM)"""
+
+    def __init__(self):
+        time.sleep(1)
+
+    def segment_roof_fast(self, image, points_per_side=4):
+        return SimplifiedRoofSegmenter().segment_roof(image)
+
+    def segment_roof_prompted(self, image, points_per_side=8):
+        return SimplifiedRoofSegmenter().segment_roof(image)
+
+
+registry = ModelRegistry()
+registry.register('cv_segmenter', SimplifiedRoofSegmenter)
+registry.register('slow', SlowModel)
+registry.register('unused', SlowModel)
+print(f"After register: {registry.status()}")
+
+thread = registry.warm(['slow'])
+segmenter = TieredRoofSegmenter(registry.get('cv_segmenter'), default_budget_ms=100000,
+                                sam_provider=lambda: registry.get_if_ready('slow'))
+
+image = Image.open("data/sample_images/roof1.jpg")
+start = time.perf_counter()
+result = segmenter.segment(image)
+print(f"While warming: tier {result['segmentation_tier']} in {(time.perf_counter() - start) * 1000:.0f} ms "
+      f"({registry.state('slow')})")
+
+thread.join()
+result = segmenter.segment(image)
+print(f"After warm-up: tier {result['segmentation_tier']}")
+
+# A deployment without SAM tiers never asks for the model
+cv_only = TieredRoofSegmenter(registry.get('cv_segmenter'), default_budget_ms=100000, tiers=['cv'],
+                              sam_provider=lambda: registry.get_or_warm('unused'))
+assert cv_only.segment(image)['segmentation_tier'] == 'cv'
+assert registry.state('unused') == 'not_loaded'
+
+# A tier that wants the model starts loading it without blocking the request
+lazy = TieredRoofSegmenter(registry.get('cv_segmenter'), default_budget_ms=100000,
+                           sam_provider=lambda: registry.get_or_warm('unused'))
+result = lazy.segment(image)
+print(f"First lazy request: tier {result['segmentation_tier']} ({registry.state('unused')})")
+assert result['segmentation_tier'] == 'cv' and registry.state('unused') == 'loading'
+
+# Calibration only measures engines that are already loaded
+registry.register('idle', SlowModel)
+idle = TieredRoofSegmenter(registry.get('cv_segmenter'), default_budget_ms=100000,
+                           sam_provider=lambda: registry.get_or_warm('idle'))
+assert idle.calibrate(image) == 3 and registry.state('idle') == 'not_loaded'
+print(f"Final states: {registry.status()}")
+
+print("\n✅ Model Registry Working!")
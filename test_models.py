@@ -1,5 +1,5 @@
 from PIL import Image
-from models.roof_segmentation import SimplifiedRoofSegmenter
+from models.roof_segmentation import SimplifiedRoofSegmenter, render_overlay
 
 # Load sample image
 image = Image.open("data/sample_images/roof1.jpg")
@@ -19,4 +19,9 @@ print("="*50)
 print(f"Roof Area: {result['roof_area_sqft']} sqft")
 print(f"Usable Area: {result['usable_area_sqft']} sqft")
 print(f"Obstacles: {result['obstacle_count']}")
-print("="*50)
\ No newline at end of file
+print("="*50)
+
+# Overlay at source and display resolution
+overlay = render_overlay(image, result)
+preview = render_overlay(image, result, max_size=256)
+print(f"Overlay: {overlay.shape}, preview: {preview.shape}")
\ No newline at end of file
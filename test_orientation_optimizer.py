@@ -0,0 +1,31 @@
+import time
+import numpy as np
+from utils.orientation_optimizer import OrientationOptimizer
+
+print("Testing Tilt/Azimuth Optimizer...")
+print("="*60)
+
+optimizer = OrientationOptimizer()
+grid = f"{len(optimizer.tilts)} tilts x {len(optimizer.azimuths)} azimuths"
+
+# One roof: 10 kW at 35°N, detected West-facing with a Medium (22°) pitch
+start = time.perf_counter()
+result = optimizer.optimize(35, 4.5, system_size_kw=10, avg_temp=20, orientation="West", tilt=22)
+elapsed = (time.perf_counter() - start) * 1000
+print(f"Grid of {grid} in {elapsed:.0f} ms")
+print(f"Optimum: tilt {result['best_tilt']:.0f}°, azimuth {result['best_azimuth']:.0f}° "
+      f"-> {result['best_annual_kwh']:,.0f} kWh")
+detected = result['detected']
+print(f"Detected {detected['orientation']} at {detected['tilt']:.0f}°: "
+      f"{detected['annual_kwh']:,.0f} kWh ({detected['loss_percent']}% loss)")
+
+# Batch: southern hemisphere roofs should face north
+batch = optimizer.optimize(np.array([-30, 10, 50]), np.array([5.0, 6.0, 3.5]),
+                           orientation=["North", "South", "Unknown"])
+print("\nBatch:")
+for lat, roof in zip([-30, 10, 50], batch):
+    loss = f"{roof['detected']['loss_percent']}% loss" if roof['detected'] else "orientation unknown"
+    print(f"  lat {lat:>4}: tilt {roof['best_tilt']:.0f}°, azimuth {roof['best_azimuth']:.0f}° ({loss})")
+
+print("\n" + "="*60)
+print("✅ Tilt/Azimuth Optimizer Working!")
@@ -16,7 +16,7 @@ print("✓ Segmentation complete")
 
 # Feature extraction
 extractor = RoofFeatureExtractor()
-features = extractor.extract_all_features(image)
+features = extractor.extract_all_features(image, seg_result['roof_mask'])
 print("✓ Feature extraction complete")
 
 # Combine results
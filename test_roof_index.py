@@ -0,0 +1,32 @@
+import shutil
+import numpy as np
+from models.roof_index import BruteForceIndex, IVFIndex
+
+print("Testing Roof Similarity Index...")
+print("="*60)
+
+INDEX_DIR = "data/cache/test_index"
+shutil.rmtree(INDEX_DIR, ignore_errors=True)
+
+rng = np.random.default_rng(0)
+vectors = rng.normal(size=(2000, 64)).astype(np.float32)
+keys = [f"roof{i}" for i in range(len(vectors))]
+
+exact = BruteForceIndex(f"{INDEX_DIR}/exact", dim=64)
+exact.add(keys, vectors)
+
+ivf = IVFIndex(f"{INDEX_DIR}/ivf", dim=64, n_lists=32, n_probe=8)
+ivf.add(keys[:1500], vectors[:1500])
+ivf.train()
+ivf.add(keys[1500:], vectors[1500:])  # Incremental add after training
+
+query = vectors[1700] + 0.05 * rng.normal(size=64)
+print(f"Exact: {exact.search(query, 3)}")
+print(f"IVF:   {ivf.search(query, 3)}")
+
+reopened = IVFIndex(f"{INDEX_DIR}/ivf", dim=64)
+print(f"Reopened IVF: {len(reopened)} vectors, trained={reopened.trained}, "
+      f"top hit {reopened.search(query, 1)[0][0]}")
+shutil.rmtree(INDEX_DIR)
+
+print("\n✅ Roof Index Working!")
@@ -0,0 +1,36 @@
+import tempfile
+import numpy as np
+from PIL import Image
+from models.sam_cache import EmbeddingCache
+
+print("Testing SAM Embedding Cache...")
+print("="*60)
+
+image = np.array(Image.open("data/sample_images/roof1.jpg"))
+key = EmbeddingCache.image_key(image)
+print(f"Image Key: {key}")
+
+# Embeddings from different encoder backends never share an entry
+assert EmbeddingCache.image_key(image, 'torch') != EmbeddingCache.image_key(image, 'onnx_int8')
+assert EmbeddingCache.image_key(image, 'torch') == EmbeddingCache.image_key(image.copy(), 'torch')
+
+cache_dir = tempfile.mkdtemp()
+cache = EmbeddingCache(max_items=2, cache_dir=cache_dir)
+embedding = np.random.rand(1, 256, 64, 64).astype(np.float32)
+cache.put(key, embedding)
+print(f"✓ Memory hit: {cache.get(key) is embedding}")
+
+# Evict from memory, then reload from disk
+cache.put("a", embedding)
+cache.put("b", embedding)
+print(f"Entries in memory: {len(cache)}")
+print(f"✓ Disk hit: {np.array_equal(cache.get(key), embedding)}")
+
+# A fresh cache sees the same file
+print(f"✓ Persisted: {key in EmbeddingCache(cache_dir=cache_dir)}")
+
+# Clearing drops the memory entries but keeps the files
+cache.clear()
+assert len(cache) == 0 and key in cache
+
+print("\n✅ Embedding Cache Working!")
@@ -0,0 +1,73 @@
+import time
+import numpy as np
+from PIL import Image
+from models.roof_segmentation import SimplifiedRoofSegmenter
+from models.panel_layout import PanelPacker
+from models.shadow_casting import ShadowCaster, render_shading
+
+print("Testing Obstacle Shadow Casting...")
+print("="*60)
+
+caster = ShadowCaster()
+
+# 36 x 30 m flat roof (north up) with a 3 x 3 m, 2 m tall plant room in the middle
+roof = np.zeros((140, 160), dtype=bool)
+roof[20:120, 20:140] = True
+plant_room = np.zeros_like(roof)
+plant_room[65:75, 75:85] = True
+seg_result = {'roof_mask': roof, 'obstacles': [{'mask': plant_room, 'height_m': 2.0}]}
+
+start = time.perf_counter()
+shading = caster.annual_shading(seg_result, latitude=45, daily_irradiance=4.0)
+elapsed = (time.perf_counter() - start) * 1000
+# The map covers the roof window only; paste it back to index by image pixel
+(oy, ox), (h, w) = shading['origin'], shading['loss_map'].shape
+assert (h, w) == (102, 122)
+loss = np.full(roof.shape, np.nan, dtype=np.float32)
+loss[oy:oy + h, ox:ox + w] = shading['loss_map']
+print(f"Full-year map ({caster.sectors} sun sectors) in {elapsed:.0f} ms")
+print(f"Roof average: {shading['annual_shading_percent']}%, "
+      f"{shading['shaded_area_sqft']} sqft lose over 10%")
+
+# At 45°N shadows fall north of the obstacle (up in the image)
+north, south = loss[60:65, 75:85].mean(), loss[75:80, 75:85].mean()
+print(f"Loss just north: {north:.1%}, just south: {south:.1%}, far corner: {loss[25, 25]:.1%}")
+assert north > south > loss[25, 25]
+assert np.isnan(loss[70, 80]) and np.isnan(loss[0, 0])
+
+# Same roof in the southern hemisphere: shadows flip to the south
+flipped = np.full(roof.shape, np.nan, dtype=np.float32)
+flipped[oy:oy + h, ox:ox + w] = caster.annual_shading(seg_result, latitude=-45, daily_irradiance=4.0)['loss_map']
+print(f"At 45°S, just north: {flipped[60:65, 75:85].mean():.1%}, just south: {flipped[75:80, 75:85].mean():.1%}")
+
+# Taller obstacles shade more
+seg_result['obstacles'][0].pop('height_m')
+tall = caster.annual_shading(seg_result, 45, 4.0, heights=4.0)
+print(f"4 m tall: {tall['annual_shading_percent']}% roof average")
+assert tall['annual_shading_percent'] > shading['annual_shading_percent']
+
+# Sample roofs, averaged under the packed panels
+segmenter = SimplifiedRoofSegmenter()
+packer = PanelPacker()
+print("\nSample roofs:")
+for i in range(1, 5):
+    image = Image.open(f"data/sample_images/roof{i}.jpg").convert('RGB')
+    result = segmenter.segment_roof(image)
+    layout = packer.pack(result)
+    start = time.perf_counter()
+    shading = caster.annual_shading(result, 28.6, 5.5, panel_mask=layout['panel_mask'])
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"  roof{i}: {result['obstacle_count']} obstacles, roof {shading['annual_shading_percent']}%, "
+          f"panels {shading['panel_shading_percent']}% in {elapsed:.0f} ms")
+    assert render_shading(image, shading).shape == np.array(image).shape
+    # Display-size rendering pastes the window back in the same place
+    small = image.resize((image.size[0] // 2, image.size[1] // 2))
+    changed = np.any(render_shading(small, shading) != np.array(small), axis=2)
+    if changed.any() and shading['loss_map'] is not None:
+        ys, xs = np.nonzero(changed)
+        (oy, ox), (h, w) = shading['origin'], shading['loss_map'].shape
+        assert ys.min() >= oy // 2 - 1 and ys.max() <= (oy + h) // 2 + 1
+        assert xs.min() >= ox // 2 - 1 and xs.max() <= (ox + w) // 2 + 1
+
+print("\n" + "="*60)
+print("✅ Obstacle Shadow Casting Working!")
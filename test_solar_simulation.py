@@ -0,0 +1,37 @@
+import time
+import numpy as np
+from utils.solar_simulation import HourlySolarSimulator
+from utils.calculations import SolarCalculator
+
+print("Testing Hourly Solar Simulation...")
+print("="*60)
+
+simulator = HourlySolarSimulator()
+
+# One roof-year: 10 kW, 20°N, 5.5 kWh/m²/day, south-facing at 20° tilt
+start = time.perf_counter()
+result = simulator.simulate(10, 20, 5.5, tilt=20, azimuth=180, avg_temp=28)
+elapsed = (time.perf_counter() - start) * 1000
+print(f"One roof-year ({result['hourly_kwh'].shape[1]} hours) in {elapsed:.1f} ms")
+print(f"Annual: {result['annual_kwh'][0]:,.0f} kWh, POA {result['poa_kwh_m2'][0]:,.0f} kWh/m², "
+      f"PR {result['performance_ratio'][0]:.2f}")
+print(f"Monthly: {np.round(result['monthly_kwh'][0]).astype(int).tolist()}")
+
+# Batch: the same system at several latitudes (WeatherAPI's irradiance buckets), facing the equator
+latitudes = np.array([0, 20, 40, -35, 60])
+irradiance = np.array([6.0, 5.5, 4.5, 4.5, 2.5])
+start = time.perf_counter()
+batch = simulator.simulate(10, latitudes, irradiance, tilt=np.abs(latitudes), azimuth=np.where(latitudes >= 0, 180, 0))
+elapsed = (time.perf_counter() - start) * 1000
+print(f"\nBatch of {len(latitudes)} roofs in {elapsed:.1f} ms")
+for lat, annual in zip(latitudes, batch['annual_kwh']):
+    print(f"  lat {lat:>4}: {annual:,.0f} kWh")
+
+# Calculator: hourly vs the daily shortcut
+calc = SolarCalculator()
+print(f"\nDaily shortcut: {calc.calculate_production(10, 5.5, 10, 'South'):,} kWh")
+print(f"Hourly (West-facing): {calc.calculate_production_hourly(10, 20, 5.5, 10, 'West'):,} kWh")
+print(f"Hourly (South-facing): {calc.calculate_production_hourly(10, 20, 5.5, 10, 'South'):,} kWh")
+
+print("\n" + "="*60)
+print("✅ Hourly Solar Simulation Working!")
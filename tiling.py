@@ -0,0 +1,520 @@
+# models/tiling.py
+# Tiled segmentation for large orthophotos
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from models.compact_mask import CompactMask, union_all
+
+
+def get_image_size(image):
+    """Return (width, height) for a PIL Image or numpy array"""
+    if isinstance(image, Image.Image):
+        return image.size
+    return image.shape[1], image.shape[0]
+
+
+def iter_tiles(width, height, tile_size=1024, overlap=128):
+    """
+    Split an image into overlapping windows
+
+    Each tile is (window, core): window is the (x0, y0, x1, y1) region that
+    gets segmented, core is the part of it this tile owns when stitching.
+    Cores never overlap and together cover the whole image, so every pixel
+    is written by exactly one tile.
+    """
+
+    step = max(tile_size - overlap, 1)
+    half = overlap // 2
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        points = list(range(0, length - tile_size, step))
+        points.append(length - tile_size)  # Last tile flush with the edge
+        return points
+
+    xs, ys = starts(width), starts(height)
+
+    for j, y0 in enumerate(ys):
+        y1 = min(y0 + tile_size, height)
+        for i, x0 in enumerate(xs):
+            x1 = min(x0 + tile_size, width)
+
+            # Core runs to the midpoint of the overlap with each neighbour
+            cx0 = 0 if i == 0 else (xs[i - 1] + tile_size + x0) // 2
+            cx1 = width if i == len(xs) - 1 else (x1 + xs[i + 1]) // 2
+            cy0 = 0 if j == 0 else (ys[j - 1] + tile_size + y0) // 2
+            cy1 = height if j == len(ys) - 1 else (y1 + ys[j + 1]) // 2
+
+            yield (x0, y0, x1, y1), (cx0, cy0, cx1, cy1)
+
+
+def read_tile(image, window):
+    """Crop one window without converting the whole image to numpy"""
+    x0, y0, x1, y1 = window
+    if isinstance(image, Image.Image):
+        return np.array(image.crop((x0, y0, x1, y1)))
+    return image[y0:y1, x0:x1]
+
+
+class _DisjointSets:
+    """Union-find over integer ids, for regions joined across tile seams"""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, pairs):
+        for a, b in pairs:
+            ra, rb = self.find(int(a)), self.find(int(b))
+            if ra != rb:
+                self.parent[ra] = rb
+
+    def roots(self):
+        """Root id of every element, as an array"""
+        roots = np.array(self.parent, dtype=np.int64)
+        while True:
+            parents = roots[roots]
+            if np.array_equal(parents, roots):
+                return roots
+            roots = parents
+
+
+def _seams(tiles):
+    """
+    Neighbouring tile pairs (a, b, side), b being 'right', 'below',
+    'below_right' or 'below_left' of a
+
+    Tile cores form a grid (their x-bounds depend only on the column,
+    y-bounds only on the row), so neighbours are looked up by grid cell.
+    """
+
+    xs = sorted({core[0] for _, core in tiles})
+    ys = sorted({core[1] for _, core in tiles})
+    grid = {(ys.index(core[1]), xs.index(core[0])): t for t, (_, core) in enumerate(tiles)}
+
+    steps = (('right', 0, 1), ('below', 1, 0), ('below_right', 1, 1), ('below_left', 1, -1))
+    for (row, col), a in grid.items():
+        for side, dr, dc in steps:
+            b = grid.get((row + dr, col + dc))
+            if b is not None:
+                yield a, b, side
+
+
+def _border_strips(labels):
+    """First/last row and column of a core's label (or mask) array, copied off it"""
+    return {'top': labels[0].copy(), 'bottom': labels[-1].copy(),
+            'left': labels[:, 0].copy(), 'right': labels[:, -1].copy()}
+
+
+def _seam_lines(a, b, side):
+    """The two border lines that face each other across a seam"""
+    if side == 'right':
+        return a['right'], b['left']
+    if side == 'below':
+        return a['bottom'], b['top']
+    if side == 'below_right':
+        return a['bottom'][-1:], b['top'][:1]
+    return a['bottom'][:1], b['top'][-1:]
+
+
+def _label_pairs(a, b, side, diagonal):
+    """
+    (id_a, id_b) pairs of labels touching across a seam
+
+    Args:
+        a, b: Border strips of global label ids (-1 = unlabelled)
+        side: Where b lies relative to a (see _seams)
+        diagonal: 8-connectivity (also joins diagonal neighbours and
+            tiles meeting at a corner) instead of 4-connectivity
+    """
+
+    if side in ('below_right', 'below_left') and not diagonal:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    u, v = _seam_lines(a, b, side)
+    facing = [(u, v)]
+    if diagonal and len(u) > 1:
+        facing += [(u[1:], v[:-1]), (u[:-1], v[1:])]
+
+    pairs = np.concatenate([np.stack([x, y], axis=1) for x, y in facing])
+    pairs = pairs[(pairs >= 0).all(axis=1)]
+    return np.unique(pairs, axis=0)
+
+
+def _join_labels(counts, strips, seams, diagonal):
+    """
+    Join per-tile labels into regions spanning the whole image
+
+    Tile t's labels 1..counts[t] get global ids offsets[t]..offsets[t+1]-1.
+
+    Args:
+        counts: Labels per tile (background 0 not counted)
+        strips: Per tile, _border_strips of its label array
+        seams: _seams output
+        diagonal: Join 8-connected (else 4-connected) neighbours
+
+    Returns:
+        (offsets, roots, strips): per-tile id offsets, the region (root
+        id) of every global id, and the strips as global ids (-1 = none)
+    """
+
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    strips = [{side: np.where(line > 0, line.astype(np.int64) + offsets[t] - 1, -1)
+               for side, line in tile_strips.items()}
+              for t, tile_strips in enumerate(strips)]
+
+    regions = _DisjointSets(int(offsets[-1]))
+    for a, b, side in seams:
+        regions.union(_label_pairs(strips[a], strips[b], side, diagonal))
+    return offsets, regions.roots(), strips
+
+
+def _local(values, offsets, t, fill=False):
+    """Per-label lookup table for tile t from a global array (index 0 = fill)"""
+    lut = np.empty(offsets[t + 1] - offsets[t] + 1, dtype=np.asarray(values).dtype)
+    lut[0] = fill
+    lut[1:] = values[offsets[t]:offsets[t + 1]]
+    return lut
+
+
+def _outline_across(seams, bg_strips, filled_strips):
+    """
+    Global background ids with an 8-neighbour across a seam that is
+    outside every contour
+
+    Args:
+        seams: _seams output
+        bg_strips: Per tile, border strips of global background ids (-1 = edge)
+        filled_strips: Per tile, border strips of the filled-contour mask
+    """
+
+    ids = [np.zeros(0, dtype=np.int64)]
+    for a, b, side in seams:
+        bg_a, bg_b = _seam_lines(bg_strips[a], bg_strips[b], side)
+        filled_a, filled_b = _seam_lines(filled_strips[a], filled_strips[b], side)
+        for bg, filled in ((bg_a, filled_b), (bg_b, filled_a)):
+            # Pixel i on this side against pixel i + shift across the seam
+            for shift in ((0, -1, 1) if len(bg) > 1 else (0,)):
+                lo, hi = max(-shift, 0), len(bg) - max(shift, 0)
+                near = bg[lo:hi]
+                ids.append(near[(near >= 0) & ~filled[lo + shift:hi + shift]])
+    return np.concatenate(ids)
+
+
+def _cell_area(a, b, c, d):
+    """
+    Polygon area of each 2x2 pixel cell, by owning label
+
+    A contour traced through pixel centres covers a cell fully when all
+    four corner pixels are inside it and half of it (cut along the
+    diagonal) when three are, so summing cells gives cv2.contourArea
+    of the filled region. Filled corners of one cell are 8-adjacent and
+    so always share a label.
+
+    Args:
+        a, b, c, d: Corner labels (top-left, top-right, bottom-left,
+            bottom-right), arrays of equal shape, 0 = outside
+
+    Returns:
+        (labels, weights) for np.bincount
+    """
+
+    filled = (a > 0).view(np.uint8) + (b > 0).view(np.uint8) + (c > 0).view(np.uint8) + (d > 0).view(np.uint8)
+    covered = filled >= 3
+    # With three corners filled, a or d (opposite corners) is one of them
+    labels = np.maximum(a[covered], d[covered])
+    return labels, np.where(filled[covered] == 4, 1.0, 0.5)
+
+
+def _seam_cells(tiles, strips):
+    """
+    Corner labels of the 2x2 cells that straddle tile seams
+
+    Yields (a, b, c, d) for _cell_area from the border strips of
+    neighbouring tiles (global ids, -1 = outside): cells along each
+    vertical and horizontal seam, and the cell where four tiles meet.
+    """
+
+    neighbours = {}
+    for a, b, side in _seams(tiles):
+        neighbours.setdefault(a, {})[side] = b
+
+    for a, sides in neighbours.items():
+        if 'right' in sides:
+            left, right = strips[a]['right'], strips[sides['right']]['left']
+            yield left[:-1], right[:-1], left[1:], right[1:]
+        if 'below' in sides:
+            top, bottom = strips[a]['bottom'], strips[sides['below']]['top']
+            yield top[:-1], top[1:], bottom[:-1], bottom[1:]
+        if {'right', 'below', 'below_right'} <= sides.keys():
+            yield (strips[a]['bottom'][-1:], strips[sides['right']]['bottom'][:1],
+                   strips[sides['below']]['top'][-1:], strips[sides['below_right']]['top'][:1])
+
+
+SQUARE = np.ones((3, 3), dtype=np.uint8)
+
+
+def _map_waves(fn, items, max_workers):
+    """fn over items in a thread pool, in waves of max_workers so few results are alive at once"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(items), max_workers):
+            wave = items[start:start + max_workers]
+            yield from zip(wave, executor.map(fn, wave))
+
+
+def segment_edges_tiled(edge_fn, image, tile_size=1024, overlap=128, max_workers=None,
+                        max_obstacles=5, min_area=100):
+    """
+    Edge-based roof segmentation over tiles, with the roof chosen once for
+    the whole image
+
+    Gives what SimplifiedRoofSegmenter.segment_roof gets on the whole
+    image (roof = the filled external contour of largest area,
+    obstacles = holes in it) without a full-size array. Each stage
+    labels regions per tile core, joins them across seams with
+    union-find and decides globally:
+
+    1. Edges: Canny hysteresis keeps weak edge pixels 8-connected to a
+       strong one, however far away, so it is resolved across tiles
+       from edge_fn's weak and strong maps rather than per tile.
+    2. Background regions (4-connected) touching the image border are
+       outside every contour.
+    3. Everything else is inside some contour. Those regions, labelled
+       8-connected like contour tracing, are the roof candidates; the
+       one with the largest contour area is the roof.
+    4. Background regions in the roof, except the largest (the open
+       roof surface), are obstacles.
+
+    Edge maps are computed on tile windows (the overlap covers the
+    blur and gradient kernels) and kept bit-packed between stages. Roof
+    and obstacle masks are joined from per-tile CompactMask pieces.
+    Each stage relabels its tiles, so a single core does several times
+    the work of segment_roof: tiling buys bounded memory, and speed
+    only through max_workers.
+
+    Args:
+        edge_fn: callable(window_np) -> (weak, strong) edge candidate maps
+            (non-zero = candidate), e.g. roof_edge_candidates
+        image: PIL Image or numpy array
+        tile_size, overlap: Tile edge length and overlap in pixels
+        max_workers: Tiles processed concurrently (default CPU count)
+        max_obstacles: Obstacles kept (largest first)
+        min_area: Smallest obstacle kept, in pixels
+
+    Returns:
+        (roof_mask, roof_area, obstacles): CompactMask (None when there
+        is no roof), its area in pixels and segment_roof style obstacle
+        dicts in full-image coordinates
+    """
+
+    width, height = get_image_size(image)
+    shape = (height, width)
+    tiles = list(iter_tiles(width, height, tile_size, overlap))
+    seams = list(_seams(tiles))
+    indices = list(range(len(tiles)))
+    workers = max_workers or os.cpu_count() or 1
+    packed = [None] * len(tiles)
+
+    def unpack(t):
+        cx0, _, cx1, _ = tiles[t][1]
+        return np.unpackbits(packed[t], axis=1, count=cx1 - cx0).view(bool)
+
+    def run(fn, items=indices):
+        """fn over tiles, results transposed into per-field lists"""
+        results = [None] * len(tiles)
+        for t, result in _map_waves(fn, items, workers):
+            results[t] = result
+        return list(zip(*(r for r in results if r is not None)))
+
+    # 1. Edge hysteresis: weak candidates, labelled, and which hold a strong pixel
+    def weak_labels(t):
+        (x0, y0, _, _), (cx0, cy0, cx1, cy1) = tiles[t]
+        weak, strong = edge_fn(read_tile(image, tiles[t][0]))
+        core = (slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0))
+        weak, strong = weak[core] > 0, strong[core] > 0
+        packed[t] = np.packbits(weak, axis=1)
+        count, labels = cv2.connectedComponents(weak.view(np.uint8), connectivity=8)
+        return count - 1, np.unique(labels[strong]), _border_strips(labels)
+
+    counts, strong_ids, strips = run(weak_labels)
+    offsets, roots, _ = _join_labels(counts, strips, seams, diagonal=True)
+    is_edge = np.zeros(len(roots), dtype=bool)
+    is_edge[roots[np.concatenate([ids[ids > 0] - 1 + offsets[t] for t, ids in enumerate(strong_ids)])]] = True
+    is_edge = is_edge[roots]
+
+    # 2. Background regions and the image border
+    def background(edges, stats=False):
+        if stats:
+            return cv2.connectedComponentsWithStats(edges.view(np.uint8) ^ 1, connectivity=4)
+        return cv2.connectedComponents(edges.view(np.uint8) ^ 1, connectivity=4)
+
+    def background_labels(t):
+        cx0, cy0, cx1, cy1 = tiles[t][1]
+        _, weak = cv2.connectedComponents(unpack(t).view(np.uint8), connectivity=8)
+        edges = _local(is_edge, offsets, t)[weak]
+        packed[t] = np.packbits(edges, axis=1)
+        count, labels, stats, _ = background(edges, stats=True)
+        on_border = {'top': cy0 == 0, 'bottom': cy1 == height, 'left': cx0 == 0, 'right': cx1 == width}
+        tile_strips = _border_strips(labels)
+        border = np.unique(np.concatenate([tile_strips[side] for side, edge in on_border.items() if edge] or [[0]]))
+        return count - 1, stats[1:, cv2.CC_STAT_AREA], border[border > 0] - 1, tile_strips
+
+    bg_counts, bg_areas, border_ids, strips = run(background_labels)
+    bg_offsets, bg_roots, bg_strips = _join_labels(bg_counts, strips, seams, diagonal=False)
+    bg_areas = np.concatenate(bg_areas)
+    border_ids = np.concatenate([ids + bg_offsets[t] for t, ids in enumerate(border_ids)]).astype(np.int64)
+    exterior = np.isin(bg_roots, bg_roots[border_ids])
+
+    # 3. Roof candidates: filled contours, with their contour area
+    def candidates(edges, t):
+        """Pixels inside some contour, labelled 8-connected, and the background labels"""
+        _, bg_labels = background(edges)
+        filled = edges | ~_local(exterior, bg_offsets, t, fill=True)[bg_labels]
+        return cv2.connectedComponentsWithStats(filled.view(np.uint8), connectivity=8) + (bg_labels,)
+
+    def candidate_labels(t):
+        count, labels, stats, _, bg_labels = candidates(unpack(t), t)
+        owner = np.zeros(bg_counts[t] + 1, dtype=np.int32)
+        owner[bg_labels.ravel()] = labels.ravel()
+        enclosed = np.bincount(*_cell_area(labels[:-1, :-1], labels[:-1, 1:], labels[1:, :-1], labels[1:, 1:]),
+                               minlength=count)
+        # Background inside a contour but diagonal to the outside lies on its outline
+        filled = labels > 0
+        near_outside = cv2.dilate((~filled).view(np.uint8), SQUARE).view(bool)
+        outline = np.unique(bg_labels[near_outside & filled])
+        return (count - 1, stats[1:, cv2.CC_STAT_AREA], enclosed[1:], owner[1:], outline[outline > 0] - 1,
+                _border_strips(labels), _border_strips(filled))
+
+    in_counts, in_areas, enclosed, owners, outline_ids, strips, filled_strips = run(candidate_labels)
+    in_offsets, in_roots, strips = _join_labels(in_counts, strips, seams, diagonal=True)
+    if not len(in_roots):
+        return None, 0, []
+
+    # Largest contour area wins, as in largest_contour; cells across seams count too
+    area = np.bincount(in_roots, weights=np.concatenate(enclosed), minlength=len(in_roots))
+    for corners in _seam_cells(tiles, strips):
+        ids, weights = _cell_area(*(line + 1 for line in corners))
+        np.add.at(area, in_roots[ids - 1], weights)
+    roof_root = int(np.argmax(area))
+    in_roof = in_roots == roof_root
+    roof_area = int(np.concatenate(in_areas)[in_roof].sum())
+
+    # 4. Obstacles: background regions held by the roof, bar the largest
+    # (the open roof surface) and those on the roof outline
+    owner_ids = np.concatenate([np.where(owner > 0, owner - 1 + in_offsets[t], -1) for t, owner in enumerate(owners)])
+    holes = (owner_ids >= 0) & ~exterior
+    holes[holes] = in_roof[owner_ids[holes]]
+    hole_areas = np.bincount(bg_roots[holes], weights=bg_areas[holes], minlength=len(bg_roots))
+    on_outline = np.zeros(len(bg_roots), dtype=bool)
+    on_outline[bg_roots[np.concatenate([ids + bg_offsets[t] for t, ids in enumerate(outline_ids)]).astype(np.int64)]] = True
+    on_outline[bg_roots[_outline_across(seams, bg_strips, filled_strips)]] = True
+    order = np.argsort(-hole_areas, kind='stable')[1:]
+    order = order[~on_outline[order]]
+    obstacle_roots = order[hole_areas[order] > min_area][:max_obstacles]
+
+    # Compact pieces from the tiles the roof touches
+    def pieces(t):
+        cx0, cy0, _, _ = tiles[t][1]
+        _, labels, _, _, bg_labels = candidates(unpack(t), t)
+        roof = CompactMask.from_dense(_local(in_roof, in_offsets, t)[labels], offset=(cy0, cx0), shape=shape)
+        local_roots = _local(bg_roots, bg_offsets, t, fill=-1)
+        obstacles = [CompactMask.from_dense((local_roots == root)[bg_labels], offset=(cy0, cx0), shape=shape)
+                     if (local_roots == root).any() else None for root in obstacle_roots]
+        return roof, obstacles
+
+    roof_tiles = [t for t in indices if in_roof[in_offsets[t]:in_offsets[t + 1]].any()]
+    roof_pieces, obstacle_pieces = run(pieces, roof_tiles)
+
+    obstacles = []
+    for group in zip(*obstacle_pieces):
+        mask = union_all([piece for piece in group if piece is not None], shape)
+        y, x, crop = mask.crop()
+        ys, xs = np.nonzero(crop)
+        obstacles.append({
+            'mask': mask,
+            'area': mask.area,
+            'bbox': mask.bbox,
+            'centroid': [float(xs.mean() + x), float(ys.mean() + y)]
+        })
+
+    return union_all(roof_pieces, shape), roof_area, obstacles
+
+
+def segment_tiled(masks_fn, image, tile_size=1024, overlap=128, max_workers=None,
+                  max_obstacles=5, min_area=100):
+    """
+    Run a mask proposer over tiles and rank regions once for the whole image
+
+    Each proposal's core part becomes a piece. Pieces in neighbouring
+    tiles that share at least half of their seam line are joined, so an
+    object cut by seams is reassembled before anything is ranked. The
+    largest joined region is the roof and the next largest are obstacles,
+    as in RoofSegmenter.segment_roof. Pieces are CompactMasks, so memory
+    follows the regions found, not the image.
+
+    Args:
+        masks_fn: callable(tile_np) -> list of boolean tile-sized masks
+        image: PIL Image or numpy array
+        tile_size, overlap: Tile edge length and overlap in pixels
+        max_workers: Tiles segmented concurrently (1 = sequential)
+        max_obstacles: Obstacles kept after the roof (largest first)
+        min_area: Smallest obstacle kept, in pixels
+
+    Returns:
+        (roof_mask, roof_area, obstacles) as for segment_edges_tiled
+    """
+
+    width, height = get_image_size(image)
+    shape = (height, width)
+    tiles = list(iter_tiles(width, height, tile_size, overlap))
+    workers = max_workers or os.cpu_count() or 1
+
+    def run(t):
+        (x0, y0, _, _), (cx0, cy0, cx1, cy1) = tiles[t]
+        pieces = []
+        for mask in masks_fn(read_tile(image, tiles[t][0])):
+            core = np.asarray(mask, dtype=bool)[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+            if core.any():
+                pieces.append((CompactMask.from_dense(core, offset=(cy0, cx0), shape=shape), _border_strips(core)))
+        return pieces
+
+    pieces, strips, tile_pieces = [], [], [[] for _ in tiles]
+    for t, tile_result in _map_waves(run, list(range(len(tiles))), workers):
+        for mask, piece_strips in tile_result:
+            tile_pieces[t].append(len(pieces))
+            pieces.append(mask)
+            strips.append(piece_strips)
+    if not pieces:
+        return None, 0, []
+
+    regions = _DisjointSets(len(pieces))
+    for a, b, side in _seams(tiles):
+        if side not in ('right', 'below'):
+            continue
+        for p in tile_pieces[a]:
+            for q in tile_pieces[b]:
+                u, v = _seam_lines(strips[p], strips[q], side)
+                shared = np.count_nonzero(u & v)
+                if shared and 2 * shared >= min(np.count_nonzero(u), np.count_nonzero(v)):
+                    regions.union([(p, q)])
+
+    groups = {}
+    for piece, root in zip(pieces, regions.roots()):
+        groups.setdefault(int(root), []).append(piece)
+    masks = sorted((union_all(group, shape) for group in groups.values()), key=lambda m: m.area, reverse=True)
+
+    obstacles = [{'mask': mask, 'area': mask.area, 'bbox': mask.bbox}
+                 for mask in masks[1:] if mask.area > min_area][:max_obstacles]
+    return masks[0], masks[0].area, obstacles
@@ -0,0 +1,238 @@
+# utils/uncertainty.py
+# Monte Carlo uncertainty bands for the solar and rainwater financials
+
+import copy
+
+import numpy as np
+
+from utils.calculations import RainwaterCalculator, SolarCalculator
+
+
+DEFAULT_SAMPLES = 100_000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def sample(rng, spec, n):
+    """
+    Draw n values for one parameter
+
+    Args:
+        rng: numpy Generator
+        spec: ('fixed', value), ('uniform', low, high),
+              ('triangular', low, mode, high) or ('normal', mean, std);
+              normal draws are clipped at 0 since every parameter here
+              is a non-negative rate, price or amount
+        n: Number of samples
+    """
+
+    kind, *args = spec
+    if kind == 'fixed':
+        return np.full(n, float(args[0]))
+    if kind == 'uniform':
+        return rng.uniform(args[0], args[1], n)
+    if kind == 'triangular':
+        low, mode, high = args
+        if low == high:
+            return np.full(n, float(mode))
+        return rng.triangular(low, mode, high, n)
+    if kind == 'normal':
+        return np.maximum(rng.normal(args[0], args[1], n), 0)
+    raise ValueError(f"Unknown distribution '{kind}' (fixed, uniform, triangular, normal)")
+
+
+def percentile_bands(values, percentiles=PERCENTILES):
+    """{'p5': ..., 'p50': ..., 'mean': ...} for one output (NaN samples ignored)"""
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).all():
+        return {**{f"p{p}": None for p in percentiles}, 'mean': None}
+    bands = dict(zip((f"p{p}" for p in percentiles), np.nanpercentile(values, percentiles)))
+    bands['mean'] = float(np.nanmean(values))
+    return {key: round(float(value), 1) for key, value in bands.items()}
+
+
+class MonteCarloAnalyzer:
+    """
+    Percentile bands for payback, lifetime savings and ROI
+
+    Each run draws n_samples parameter sets at once and pushes them
+    through the calculators' *_batch methods, so 100k samples take
+    milliseconds. Calculator attributes (electricity_rate, water_rate,
+    ...) and the climate inputs can all be given a distribution;
+    anything not listed keeps its point value. Runs are seeded, so the
+    same inputs always give the same bands.
+    """
+
+    def __init__(self, n_samples=DEFAULT_SAMPLES, seed=0, percentiles=PERCENTILES):
+        self.n_samples = n_samples
+        self.seed = seed
+        self.percentiles = percentiles
+
+    def solar_distributions(self, solar_irradiance):
+        """Default spreads around SolarCalculator's constants and the given irradiance"""
+        return {
+            'solar_irradiance': ('normal', solar_irradiance, 0.08 * solar_irradiance),
+            'electricity_rate': ('triangular', 0.10, 0.13, 0.17),
+            'rate_escalation': ('triangular', 0.0, 0.03, 0.05),
+            'degradation_rate': ('triangular', 0.003, 0.005, 0.008),
+            'cost_per_watt': ('triangular', 2.8, 3.5, 4.2),
+        }
+
+    def rainwater_distributions(self, annual_rainfall_mm):
+        """Default spreads around RainwaterCalculator's constants and the given rainfall"""
+        return {
+            'annual_rainfall_mm': ('normal', annual_rainfall_mm, 0.15 * annual_rainfall_mm),
+            'water_rate': ('triangular', 0.01, 0.02, 0.03),
+            'collection_efficiency': ('triangular', 0.75, 0.85, 0.90),
+            'tank_cost_per_liter': ('triangular', 0.4, 0.5, 0.65),
+        }
+
+    def _draw(self, calculator, distributions, inputs):
+        """
+        Sample every distribution: calculator attributes are set on a copy
+        of the calculator (as arrays), inputs are returned as arrays
+        """
+
+        rng = np.random.default_rng(self.seed)
+        calculator = copy.copy(calculator)
+        inputs = dict(inputs)
+
+        for name, spec in distributions.items():
+            values = sample(rng, spec, self.n_samples)
+            if name in inputs:
+                inputs[name] = values
+            elif hasattr(calculator, name):
+                setattr(calculator, name, values)
+            else:
+                raise ValueError(f"Unknown parameter '{name}' for {type(calculator).__name__}")
+        return calculator, inputs
+
+    def _bands(self, outputs):
+        return {name: percentile_bands(values, self.percentiles) for name, values in outputs.items()}
+
+    def simulate_solar(self, usable_area_sqft, solar_irradiance, shading_percent=0,
+                       orientation="South", distributions=None, calculator=None,
+                       system_size_kw=None, annual_production_kwh=None):
+        """
+        Solar financials under uncertainty
+
+        Args:
+            usable_area_sqft, solar_irradiance, shading_percent, orientation:
+                Point inputs, as for SolarCalculator
+            distributions: {parameter: spec} overriding/extending
+                solar_distributions() (see sample() for specs)
+            calculator: SolarCalculator holding the point values
+            system_size_kw: Laid-out system size (system_size_for_panels);
+                sized from usable_area_sqft when not given
+            annual_production_kwh: Point production for that system, e.g.
+                calculate_production_hourly's. Samples scale it by the
+                sampled irradiance and unshaded share; the daily model
+                is used when not given
+
+        Returns:
+            dict: samples, seed, point (the deterministic result) and
+                  percentile bands for payback_period, total_25yr_savings,
+                  roi_percent and annual_production_kwh
+        """
+
+        calculator = calculator or SolarCalculator()
+        specs = {**self.solar_distributions(solar_irradiance), **(distributions or {})}
+        sampled, inputs = self._draw(calculator, specs, {
+            'usable_area_sqft': usable_area_sqft,
+            'solar_irradiance': solar_irradiance,
+            'shading_percent': shading_percent,
+        })
+
+        if system_size_kw is None:
+            system_size, _ = sampled.calculate_system_size_batch(inputs['usable_area_sqft'])
+            point_size, _ = calculator.calculate_system_size(usable_area_sqft)
+        else:
+            system_size = point_size = system_size_kw
+
+        if annual_production_kwh is None:
+            production = sampled.calculate_production_batch(
+                system_size, inputs['solar_irradiance'], inputs['shading_percent'], orientation)
+            point_production = calculator.calculate_production(point_size, solar_irradiance, shading_percent, orientation)
+        else:
+            # Both production models are linear in irradiance and unshaded share
+            unshaded = max(1 - shading_percent / 100, 1e-6)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                irradiance_ratio = np.where(solar_irradiance > 0, inputs['solar_irradiance'] / solar_irradiance, 1)
+            production = (annual_production_kwh * irradiance_ratio
+                          * np.clip(1 - np.asarray(inputs['shading_percent']) / 100, 0, 1) / unshaded)
+            point_production = annual_production_kwh
+        roi = sampled.calculate_roi_batch(system_size, production)
+
+        return {
+            'samples': self.n_samples,
+            'seed': self.seed,
+            'point': calculator.calculate_roi(point_size, point_production),
+            **self._bands({
+                'payback_period': roi['payback_period'],
+                'total_25yr_savings': roi['total_25yr_savings'],
+                'roi_percent': roi['roi_percent'],
+                'annual_production_kwh': production,
+            })
+        }
+
+    def simulate_rainwater(self, roof_area_sqft, annual_rainfall_mm, distributions=None,
+                           calculator=None, years=25, annual_supplied_liters=None,
+                           tank_size_liters=None, annual_demand_liters=None):
+        """
+        Rainwater financials under uncertainty
+
+        Lifetime savings assume a flat water price over `years`, matching
+        RainwaterCalculator; ROI is against the installation cost.
+
+        Args:
+            annual_supplied_liters, tank_size_liters, annual_demand_liters:
+                calculate_tank_sizing's simulated supply, tank and demand
+                (annual_supplied + annual_unmet). Savings are then on the
+                water used, which samples scale with the sampled
+                collection, capped at the demand; without them every
+                liter collected counts and the tank is two months of it
+
+        Returns:
+            dict: samples, seed, point and percentile bands for
+                  payback_period, total_savings, roi_percent,
+                  annual_collection_liters and (with a simulated supply)
+                  annual_supplied_liters
+        """
+
+        calculator = calculator or RainwaterCalculator()
+        specs = {**self.rainwater_distributions(annual_rainfall_mm), **(distributions or {})}
+        sampled, inputs = self._draw(calculator, specs, {
+            'roof_area_sqft': roof_area_sqft,
+            'annual_rainfall_mm': annual_rainfall_mm,
+        })
+
+        collection = sampled.calculate_collection_batch(inputs['roof_area_sqft'], inputs['annual_rainfall_mm'])
+        point_collection = calculator.calculate_collection(roof_area_sqft, annual_rainfall_mm)
+        outputs = {'annual_collection_liters': collection}
+
+        if annual_supplied_liters is None:
+            used, point_used = collection, point_collection
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                collection_ratio = np.where(point_collection > 0, collection / point_collection, 1)
+            used = annual_supplied_liters * collection_ratio
+            if annual_demand_liters is not None:
+                used = np.minimum(used, annual_demand_liters)
+            point_used = annual_supplied_liters
+            outputs['annual_supplied_liters'] = used
+
+        savings = sampled.calculate_savings_batch(used, tank_size_liters)
+        total_savings = savings['annual_savings'] * years
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roi_percent = (total_savings - savings['installation_cost']) / savings['installation_cost'] * 100
+
+        return {
+            'samples': self.n_samples,
+            'seed': self.seed,
+            'point': calculator.calculate_savings(point_used, tank_size_liters),
+            **self._bands({
+                'payback_period': savings['payback_period'],
+                'total_savings': total_savings,
+                'roi_percent': roi_percent,
+                **outputs,
+            })
+        }